@@ -1,7 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict
+from typing import List, Literal, Optional
 import os
 
+from app.core.utils.constants import ReviewConstants
+
 
 class ReviewRequest(BaseModel):
     diff: Optional[str] = None
@@ -9,8 +11,14 @@ class ReviewRequest(BaseModel):
     pr_number: Optional[int] = None
     base: Optional[str] = None
     head: Optional[str] = None
-    max_bytes: int = 500
+    head_sha: Optional[str] = None      # Optional: PR head commit to review; resolved from the PR if omitted
+    max_bytes: int = ReviewConstants.MAX_DIFF_BYTES
     github_token: Optional[str] = None  # Optional: Can be provided or use GITHUB_BOT_TOKEN env var
+    include_paths: Optional[List[str]] = None  # Optional: only review files matching these glob patterns
+    exclude_paths: Optional[List[str]] = None  # Optional: replaces the default lockfile/vendored/generated excludes
+    output_mode: Optional[Literal["comment", "inline"]] = None  # Optional: defaults to REVIEW_OUTPUT_MODE
+    priority: Optional[bool] = None  # Optional: review ahead of regular reviews (e.g. release or hotfix PRs)
+    diff_backend: Optional[Literal["github", "git"]] = None  # Optional: defaults to REVIEW_DIFF_BACKEND
     
     def get_github_token(self) -> str:
         """Get GitHub token from payload or environment variable."""
@@ -20,5 +28,23 @@ class ReviewRequest(BaseModel):
         if not token:
             raise ValueError("github_token is required. Provide it in payload or set GITHUB_BOT_TOKEN environment variable.")
         return token
-    
-    
\ No newline at end of file
+
+
+class ReviewFinding(BaseModel):
+    """One issue reported by a structured code review."""
+    model_config = ConfigDict(extra="forbid")
+
+    category: str                      # e.g. "Bug", "Security", "Performance", "Readability", "Style"
+    file: str                          # path as shown in the diff
+    lines: str                         # new-file line numbers, e.g. "12" or "7, 10" or "20-24"
+    severity: Literal["Low", "Medium", "High"]
+    issue: str
+    suggestion: str
+
+
+class ReviewOutput(BaseModel):
+    """Structured code review returned by the LLM in JSON mode."""
+    model_config = ConfigDict(extra="forbid")
+
+    summary: str
+    findings: List[ReviewFinding]
@@ -1,8 +1,84 @@
 import aio_pika
 import asyncio
-import os
+import logging
+from typing import Optional
+
+from aio_pika.pool import Pool
+
+from app.core.utils.constants import PublisherConstants, QueueConstants, RabbitMQConstants
+
+logger = logging.getLogger(__name__)
 
-from app.core.utils.constants import RabbitMQConstants
 
 async def get_connection():
-    return await aio_pika.connect_robust(RabbitMQConstants.RABBITMQ_URL)
\ No newline at end of file
+    return await aio_pika.connect_robust(RabbitMQConstants.RABBITMQ_URL)
+
+
+class ConnectionPool:
+    """
+    One robust AMQP connection with a pool of publisher-confirm channels.
+
+    Queue declarations are cached per pool, so each queue is declared once
+    per connection instead of once per message.
+    """
+
+    def __init__(self, url: str = RabbitMQConstants.RABBITMQ_URL, channel_pool_size: int = PublisherConstants.CHANNEL_POOL_SIZE):
+        self.url = url
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channels = Pool(self._create_channel, max_size=channel_pool_size)
+        self._connect_lock = asyncio.Lock()
+        self._declared_queues: set = set()
+
+    async def _get_connection(self) -> aio_pika.abc.AbstractRobustConnection:
+        async with self._connect_lock:
+            if self.connection is None or self.connection.is_closed:
+                self.connection = await aio_pika.connect_robust(self.url)
+                self._declared_queues.clear()
+                logger.info("Opened pooled RabbitMQ connection")
+            return self.connection
+
+    async def _create_channel(self) -> aio_pika.abc.AbstractChannel:
+        connection = await self._get_connection()
+        return await connection.channel(publisher_confirms=True)
+
+    async def declare_queue(self, channel: aio_pika.abc.AbstractChannel, queue_name: str):
+        """Declare a durable queue unless this pool has already declared it."""
+        if queue_name in self._declared_queues:
+            return
+        await channel.declare_queue(queue_name, durable=True, arguments=QueueConstants.ARGUMENTS.get(queue_name))
+        self._declared_queues.add(queue_name)
+
+    async def queue_depth(self, queue_name: str) -> int:
+        """Return the number of messages ready in a queue (declaring it if needed)."""
+        async with self.channels.acquire() as channel:
+            if channel.is_closed:
+                await channel.reopen()
+            queue = await channel.declare_queue(queue_name, durable=True, arguments=QueueConstants.ARGUMENTS.get(queue_name))
+            self._declared_queues.add(queue_name)
+            return queue.declaration_result.message_count
+
+    async def close(self):
+        await self.channels.close()
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+        self.connection = None
+        logger.info("Closed pooled RabbitMQ connection")
+
+
+_pool: Optional[ConnectionPool] = None
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None or _pool.channels.is_closed:
+        _pool = ConnectionPool()
+    return _pool
+
+
+async def close_pool():
+    """Close the process-wide connection pool, if one was created."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
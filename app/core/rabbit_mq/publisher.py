@@ -1,29 +1,150 @@
 
+import asyncio
 import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Union
+
 import aio_pika
-from app.core.rabbit_mq.connection import get_connection
+from app.core.rabbit_mq.connection import get_pool
+from app.core.rabbit_mq.task_message import build_task_message
+from app.core.utils.constants import PublisherConstants, QueueConstants
+
+logger = logging.getLogger(__name__)
+
+
+def _to_message(payload: Union[dict, aio_pika.Message]) -> aio_pika.Message:
+    if isinstance(payload, aio_pika.Message):
+        return payload
+    return aio_pika.Message(
+        body=json.dumps(payload).encode(),
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+    )
+
+
+async def publish_confirmed(
+    queue_name: str, payloads: Iterable[Union[dict, aio_pika.Message]]
+) -> List[Optional[BaseException]]:
+    """
+    Publish many messages to a queue over a pooled channel with publisher confirms.
+
+    Messages are published concurrently in windows of PUBLISH_BATCH_SIZE, so
+    confirms are pipelined instead of waiting for one round trip per message.
+    Returns only once the broker has confirmed or rejected every message.
+
+    Args:
+        queue_name: Destination queue (published via the default exchange)
+        payloads: JSON-serializable dicts or prebuilt aio_pika messages
+
+    Returns:
+        The outcome of each message, in order: None if the broker confirmed
+        it, otherwise the publish error
+
+    Raises:
+        Exception: If no channel to the broker could be opened
+    """
+    messages = [_to_message(payload) for payload in payloads]
+    if not messages:
+        return []
+
+    outcomes: List[Optional[BaseException]] = []
+    pool = get_pool()
+    async with pool.channels.acquire() as channel:
+        if channel.is_closed:
+            await channel.reopen()
+        await pool.declare_queue(channel, queue_name)
+
+        window = max(PublisherConstants.PUBLISH_BATCH_SIZE, 1)
+        for start in range(0, len(messages), window):
+            # Each publish resolves when the broker confirms it
+            results = await asyncio.gather(*(
+                channel.default_exchange.publish(message, routing_key=queue_name)
+                for message in messages[start:start + window]
+            ), return_exceptions=True)
+            outcomes.extend(result if isinstance(result, BaseException) else None for result in results)
+
+    failed = sum(1 for outcome in outcomes if outcome is not None)
+    if failed:
+        logger.warning(f"Published {len(messages) - failed} of {len(messages)} message(s) to {queue_name} queue")
+    else:
+        logger.info(f"Published {len(messages)} message(s) to {queue_name} queue")
+    return outcomes
+
+
+async def publish_many(queue_name: str, payloads: Iterable[Union[dict, aio_pika.Message]]) -> int:
+    """
+    Publish many messages to a queue, failing if the broker does not confirm all of them.
+
+    See publish_confirmed; use it instead to find out which messages failed.
+
+    Returns:
+        Number of messages published
+    """
+    outcomes = await publish_confirmed(queue_name, payloads)
+    error = next((outcome for outcome in outcomes if outcome is not None), None)
+    if error is not None:
+        raise error
+    return len(outcomes)
 
 
 async def publish_message(queue_name: str, payload: dict):
-    connection = await get_connection()
-    try:
-        channel = await connection.channel()
-        await channel.declare_queue(queue_name, durable=True)
+    await publish_many(queue_name, [payload])
+
+
+async def publish_task(
+    queue_name: str,
+    task_name: str,
+    args: Optional[List[Any]] = None,
+    kwargs: Optional[Dict[str, Any]] = None,
+    task_id: Optional[str] = None,
+    countdown: Optional[float] = None,
+    priority: Optional[int] = None,
+) -> str:
+    """
+    Enqueue a Celery task by name without going through the Celery client.
+
+    Args:
+        queue_name: Queue the task is routed to
+        task_name: Registered Celery task name
+        args: Positional task arguments
+        kwargs: Keyword task arguments
+        task_id: Task id; generated when not given
+        countdown: Seconds to wait before the task may run
+        priority: Message priority (see QueueConstants.REVIEW_MAX_PRIORITY)
 
-        message = aio_pika.Message(
-            body=json.dumps(payload).encode(),
-            delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-        )
+    Returns:
+        The task id
+    """
+    eta = datetime.now(timezone.utc) + timedelta(seconds=countdown) if countdown else None
+    message = build_task_message(task_name, args, kwargs, task_id=task_id, eta=eta, priority=priority)
+    await publish_many(queue_name, [message])
+    return message.correlation_id
 
-        # Publish to the queue using the queue's routing key
-        await channel.default_exchange.publish(
-            message, 
-            routing_key=queue_name
-        )
-        
-        print(f"Published message to {queue_name} queue with payload: {payload}")
-    finally:
-        await connection.close()
 
+async def publish_task_delayed(
+    queue_name: str,
+    task_name: str,
+    args: Optional[List[Any]] = None,
+    task_id: Optional[str] = None,
+    priority: Optional[int] = None,
+    kwargs: Optional[Dict[str, Any]] = None,
+    eta: Optional[datetime] = None,
+) -> str:
+    """
+    Enqueue a Celery task on `queue_name`'s retry queue.
 
+    The message waits there for CIRCUIT_RETRY_DELAY_SECONDS without
+    occupying any worker, then the broker dead-letters it back onto
+    `queue_name`. With an `eta`, the message is dead-lettered once the ETA
+    passes if that is sooner; messages only expire at the head of the
+    queue, so it may wait behind longer-delayed ones.
 
+    Returns:
+        The task id
+    """
+    message = build_task_message(task_name, args, kwargs, task_id=task_id, eta=eta, priority=priority)
+    if eta is not None:
+        delay = (eta - datetime.now(timezone.utc)).total_seconds()
+        message.expiration = min(max(delay, 0.0), QueueConstants.RETRY_DELAY_SECONDS)
+    await publish_many(QueueConstants.RETRY_QUEUES[queue_name], [message])
+    return message.correlation_id
@@ -0,0 +1,131 @@
+"""
+Encode and decode Celery task messages with aio_pika.
+
+The asyncio worker consumes the same queues as the Celery workers, so both
+read and write messages in Celery's JSON task protocol (version 2, with
+version 1 accepted on read). Either worker mode can pick up messages
+produced by the other.
+
+Dict arguments (task payloads) have their large fields compressed or
+moved to the blob store (see app.core.storage.payloads); Celery tasks
+decode their payload themselves.
+"""
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import aio_pika
+
+from app.core.storage.payloads import decode_payload, encode_payload
+
+
+def build_task_message(
+    task_name: str,
+    args: Optional[List[Any]] = None,
+    kwargs: Optional[Dict[str, Any]] = None,
+    task_id: Optional[str] = None,
+    eta: Optional[datetime] = None,
+    priority: Optional[int] = None,
+    group_id: Optional[str] = None,
+) -> aio_pika.Message:
+    """
+    Build a persistent AMQP message that a Celery worker executes as `task_name`.
+
+    Args:
+        task_name: Registered Celery task name (e.g. "defexai.post_comment_worker")
+        args: Positional task arguments
+        kwargs: Keyword task arguments
+        task_id: Task id; generated when not given
+        eta: Earliest time the task may run (timezone-aware)
+        priority: AMQP message priority (only honoured by priority queues)
+        group_id: Id of the Celery group the task belongs to
+
+    Returns:
+        aio_pika.Message ready to publish to the task's queue
+    """
+    task_id = task_id or str(uuid.uuid4())
+    args = [encode_payload(arg) if isinstance(arg, dict) else arg for arg in args or []]
+    kwargs = dict(kwargs or {})
+    body = [args, kwargs, {"callbacks": None, "errbacks": None, "chain": None, "chord": None}]
+    headers = {
+        "lang": "py",
+        "task": task_name,
+        "id": task_id,
+        "shadow": None,
+        "eta": eta.isoformat() if eta else None,
+        "expires": None,
+        "group": group_id,
+        "group_index": None,
+        "retries": 0,
+        "timelimit": [None, None],
+        "root_id": task_id,
+        "parent_id": None,
+        # Never repr arguments into headers; payloads carry GitHub tokens
+        "argsrepr": f"<{len(args)} args>",
+        "kwargsrepr": "{}",
+        "origin": f"{os.getpid()}@{socket.gethostname()}",
+        "ignore_result": False,
+        "replaced_task_nesting": 0,
+        "stamped_headers": None,
+        "stamps": {},
+    }
+    return aio_pika.Message(
+        body=json.dumps(body).encode(),
+        headers=headers,
+        content_type="application/json",
+        content_encoding="utf-8",
+        correlation_id=task_id,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        priority=priority,
+    )
+
+
+def parse_task_message(message: aio_pika.abc.AbstractIncomingMessage) -> Tuple[str, str, List[Any], Dict[str, Any]]:
+    """
+    Decode a Celery task message.
+
+    Args:
+        message: Incoming AMQP message
+
+    Returns:
+        Tuple of (task name, task id, args, kwargs), with payload arguments decoded
+
+    Raises:
+        ValueError: If the message is not a JSON Celery task message, or a payload cannot be decoded
+    """
+    if message.content_type and message.content_type != "application/json":
+        raise ValueError(f"Unsupported content type: {message.content_type}")
+    try:
+        body = json.loads(message.body.decode(message.content_encoding or "utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid task message body: {e}") from e
+
+    headers = message.headers or {}
+    if "task" in headers:
+        # Protocol v2: task metadata in headers, body is [args, kwargs, embed]
+        if not isinstance(body, list) or len(body) < 2:
+            raise ValueError("Invalid protocol v2 task message body")
+        task_name, task_id = str(headers["task"]), str(headers.get("id") or message.correlation_id)
+        args, kwargs = body[0], body[1]
+    elif isinstance(body, dict) and "task" in body:
+        # Protocol v1: everything in the body
+        task_name, task_id = str(body["task"]), str(body.get("id"))
+        args, kwargs = body.get("args", []), body.get("kwargs", {})
+    else:
+        raise ValueError("Message is not a Celery task message")
+    return task_name, task_id, [decode_payload(arg) if isinstance(arg, dict) else arg for arg in args], kwargs
+
+
+def task_eta(message: aio_pika.abc.AbstractIncomingMessage) -> Optional[datetime]:
+    """Return the ETA of a protocol v2 task message, or None if it may run immediately."""
+    eta = (message.headers or {}).get("eta")
+    if not eta:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(eta))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
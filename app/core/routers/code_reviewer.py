@@ -1,20 +1,36 @@
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Optional
+import asyncio
 import logging
 
 from app.core.models.models import ReviewRequest
-from app.core.utils.constants import QueueConstants
-from app.workers.review_worker import review_code_worker
+from app.core.services.errors import ServiceError
+from app.core.services.review_dispatch import dispatch_batch, dispatch_review
+from app.core.services.review_status import batch_status, stream_review_events, wait_for_result
+from app.core.storage.review_results import get_review_results
+from app.core.utils.constants import BatchConstants
 
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-@router.post("/code/review")
-async def analyze_code(payload: dict):
+def _review_payload(payload: dict) -> dict:
+    """
+    Validate a review request and return the task payload for it.
+
+    Raises:
+        HTTPException: 422 if a field has an invalid value (e.g. an unknown diff_backend),
+            400 if the request is otherwise invalid or no GitHub token is available
+    """
     try:
         review_request = ReviewRequest(**payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=jsonable_encoder(e.errors(include_url=False, include_input=False)))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid payload: {str(e)}")
     
@@ -36,20 +52,129 @@ async def analyze_code(payload: dict):
     # Prepare payload for Celery task
     payload_dict = review_request.dict(exclude_none=True)
     payload_dict["github_token"] = github_token  # Ensure token is included
+    return payload_dict
+
+
+@router.post("/code/review")
+async def analyze_code(payload: dict):
+    payload_dict = _review_payload(payload)
     
-    # Dispatch task to Celery
+    # Dispatch task to Celery, coalescing it with reviews of the same PR head
     try:
-        task = review_code_worker.apply_async(
-            args=[payload_dict],
-            queue=QueueConstants.CODE_REVIEW_QUEUE
-        )
-        logger.info(f"Code review task dispatched with task ID: {task.id}")
+        dispatched = await dispatch_review(payload_dict)
+        task_id = dispatched["task_id"]
+        if dispatched["duplicate"]:
+            logger.info(f"Code review already submitted with task ID: {task_id}")
+            return {
+                "status": "success",
+                "message": "Code review for this PR head is already submitted.",
+                "task_id": task_id,
+                "duplicate": True
+            }
+        logger.info(f"Code review task dispatched with task ID: {task_id}")
         
         return {
             "status": "success",
             "message": "Code review request submitted to Celery worker.",
-            "task_id": task.id
+            "task_id": task_id
         }
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"Failed to dispatch Celery task: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to dispatch task: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to dispatch task: {str(e)}")
+
+
+@router.post("/code/review/batch")
+async def analyze_code_batch(payload: dict):
+    """
+    Submit many PR reviews under one batch id.
+
+    The body holds "reviews", a list of review requests as accepted by
+    POST /code/review, and optionally "max_in_flight", the number of the
+    batch's reviews that may be queued or running at once (capped by
+    REVIEW_BATCH_MAX_IN_FLIGHT). Every request is validated before any is
+    enqueued; if one is invalid, nothing is submitted.
+    """
+    reviews = payload.get("reviews")
+    if not isinstance(reviews, list) or not reviews:
+        raise HTTPException(status_code=400, detail="Invalid payload: 'reviews' must be a non-empty list")
+    if len(reviews) > BatchConstants.MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many reviews: {len(reviews)} (at most {BatchConstants.MAX_SIZE} per batch)"
+        )
+    max_in_flight = payload.get("max_in_flight", BatchConstants.MAX_IN_FLIGHT)
+    if not isinstance(max_in_flight, int) or isinstance(max_in_flight, bool) or max_in_flight < 1:
+        raise HTTPException(status_code=400, detail="Invalid payload: 'max_in_flight' must be a positive integer")
+
+    payloads, errors, status_code = [], [], 400
+    for index, review in enumerate(reviews):
+        try:
+            if not isinstance(review, dict):
+                raise HTTPException(status_code=400, detail="Invalid payload: expected an object")
+            payloads.append(_review_payload(review))
+        except HTTPException as e:
+            errors.append({"index": index, "error": e.detail})
+            # Field values failing validation answer 422, as for a single review
+            status_code = max(status_code, e.status_code)
+    if errors:
+        raise HTTPException(status_code=status_code, detail={"message": "Invalid review requests", "errors": errors})
+
+    try:
+        batch = await dispatch_batch(payloads, min(max_in_flight, BatchConstants.MAX_IN_FLIGHT))
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        logger.error(f"Failed to dispatch review batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to dispatch batch: {str(e)}")
+    logger.info(f"Review batch {batch['batch_id']} dispatched with {len(batch['tasks'])} review(s)")
+
+    return {
+        "status": "success",
+        "message": f"Batch of {len(batch['tasks'])} code review(s) submitted to Celery worker.",
+        **batch
+    }
+
+
+@router.get("/code/review/batch/{batch_id}")
+async def get_review_batch(batch_id: str, results: bool = False):
+    """
+    Return the aggregated progress of a review batch.
+
+    With `results`, each finished task's result is included as well.
+    """
+    status = await batch_status(batch_id, include_results=results)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired review batch: {batch_id}")
+    return status
+
+
+@router.get("/code/review/{task_id}")
+async def get_review(task_id: str, wait: float = 0):
+    """
+    Return the status and, once finished, the result of a review task.
+
+    With `wait` (seconds, capped by REVIEW_RESULT_MAX_WAIT_SECONDS) the
+    request blocks until the review finishes, fails or is superseded.
+    """
+    if wait > 0:
+        record = await wait_for_result(task_id, wait)
+    else:
+        record = await asyncio.to_thread(get_review_results().get, task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired review task: {task_id}")
+    return record
+
+
+@router.get("/code/review/{task_id}/events")
+async def review_events(task_id: str, last_event_id: Optional[str] = Header(default=None)):
+    """Stream the progress and result of a review task as server-sent events."""
+    if await asyncio.to_thread(get_review_results().get, task_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired review task: {task_id}")
+    after_version = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        stream_review_events(task_id, after_version),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
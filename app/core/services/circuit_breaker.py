@@ -0,0 +1,85 @@
+"""
+Per-upstream circuit breakers for GitHub and the LLM backend.
+
+Calls check the upstream's circuit first and report their outcome after.
+Only failures that say the upstream itself is unwell count (connection
+errors, timeouts, 5xx); rejected requests such as 4xx responses or rate
+limits do not. While a circuit is open, calls raise CircuitOpen at once,
+and the workers park the task in a retry queue instead of holding a worker
+slot until the time limit (see app.core.services.review_dispatch).
+
+The shared state lives in SQLite, so store calls run in a worker thread,
+off the event loop. A process that just saw an upstream succeed trusts its
+circuit to be closed for CIRCUIT_STATE_CACHE_SECONDS, which keeps healthy
+calls from touching the store at all.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from app.core.storage import circuits
+from app.core.storage.circuits import get_circuits
+from app.core.utils.constants import CircuitConstants
+from app.core.utils.metrics import CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+GITHUB = "github"
+
+# Monotonic time until which each upstream's circuit is assumed closed with no failures
+_healthy_until: Dict[str, float] = {}
+
+
+def _is_healthy(upstream: str) -> bool:
+    return _healthy_until.get(upstream, 0.0) > time.monotonic()
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable (circuit open, next probe in {retry_after:.0f}s)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+async def check_circuit(upstream: str):
+    """
+    Fail fast if the upstream's circuit is open.
+
+    Raises:
+        CircuitOpen: If calls to the upstream are currently failed fast
+    """
+    if _is_healthy(upstream):
+        return
+    retry_after = await asyncio.to_thread(get_circuits().allow, upstream, CircuitConstants.COOLDOWN_SECONDS)
+    if retry_after is not None:
+        raise CircuitOpen(upstream, retry_after)
+
+
+async def record_success(upstream: str):
+    """Report a call the upstream answered, closing its circuit if it was open."""
+    if _is_healthy(upstream):
+        return
+    previous = await asyncio.to_thread(get_circuits().record_success, upstream)
+    _healthy_until[upstream] = time.monotonic() + CircuitConstants.STATE_CACHE_SECONDS
+    if previous is not None:
+        CIRCUIT_TRANSITIONS.labels(upstream, circuits.CLOSED).inc()
+        logger.info("Circuit for %s closed (was %s)", upstream, previous)
+
+
+async def record_failure(upstream: str):
+    """Report a call that failed because the upstream is down or too slow."""
+    _healthy_until.pop(upstream, None)
+    state = await asyncio.to_thread(get_circuits().record_failure, upstream, CircuitConstants.FAILURE_THRESHOLD)
+    if state == circuits.OPEN:
+        CIRCUIT_TRANSITIONS.labels(upstream, circuits.OPEN).inc()
+        logger.warning(
+            "Circuit for %s opened; failing calls fast for %.0fs", upstream, CircuitConstants.COOLDOWN_SECONDS
+        )
+
+
+def is_open(upstream: str) -> bool:
+    """Return True if calls to the upstream are currently failed fast."""
+    return get_circuits().state(upstream) != circuits.CLOSED
@@ -0,0 +1,17 @@
+"""
+Errors raised by the review services.
+
+The services run in the workers as well as the API, so they must not
+depend on FastAPI: they raise ServiceError with the HTTP status that best
+describes the failure, and the API router turns it into an HTTPException.
+"""
+from typing import Any
+
+
+class ServiceError(Exception):
+    """A failed service call, with the HTTP status and detail to report for it."""
+
+    def __init__(self, status_code: int, detail: Any = None):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
@@ -0,0 +1,312 @@
+"""
+PR diffs computed from local git mirrors instead of the GitHub compare API.
+
+Each repository gets a bare mirror under GIT_MIRROR_DIR. A diff first
+checks whether the mirror already has both commits; only missing commits
+(or moving branch refs) are fetched, so repeat reviews of a repository
+cost at most one small incremental fetch. The diff is computed locally
+with rename detection, limited to the requested paths, and parsed while
+`git diff` streams it, like the compare API's response. Unlike the compare
+API, it is never capped at a number of files.
+
+Mirrors are shared by the workers on a host: a file lock per mirror
+serializes fetches while letting diffs run concurrently, and the least
+recently used mirrors are deleted beyond GIT_MIRROR_MAX_MIRRORS or
+GIT_MIRROR_MAX_BYTES. The GitHub token is passed to git through the
+environment for each fetch and never written to the mirror's config.
+"""
+import asyncio
+import base64
+import fcntl
+import logging
+import os
+import re
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+from app.core.storage.git_mirrors import get_git_mirror_index
+from app.core.utils.constants import GitMirrorConstants, ReviewConstants
+from app.core.utils.diff_parser import DiffFilter, DiffStreamParser, FileDiff
+from app.core.utils.metrics import DIFF_BYTES, GITHUB_FETCH_SECONDS
+
+GIT_AVAILABLE = shutil.which("git") is not None
+
+logger = logging.getLogger(__name__)
+
+REPO_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+COMMIT_SHA_RE = re.compile(r"^(?:[0-9a-f]{40}|[0-9a-f]{64})$")
+# Branch names passed into refspecs; anything unusual is left to the compare API
+BRANCH_RE = re.compile(r"^(?![-/.])(?!.*\.\.)[A-Za-z0-9._/-]+(?<![/.])$")
+# Bytes read from `git diff` per chunk
+READ_CHUNK_BYTES = 65536
+
+
+class GitMirrorError(Exception):
+    """Raised when a mirror cannot be created, fetched or diffed."""
+
+
+def mirror_key(owner: str, repo: str) -> str:
+    """
+    Return the key of a repository's mirror ("owner/repo", lowercased).
+
+    Raises:
+        GitMirrorError: If the owner or repository name is not a plain GitHub name
+    """
+    for name in (owner, repo):
+        if not REPO_NAME_RE.match(name) or name in (".", ".."):
+            raise GitMirrorError(f"Invalid repository name: {owner}/{repo}")
+    return f"{owner}/{repo}".lower()
+
+
+def mirror_path(key: str) -> str:
+    """Return the directory of a mirror."""
+    owner, repo = key.split("/", 1)
+    return os.path.join(GitMirrorConstants.DIR, owner, f"{repo}.git")
+
+
+def _git_env(token: Optional[str] = None) -> Dict[str, str]:
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    if token:
+        credentials = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+        env.update({
+            "GIT_CONFIG_COUNT": "1",
+            "GIT_CONFIG_KEY_0": "http.extraHeader",
+            "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}",
+        })
+    return env
+
+
+async def _git(path: str, *args: str, token: Optional[str] = None, timeout: Optional[float] = None) -> bytes:
+    process = await asyncio.create_subprocess_exec(
+        "git", *args, cwd=path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=_git_env(token),
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        raise GitMirrorError(f"git {args[0]} failed: {stderr.decode(errors='replace').strip()[-500:]}")
+    return stdout
+
+
+class _MirrorLock:
+    """Inter-process lock on a mirror: shared while diffing, exclusive while fetching or deleting."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.fd = os.open(f"{path}.lock", os.O_CREAT | os.O_RDWR, 0o600)
+
+    async def acquire(self, exclusive: bool):
+        # Converting a held lock releases it first, so two converting holders cannot deadlock
+        await asyncio.to_thread(fcntl.flock, self.fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def try_exclusive(self) -> bool:
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _revisions(base: str, head: str) -> Tuple[List[str], List[str], Tuple[str, str]]:
+    # Returns (commits to have locally, branch refspecs to fetch, revisions to diff); refs are commit SHAs or branches
+    commits, refspecs, revisions = [], [], []
+    for ref in (base, head):
+        if COMMIT_SHA_RE.match(ref):
+            commits.append(ref)
+            revisions.append(ref)
+        elif BRANCH_RE.match(ref) and not ref.endswith(".lock"):
+            refspecs.append(f"+refs/heads/{ref}:refs/remotes/origin/{ref}")
+            revisions.append(f"refs/remotes/origin/{ref}")
+        else:
+            raise GitMirrorError(f"Unsupported ref name: {ref!r}")
+    return commits, refspecs, (revisions[0], revisions[1])
+
+
+async def _has_commits(path: str, commits: List[str]) -> bool:
+    if not os.path.isdir(path):
+        return False
+    try:
+        for commit in commits:
+            await _git(path, "cat-file", "-e", f"{commit}^{{commit}}")
+    except GitMirrorError:
+        return False
+    return True
+
+
+def _disk_usage(path: str) -> int:
+    total = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+async def _init_mirror(path: str):
+    os.makedirs(path)
+    try:
+        await _git(path, "init", "--bare", "--quiet")
+        # Objects are never collected while another worker's diff may be reading them
+        await _git(path, "config", "gc.auto", "0")
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+
+async def _fetch(key: str, path: str, commits: List[str], refspecs: List[str], token: str, pr_number: Optional[int]):
+    created = not os.path.isdir(path)
+    if created:
+        await _init_mirror(path)
+    try:
+        await _fetch_into(key, path, commits, refspecs, token, pr_number)
+    except BaseException:
+        if created:
+            # An empty mirror is not in the index, so nothing would ever evict it
+            shutil.rmtree(path, ignore_errors=True)
+        raise
+    # The mirror index is SQLite, so its calls run in a worker thread, off the event loop
+    await asyncio.to_thread(get_git_mirror_index().touch, key, await asyncio.to_thread(_disk_usage, path))
+
+
+async def _fetch_into(key: str, path: str, commits: List[str], refspecs: List[str], token: str, pr_number: Optional[int]):
+    if commits and pr_number:
+        # Fork commits are only reachable in the base repository through the PR's ref
+        refspecs = refspecs + [f"+refs/pull/{pr_number}/head:refs/pull/{pr_number}/head"]
+    missing = [commit for commit in commits if not await _has_commits(path, [commit])]
+    url = f"{GitMirrorConstants.REMOTE_URL}/{key}.git"
+    fetch = ("fetch", "--quiet", "--no-tags", "--no-write-fetch-head", url)
+    with GITHUB_FETCH_SECONDS.labels("mirror_fetch").time():
+        try:
+            await _git(path, *fetch, *refspecs, *missing, token=token, timeout=GitMirrorConstants.FETCH_TIMEOUT_SECONDS)
+        except GitMirrorError:
+            if not (missing and refspecs):
+                raise
+            # Servers that refuse fetching by SHA: the PR and branch refs bring the commits along
+            await _git(path, *fetch, *refspecs, token=token, timeout=GitMirrorConstants.FETCH_TIMEOUT_SECONDS)
+    if not await _has_commits(path, commits):
+        raise GitMirrorError(f"Fetching {key} did not bring commits {', '.join(commits)}")
+    logger.info("Fetched %d ref(s) and %d commit(s) of %s into its mirror", len(refspecs), len(missing), key)
+
+
+async def _evict(keep: str):
+    index = get_git_mirror_index()
+    for key in await asyncio.to_thread(index.eviction_candidates, keep):
+        path = mirror_path(key)
+        lock = _MirrorLock(path)
+        try:
+            # A mirror in use by another review is left for a later eviction
+            if not lock.try_exclusive():
+                continue
+            await asyncio.to_thread(shutil.rmtree, path, True)
+            await asyncio.to_thread(index.remove, key)
+            logger.info("Evicted git mirror %s", key)
+        finally:
+            lock.close()
+
+
+def _pathspecs(diff_filter: Optional[DiffFilter]) -> List[str]:
+    # Include patterns only: git pathspecs match at least what DiffFilter accepts (a superset), and the
+    # parser applies the exact filter. Excludes stay with the parser, which reports the skipped files.
+    if diff_filter is None or not diff_filter.include:
+        return []
+    pathspecs = []
+    for pattern in diff_filter.include:
+        # DiffFilter matches patterns without "/" against the file name in any directory
+        pathspecs.extend([pattern] if "/" in pattern else [pattern, f"*/{pattern}"])
+    return pathspecs
+
+
+async def _stream_diff(path: str, revisions: Tuple[str, str], parser: DiffStreamParser, pathspecs: List[str]) -> List[FileDiff]:
+    process = await asyncio.create_subprocess_exec(
+        "git", "diff", "--no-color", "--no-ext-diff", "--no-textconv", "--no-relative", "--find-renames",
+        "--src-prefix=a/", "--dst-prefix=b/", f"{revisions[0]}...{revisions[1]}", "--", *pathspecs,
+        cwd=path, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=_git_env(),
+    )
+    files: List[FileDiff] = []
+    stderr = asyncio.ensure_future(process.stderr.read())
+    try:
+        while not parser.done:
+            chunk = await process.stdout.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            files.extend(parser.feed(chunk))
+    finally:
+        if process.returncode is None and (parser.done or not process.stdout.at_eof()):
+            # Cut short (size limit or cancellation): the rest of the diff is not needed
+            process.kill()
+        await process.wait()
+        error = await stderr
+    if process.returncode != 0 and not parser.done:
+        raise GitMirrorError(f"git diff failed: {error.decode(errors='replace').strip()[-500:]}")
+    return files
+
+
+async def get_diff_from_mirror(
+    owner: str,
+    repo: str,
+    base: str,
+    head: str,
+    max_bytes: int = ReviewConstants.MAX_DIFF_BYTES,
+    token: str = "",
+    diff_filter: Optional[DiffFilter] = None,
+    pr_number: Optional[int] = None,
+) -> Tuple[List[FileDiff], bool, List[str]]:
+    """
+    Compute the diff of `base...head` in the repository's local mirror.
+
+    Same contract as get_diff_from_github: returns (files, truncated,
+    skipped_paths), with files rejected by `diff_filter` skipped and the
+    diff cut at the last complete hunk within `max_bytes`. Files outside
+    the filter's include patterns are not generated at all, so they are
+    not listed as skipped.
+
+    Args:
+        pr_number: Pull request the commits belong to; its ref is fetched
+            so commits from forks are available
+
+    Raises:
+        GitMirrorError: If git is not installed, or the mirror cannot be fetched or diffed
+    """
+    if not GIT_AVAILABLE:
+        raise GitMirrorError("git is not installed")
+    key = mirror_key(owner, repo)
+    path = mirror_path(key)
+    commits, refspecs, revisions = _revisions(base, head)
+
+    lock = _MirrorLock(path)
+    try:
+        await lock.acquire(exclusive=False)
+        # Branches move, so they are fetched every time; commits only when missing
+        if refspecs or not await _has_commits(path, commits):
+            await lock.acquire(exclusive=True)
+            # Another worker may have fetched the commits while this one waited for the lock
+            if refspecs or not await _has_commits(path, commits):
+                await _fetch(key, path, commits, refspecs, token, pr_number)
+            await lock.acquire(exclusive=False)
+        else:
+            logger.info("Mirror of %s already has %s...%s; no fetch needed", key, base, head)
+            await asyncio.to_thread(get_git_mirror_index().touch, key)
+
+        parser = DiffStreamParser(diff_filter, max_bytes)
+        with GITHUB_FETCH_SECONDS.labels("mirror_diff").time():
+            files = await _stream_diff(path, revisions, parser, _pathspecs(diff_filter))
+        files.extend(parser.close())
+    finally:
+        lock.close()
+
+    DIFF_BYTES.observe(parser.bytes_kept)
+    try:
+        await _evict(keep=key)
+    except Exception:
+        logger.warning("Could not evict git mirrors", exc_info=True)
+    return files, parser.truncated, parser.skipped_paths
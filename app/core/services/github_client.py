@@ -1,77 +1,483 @@
+import asyncio
+import json
 import os
+import random
+import re
+import time
+import weakref
 import httpx
 import logging
-import requests
-from typing import Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import HTTPException
+from app.core.services.circuit_breaker import GITHUB, check_circuit, record_failure, record_success
+from app.core.services.errors import ServiceError
+from app.core.services.rate_limiter import RateLimitTimeout, acquire_github, block_github, observe_github_quota
+from app.core.storage.http_cache import cache_key, get_http_cache
+from app.core.storage.pr_comments import body_hash, get_pr_comment_store
+from app.core.utils.constants import CommentConstants, GitHubConstants, ReviewConstants
+from app.core.utils.diff_parser import DiffFilter, DiffStreamParser, FileDiff
+from app.core.utils.metrics import COMMENT_POST_SECONDS, DIFF_BYTES, GITHUB_FETCH_SECONDS, GITHUB_RETRIES
 
-GITHUB_API = "https://api.github.com"
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+GITHUB_API = GitHubConstants.API_URL
 GITHUB_BOT_TOKEN = os.getenv("GITHUB_BOT_TOKEN")
 
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+COMMIT_SHA_RE = re.compile(r"^(?:[0-9a-f]{40}|[0-9a-f]{64})$")
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+
+
+def is_commit_sha(ref: Optional[str]) -> bool:
+    """Return True if `ref` is a full commit SHA, i.e. names immutable content."""
+    return bool(ref) and bool(COMMIT_SHA_RE.match(ref))
+
 
 logger = logging.getLogger(__name__)
 
 
-def get_pr_refs(owner: str, repo: str, pr_number: int, token: str) -> Tuple[str, str]:
-    """Fetches base and head refs from a GitHub PR.
+class GitHubClient:
+    """
+    Pooled GitHub API client with retries.
+
+    Owns one long-lived httpx.AsyncClient (HTTP/2 when the `h2` package is
+    installed) so connections are reused across requests. Requests are
+    retried with jittered exponential backoff on 5xx responses, and on 429
+    and secondary rate limit responses honoring `Retry-After` and
+    `X-RateLimit-Reset`. Non-idempotent requests are only retried when
+    GitHub rejected them without processing (rate limits, failed connects).
+
+    Each request first takes capacity from the token's shared rate limit
+    bucket, which every response's X-RateLimit-* headers keep up to date.
+    Requests fail fast with CircuitOpen while GitHub's circuit is open; a
+    request that still fails with a 5xx or transport error after its
+    retries counts against the circuit.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = GitHubConstants.MAX_RETRIES,
+        backoff_base: float = GitHubConstants.BACKOFF_BASE_SECONDS,
+        backoff_max: float = GitHubConstants.BACKOFF_MAX_SECONDS,
+        max_retry_wait: float = GitHubConstants.MAX_RETRY_WAIT_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_wait = max_retry_wait
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE and transport is None,
+            limits=httpx.Limits(
+                max_connections=GitHubConstants.MAX_CONNECTIONS,
+                max_keepalive_connections=GitHubConstants.MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(60, connect=10),
+            follow_redirects=True,
+            transport=transport,
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps many workers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _retry_delay(self, response: httpx.Response, attempt: int, idempotent: bool) -> Optional[float]:
+        """Return how long to wait before retrying `response`, or None if it should not be retried."""
+        status = response.status_code
+        if status in RETRYABLE_STATUS_CODES:
+            return self._backoff(attempt) if idempotent else None
+        if status not in (403, 429):
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if retry_after is not None:
+            try:
+                return max(float(retry_after), 0.0)
+            except ValueError:
+                pass
+        if remaining == "0" and reset is not None:
+            try:
+                return max(float(reset) - time.time(), 0.0) + 1
+            except ValueError:
+                pass
+        if status == 429:
+            return self._backoff(attempt)
+        # A 403 is only retryable when it is a secondary rate limit; GitHub asks for at least a minute
+        await response.aread()
+        if "secondary rate limit" in response.text.lower():
+            return 60.0
+        return None
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        token: str,
+        accept: str = "application/vnd.github+json",
+        stream: bool = False,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Send a request to the GitHub API, retrying transient failures.
+
+        Args:
+            method: HTTP method
+            url: Absolute URL or path relative to the GitHub API
+            token: GitHub token
+            accept: Accept header value
+            stream: Return without reading the body; the caller must close the response
+            **kwargs: Passed to httpx.AsyncClient.build_request (json, params, headers, ...)
+
+        Returns:
+            The final httpx.Response, successful or not
+
+        Raises:
+            ServiceError: 502 if GitHub could not be reached after all retries,
+                429 if the token's rate limit would not allow the request in time
+            CircuitOpen: If GitHub's circuit is open
+        """
+        await check_circuit(GITHUB)
+        try:
+            response = await self._request(method, url, token, accept, stream, **kwargs)
+        except ServiceError as e:
+            if e.status_code == 502:
+                await record_failure(GITHUB)
+            raise
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            await record_failure(GITHUB)
+        else:
+            await record_success(GITHUB)
+        return response
+
+    async def _request(
+        self, method: str, url: str, token: str, accept: str, stream: bool, **kwargs
+    ) -> httpx.Response:
+        if not url.startswith("http"):
+            url = f"{GITHUB_API}{url}"
+        headers = {"Accept": accept, "Authorization": f"token {token}", **kwargs.pop("headers", {})}
+        idempotent = method.upper() in ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+        attempt = 0
+        while True:
+            request = self.client.build_request(method, url, headers=headers, **kwargs)
+            try:
+                await acquire_github(token, self.max_retry_wait)
+            except RateLimitTimeout as e:
+                raise ServiceError(status_code=429, detail=f"GitHub rate limit: {e}") from e
+            try:
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                # A failed connect never reached GitHub, so it is safe to retry any method
+                retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if not retryable or attempt >= self.max_retries:
+                    raise ServiceError(status_code=502, detail=f"GitHub request failed: {e}") from e
+                delay = self._backoff(attempt)
+                GITHUB_RETRIES.labels("transport").inc()
+                logger.warning("GitHub %s %s failed (%s); retrying in %.1fs", method, request.url.path, e, delay)
+            else:
+                await observe_github_quota(token, response.headers)
+                delay = await self._retry_delay(response, attempt, idempotent)
+                if delay is not None and response.status_code in (403, 429):
+                    # Every worker using this token holds off, not just this request
+                    await block_github(token, delay)
+                if delay is None or attempt >= self.max_retries or delay > self.max_retry_wait:
+                    return response
+                await response.aclose()
+                GITHUB_RETRIES.labels(str(response.status_code)).inc()
+                logger.warning(
+                    "GitHub %s %s returned %s; retrying in %.1fs (attempt %d/%d)",
+                    method, request.url.path, response.status_code, delay, attempt + 1, self.max_retries,
+                )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def stream_cached(
+        self,
+        url: str,
+        token: str,
+        accept: str = "application/vnd.github+json",
+        immutable: bool = False,
+        chunk_size: int = 16384,
+    ) -> AsyncIterator[bytes]:
+        """
+        GET a resource through the conditional-request cache, yielding the body in chunks.
+
+        A cached entry for an immutable resource is served without a request.
+        Otherwise the cached ETag/Last-Modified are sent and a 304 is served
+        from the cache. A 200 body is cached only if the caller consumed the
+        whole stream, so bodies cut short by a size limit are never stored.
+
+        Args:
+            url: Absolute URL or path relative to the GitHub API
+            token: GitHub token
+            accept: Accept header value
+            immutable: The resource never changes (e.g. compare between commit SHAs)
+            chunk_size: Size of the yielded chunks
+
+        Raises:
+            ServiceError: With GitHub's status code and body for any other response
+        """
+        if not url.startswith("http"):
+            url = f"{GITHUB_API}{url}"
+        cache = get_http_cache()
+        key = cache_key(url, accept, token)
+        # The cache is SQLite, so its calls run in a worker thread, off the event loop
+        entry = await asyncio.to_thread(cache.get, key) if cache else None
+
+        if entry is not None and (immutable or entry.immutable):
+            logger.info("Serving %s from cache without a request", url)
+            for start in range(0, len(entry.body), chunk_size):
+                yield entry.body[start:start + chunk_size]
+            return
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = await self.request("GET", url, token, accept=accept, stream=True, headers=headers)
+        try:
+            if response.status_code == 304 and entry is not None:
+                logger.info("GitHub returned 304 for %s; serving cached body", url)
+                await asyncio.to_thread(cache.refresh, key)
+                body = entry.body
+                for start in range(0, len(body), chunk_size):
+                    yield body[start:start + chunk_size]
+                return
+
+            if response.status_code != 200:
+                await response.aread()
+                raise ServiceError(status_code=response.status_code, detail=response.text)
+
+            content = bytearray()
+            async for chunk in response.aiter_bytes(chunk_size=chunk_size):
+                if cache:
+                    content.extend(chunk)
+                yield chunk
+            # Only reached when the caller read the whole body
+            if cache and (response.headers.get("ETag") or response.headers.get("Last-Modified") or immutable):
+                await asyncio.to_thread(
+                    cache.put,
+                    key,
+                    bytes(content),
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    immutable=immutable,
+                )
+        finally:
+            await response.aclose()
+
+    async def get_cached(self, url: str, token: str, accept: str = "application/vnd.github+json") -> bytes:
+        """GET a whole resource through the conditional-request cache."""
+        body = bytearray()
+        async for chunk in self.stream_cached(url, token, accept=accept):
+            body.extend(chunk)
+        return bytes(body)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# One client per event loop; pooled connections cannot be shared across loops
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, GitHubClient]" = weakref.WeakKeyDictionary()
+
+
+def get_github_client() -> GitHubClient:
+    """Return the GitHub client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = GitHubClient()
+        _clients[loop] = client
+    return client
+
+
+async def get_pr_info(owner: str, repo: str, pr_number: int, token: str) -> Dict[str, Any]:
+    """Fetches base/head refs, commit SHAs and the changed line count of a GitHub PR.
 
+    The PR is fetched with a conditional request, so an unchanged PR costs a
+    304 that does not count against the rate limit.
     """
     if not token:
-        raise HTTPException(status_code=401, detail="GitHub token is required")
+        raise ServiceError(status_code=401, detail="GitHub token is required")
     
     url = f"{GITHUB_API}/repos/{owner}/{repo}/pulls/{pr_number}"
-    headers = {
-        "Accept": "application/vnd.github+json",
-        "Authorization": f"token {token}"
-    }
-    # TODO FUNKY exception handling and retries
-    resp = requests.get(url, headers=headers, timeout=15)
-    if resp.status_code != 200:
-        raise HTTPException(status_code=resp.status_code, detail=f"Failed to get PR info: {resp.text}")
+    try:
+        with GITHUB_FETCH_SECONDS.labels("pr_info").time():
+            body = await get_github_client().get_cached(url, token)
+    except ServiceError as e:
+        raise ServiceError(status_code=e.status_code, detail=f"Failed to get PR info: {e.detail}")
+
+    try:
+        pr_data = json.loads(body)
+        return {
+            "base_ref": pr_data["base"]["ref"],
+            "head_ref": pr_data["head"]["ref"],
+            "base_sha": pr_data["base"]["sha"],
+            "head_sha": pr_data["head"]["sha"],
+            "changed_lines": pr_data.get("additions", 0) + pr_data.get("deletions", 0),
+        }
+    except Exception as e:
+        raise ServiceError(status_code=502, detail=f"Invalid JSON from GitHub: {body[:200]!r} ({str(e)})")
+
+
+async def get_pr_refs(owner: str, repo: str, pr_number: int, token: str) -> Tuple[str, str]:
+    """Fetches base and head refs from a GitHub PR.
+
+    """
+    pr_info = await get_pr_info(owner, repo, pr_number, token)
+    return pr_info["base_ref"], pr_info["head_ref"]
+
 
+async def is_ancestor(owner: str, repo: str, ancestor: str, head: str, token: str) -> bool:
+    """Returns True if `head` is `ancestor` or a fast-forward of it (no force-push in between)."""
+    if not token:
+        raise ServiceError(status_code=401, detail="GitHub token is required")
+
+    # Only the compare status is needed; keep the commit list short
+    url = f"{GITHUB_API}/repos/{owner}/{repo}/compare/{ancestor}...{head}?per_page=1"
+    body = bytearray()
+    with GITHUB_FETCH_SECONDS.labels("compare").time():
+        async for chunk in get_github_client().stream_cached(
+            url, token, immutable=is_commit_sha(ancestor) and is_commit_sha(head)
+        ):
+            body.extend(chunk)
     try:
-        pr_data = resp.json()
-        base_ref = pr_data["base"]["ref"]
-        head_ref = pr_data["head"]["ref"]
-        return base_ref, head_ref
+        return json.loads(body).get("status") in ("ahead", "identical")
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Invalid JSON from GitHub: {resp.text[:200]} ({str(e)})")
+        raise ServiceError(status_code=502, detail=f"Invalid JSON from GitHub: {bytes(body[:200])!r} ({str(e)})")
 
 
-def get_diff_from_github(owner: str, repo: str, base: str, head: str, max_bytes: int = 500, token: str = "") -> Tuple[str, bool]:
+async def get_diff_from_github(
+    owner: str,
+    repo: str,
+    base: str,
+    head: str,
+    max_bytes: int = ReviewConstants.MAX_DIFF_BYTES,
+    token: str = "",
+    diff_filter: Optional[DiffFilter] = None,
+) -> Tuple[List[FileDiff], bool, List[str]]:
     """
-    Fetch diff from GitHub compare endpoint and return (diff_text, truncated).
+    Fetch diff from GitHub compare endpoint and return (files, truncated, skipped_paths).
+
+    The response is parsed while it streams in: files rejected by
+    `diff_filter` are never buffered, and once `max_bytes` of reviewable
+    diff is reached the last complete hunk is kept and the download stops.
+
+    A compare between two commit SHAs never changes, so a cached copy is
+    served without any request; other compares are revalidated by ETag.
     """
     if not token:
-        raise HTTPException(status_code=401, detail="GitHub token is required")
+        raise ServiceError(status_code=401, detail="GitHub token is required")
     
     url = f"{GITHUB_API}/repos/{owner}/{repo}/compare/{base}...{head}"
-    headers = {
-        "Accept": "application/vnd.github.v3.diff",
-        "Authorization": f"token {token}"
-    }
-    # TODO FUNKY exception handling and retries
-    resp = requests.get(url, headers=headers, stream=True, timeout=60)
-    if resp.status_code != 200:
-        raise HTTPException(status_code=resp.status_code, detail=f"GitHub compare failed: {resp.text}")
-
-    content = bytearray()
-    for chunk in resp.iter_content(chunk_size=16384):
-        if not chunk:
-            break
-        content.extend(chunk)
-        if len(content) > max_bytes:
-            break
-
-    truncated = len(content) > max_bytes
-    return bytes(content[:max_bytes]).decode("utf-8", errors="replace"), truncated
-
-
-async def post_comment_to_github(payload, token: Optional[str] = None):
+    immutable = is_commit_sha(base) and is_commit_sha(head)
+    parser = DiffStreamParser(diff_filter, max_bytes)
+    files: List[FileDiff] = []
+    chunks = get_github_client().stream_cached(url, token, accept=DIFF_MEDIA_TYPE, immutable=immutable)
+    try:
+        with GITHUB_FETCH_SECONDS.labels("diff").time():
+            async for chunk in chunks:
+                files.extend(parser.feed(chunk))
+                if parser.done:
+                    break
+    except ServiceError as e:
+        raise ServiceError(status_code=e.status_code, detail=f"GitHub compare failed: {e.detail}")
+    finally:
+        await chunks.aclose()
+
+    files.extend(parser.close())
+    DIFF_BYTES.observe(parser.bytes_kept)
+    return files, parser.truncated, parser.skipped_paths
+
+
+def _comment_error(response: httpx.Response) -> ServiceError:
+    error_detail = response.text
+    if response.status_code == 401:
+        error_detail = (
+            f"Bad credentials - Token may be invalid, expired, or missing required scopes. "
+            f"Ensure the token has 'repo' scope for private repos or 'public_repo' for public repos. "
+            f"Response: {response.text}"
+        )
+    return ServiceError(status_code=response.status_code, detail=error_detail)
+
+
+async def find_review_comment(repo: str, pr_number: int, token: str) -> Optional[int]:
+    """Finds the id of the bot's latest review comment on a PR by its hidden marker."""
+    client = get_github_client()
+    url: Optional[str] = f"{GITHUB_API}/repos/{repo}/issues/{pr_number}/comments?per_page=100"
+    comment_id = None
+    while url:
+        response = await client.request("GET", url, token)
+        if response.status_code != 200:
+            raise _comment_error(response)
+        for comment in response.json():
+            if CommentConstants.MARKER in (comment.get("body") or ""):
+                comment_id = comment["id"]
+        url = response.links.get("next", {}).get("url")
+    return comment_id
+
+
+async def post_review_to_github(repo: str, pr_number: int, inline_review: Dict[str, object], token: str) -> Dict[str, object]:
+    """
+    Submit findings as one Pull Request Review with all inline comments.
+
+    Args:
+        repo: Repository ("owner/repo")
+        pr_number: Pull request number
+        inline_review: Output of build_inline_review ("body", "comments", "commit_id")
+        token: GitHub token
+
+    Returns:
+        Dictionary with "review_id", "action" and the number of inline "comments"
+
+    Raises:
+        ServiceError: If GitHub rejects the review (422 when a comment is outside the diff)
+    """
+    review = {"event": "COMMENT", "body": inline_review["body"], "comments": inline_review["comments"]}
+    if inline_review.get("commit_id"):
+        review["commit_id"] = inline_review["commit_id"]
+    url = f"{GITHUB_API}/repos/{repo}/pulls/{pr_number}/reviews"
+    response = await get_github_client().request("POST", url, token, json=review)
+    if response.status_code != 200:
+        raise _comment_error(response)
+    logger.info(f"Review submitted repo:{repo} - Pr Number: {pr_number} ({len(review['comments'])} inline comments)")
+    return {"review_id": response.json()["id"], "action": "reviewed", "comments": len(review["comments"])}
+
+
+async def post_comment_to_github(payload, token: Optional[str] = None) -> Dict[str, object]:
     """
-    Post a comment to a GitHub PR.
+    Post a comment to a GitHub PR, recording how long it took.
+
+    Payloads with an "inline_review" that has comments are submitted as one
+    Pull Request Review instead, falling back to the comment if GitHub
+    rejects it.
+
+    In upsert mode (GITHUB_COMMENT_MODE=upsert) the bot's previous review
+    comment is edited in place: it is found through a locally cached
+    comment id (or its hidden marker), and nothing is sent when the
+    rendered body is unchanged.
+
+    Returns:
+        Dictionary with "comment_id" and "action" ("created", "updated" or "unchanged"),
+        or the post_review_to_github result
     """
+    start = time.perf_counter()
+    result = await _post_comment(payload)
+    COMMENT_POST_SECONDS.labels(result["action"]).observe(time.perf_counter() - start)
+    return result
+
+
+async def _post_comment(payload) -> Dict[str, object]:
     repo = payload.get("repo")
     pr_number = payload.get("pr_number")
     review_result = payload.get("review_result")
@@ -79,7 +485,7 @@ async def post_comment_to_github(payload, token: Optional[str] = None):
     token = payload.get("github_token")
 
     if not token:
-        raise HTTPException(
+        raise ServiceError(
             status_code=401,
             detail="GitHub token is required. Provide github_token in payload."
         )
@@ -95,22 +501,46 @@ async def post_comment_to_github(payload, token: Optional[str] = None):
     token_preview = f"{token[:7]}...{token[-4:]}" if len(token) > 11 else "***"
     logger.info(f"Posting comment to {repo} PR #{pr_number} using token: {token_preview}")
 
-    comment_body = f"{review_result}"
+    inline_review = payload.get("inline_review")
+    if inline_review and inline_review.get("comments"):
+        try:
+            return await post_review_to_github(repo, pr_number, inline_review, token)
+        except ServiceError as e:
+            if e.status_code != 422:
+                raise
+            logger.warning(f"Inline review rejected for {repo} PR #{pr_number}; posting summary comment: {e.detail}")
+
+    comment_body = f"{review_result}\n\n{CommentConstants.MARKER}"
+    client = get_github_client()
+
+    store = get_pr_comment_store() if CommentConstants.MODE == "upsert" else None
+    if store:
+        new_hash = body_hash(comment_body)
+        # The store is SQLite, so its calls run in a worker thread, off the event loop
+        cached = await asyncio.to_thread(store.get, repo, pr_number)
+        if cached and cached[1] == new_hash:
+            logger.info(f"Comment unchanged, skipping update repo:{repo} - Pr Number: {pr_number}")
+            return {"comment_id": cached[0], "action": "unchanged"}
+        comment_id = cached[0] if cached else await find_review_comment(repo, pr_number, token)
+        if comment_id:
+            url = f"{GITHUB_API}/repos/{repo}/issues/comments/{comment_id}"
+            response = await client.request("PATCH", url, token, json={"body": comment_body})
+            if response.status_code == 200:
+                await asyncio.to_thread(store.put, repo, pr_number, comment_id, new_hash)
+                logger.info(f"Comment updated repo:{repo} - Pr Number: {pr_number}")
+                return {"comment_id": comment_id, "action": "updated"}
+            if response.status_code not in (403, 404):
+                raise _comment_error(response)
+            # Deleted, or written by another account: post a fresh comment
+            logger.info(f"Review comment {comment_id} cannot be edited ({response.status_code}); posting a new one")
+            await asyncio.to_thread(store.delete, repo, pr_number)
+
     url = f"{GITHUB_API}/repos/{repo}/issues/{pr_number}/comments"
-    headers = {
-        "Accept": "application/vnd.github+json",
-        "Authorization": f"token {token}"
-    }
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json={"body": comment_body})
-        if response.status_code != 201:
-            error_detail = response.text
-            if response.status_code == 401:
-                error_detail = (
-                    f"Bad credentials - Token may be invalid, expired, or missing required scopes. "
-                    f"Ensure the token has 'repo' scope for private repos or 'public_repo' for public repos. "
-                    f"Response: {response.text}"
-                )
-            raise HTTPException(status_code=response.status_code, detail=error_detail)
+    response = await client.request("POST", url, token, json={"body": comment_body})
+    if response.status_code != 201:
+        raise _comment_error(response)
+    comment_id = response.json()["id"]
+    if store:
+        await asyncio.to_thread(store.put, repo, pr_number, comment_id, new_hash)
     logger.info(f"Comment Posted repo:{repo} - Pr Number: {pr_number}")
+    return {"comment_id": comment_id, "action": "created"}
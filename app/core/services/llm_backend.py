@@ -0,0 +1,156 @@
+"""
+Pluggable LLM backends for code review.
+
+The backend is chosen with LLM_BACKEND ("openai" or "stub") and created
+once per process, so its clients and connection pools are reused by every
+review. The stub backend answers locally with deterministic reviews and
+configurable latency, error rate and token throughput, which makes it
+possible to load-test the whole pipeline offline.
+
+Markdown reviews can also be streamed: backends yield the review in whole
+lines as it is generated, so complete findings can be shown before the
+review is finished.
+
+Async calls take capacity from the shared LLM rate limit buckets first
+(see app.core.services.rate_limiter) and go through the backend's circuit
+breaker (see app.core.services.circuit_breaker).
+"""
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Optional, Union
+
+from app.core.models.models import ReviewOutput
+from app.core.services.circuit_breaker import check_circuit, record_failure, record_success
+from app.core.services.rate_limiter import acquire_llm, backoff_llm
+from app.core.utils.constants import LLMConstants, RateLimitConstants
+from app.core.utils.prompts import get_code_review_prompt, get_structured_review_prompt
+from app.core.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend(ABC):
+    """Reviews a diff chunk and returns Markdown, or a ReviewOutput in structured mode."""
+
+    name: str = ""
+    # Model name; part of review cache keys and used to pick the tokenizer
+    model: str = ""
+
+    @abstractmethod
+    async def review(self, diff_text: str, structured: bool = False) -> Union[str, ReviewOutput]:
+        """
+        Review a diff.
+
+        Args:
+            diff_text: The code diff to analyze
+            structured: Return schema-validated findings instead of Markdown
+
+        Returns:
+            Markdown string containing the code review, or a ReviewOutput if `structured`
+
+        Raises:
+            RuntimeError: If the backend call fails
+            ValueError: If the response is empty or invalid
+        """
+
+    async def stream(self, diff_text: str) -> AsyncIterator[str]:
+        """
+        Review a diff in Markdown, yielding the review in whole lines as it is generated.
+
+        Backends that cannot stream yield the finished review at once.
+
+        Raises:
+            RuntimeError: If the backend call fails
+            ValueError: If the response is empty or invalid
+        """
+        yield await self.review(diff_text)
+
+
+_backend: Optional[LLMBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_llm_backend(name: str) -> LLMBackend:
+    """
+    Create an LLM backend by name.
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    # Imported lazily so the stub does not pull in the OpenAI SDK and vice versa
+    if name == "openai":
+        from app.core.services.open_ai_agent import OpenAIBackend
+        return OpenAIBackend()
+    if name == "stub":
+        from app.core.services.stub_llm import StubBackend
+        return StubBackend()
+    raise ValueError(f"Unknown LLM_BACKEND {name!r}; expected 'openai' or 'stub'")
+
+
+def get_llm_backend() -> LLMBackend:
+    """Return the process-wide LLM backend selected by LLM_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_llm_backend(LLMConstants.BACKEND)
+                logger.info("Using %s LLM backend (model %s)", _backend.name, _backend.model)
+    return _backend
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    # Backends wrap SDK errors; the SDK's RateLimitError carries the status code
+    return any(getattr(e, "status_code", None) == 429 for e in (error, error.__cause__) if e is not None)
+
+
+async def _stream_review(backend: LLMBackend, diff_text: str, on_text: Callable[[str], None]) -> str:
+    text = ""
+    async for lines in backend.stream(diff_text):
+        text += lines
+        on_text(text)
+    if not text.strip():
+        raise ValueError(f"{backend.name} LLM backend returned an empty response")
+    return text.strip()
+
+
+async def analyze_code_diff_async(
+    diff_text: str, structured: bool = False, on_text: Optional[Callable[[str], None]] = None
+) -> Union[str, ReviewOutput]:
+    """
+    Review a diff with the configured backend once the shared rate limits allow it.
+
+    Args:
+        diff_text: The code diff to analyze
+        structured: Return schema-validated findings instead of Markdown
+        on_text: Stream the Markdown review, calling this with the review generated
+            so far (whole lines only) as it grows; ignored if `structured`
+
+    Raises:
+        CircuitOpen: If the backend's circuit is open
+        RateLimitTimeout: If LLM capacity did not free up in time
+    """
+    backend = get_llm_backend()
+    await check_circuit(backend.name)
+    prompt_tokens = 0
+    if RateLimitConstants.OPENAI_TPM > 0:
+        prompt = get_structured_review_prompt(diff_text) if structured else get_code_review_prompt(diff_text)
+        prompt_tokens = count_tokens(prompt, backend.model)
+    await acquire_llm(backend.name, prompt_tokens)
+    try:
+        if on_text is not None and not structured:
+            review = await _stream_review(backend, diff_text, on_text)
+        else:
+            review = await backend.review(diff_text, structured=structured)
+    except ValueError:
+        # The backend answered, just not with a usable review
+        await record_success(backend.name)
+        raise
+    except Exception as e:
+        if _is_rate_limited(e):
+            await backoff_llm(backend.name)
+        else:
+            await record_failure(backend.name)
+        raise
+    await record_success(backend.name)
+    return review
@@ -1,57 +1,149 @@
+import asyncio
 import os
 import logging
-from openai import OpenAI
+import weakref
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from pydantic import ValidationError
 
-from app.core.utils.prompts import get_code_review_prompt
+from app.core.models.models import ReviewOutput
+from app.core.services.llm_backend import LLMBackend
+from app.core.utils.constants import LLMConstants
+from app.core.utils.metrics import LLM_TRUNCATIONS
+from app.core.utils.prompts import get_code_review_prompt, get_structured_review_prompt
 
 load_dotenv()
-model = os.getenv("MODEL", "gpt-4o-mini")
 
 logger = logging.getLogger(__name__)
 
 
-def analyze_code_diff(diff_text: str) -> str:
-    """
-    Analyze a code diff using OpenAI and return a Markdown-formatted review.
-    
-    Args:
-        diff_text: The code diff to analyze
-        
-    Returns:
-        Markdown string containing the code review
-        
-    Raises:
-        RuntimeError: If OPENAI_API_KEY is not set or API call fails
-        ValueError: If the API response is empty
-    """
-    prompt = get_code_review_prompt(diff_text)
-
+def _get_api_key() -> str:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY is not set. Set the environment variable or configure a secret.")
+    return api_key
+
+
+def _drop_unfinished_line(content: str) -> str:
+    # A response cut off at the output token cap ends mid-line, e.g. in a half-written table row
+    LLM_TRUNCATIONS.labels(OpenAIBackend.name).inc()
+    logger.warning("OpenAI response reached LLM_MAX_OUTPUT_TOKENS=%d; dropping its last line", LLMConstants.MAX_OUTPUT_TOKENS)
+    return content[:content.rfind("\n")] if "\n" in content else ""
 
-    client = OpenAI(api_key=api_key)
 
+def _extract_review(response) -> str:
+    content = response.choices[0].message.content
+    if content and response.choices[0].finish_reason == "length":
+        content = _drop_unfinished_line(content)
+
+    # Validate response content
+    if not content or not content.strip():
+        logger.error("OpenAI returned empty response")
+        raise ValueError("OpenAI API returned an empty response")
+
+    logger.info(f"Code review completed. Received {len(content)} characters of Markdown review.")
+    return content.strip()
+
+
+def _extract_structured_review(response) -> ReviewOutput:
+    content = response.choices[0].message.content
+    if not content or not content.strip():
+        logger.error("OpenAI returned empty response")
+        raise ValueError("OpenAI API returned an empty response")
+    if response.choices[0].finish_reason == "length":
+        LLM_TRUNCATIONS.labels(OpenAIBackend.name).inc()
+        raise ValueError(f"OpenAI API review exceeded LLM_MAX_OUTPUT_TOKENS={LLMConstants.MAX_OUTPUT_TOKENS}")
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4,
+        output = ReviewOutput.model_validate_json(content)
+    except ValidationError as e:
+        raise ValueError(f"OpenAI API returned a review that does not match the schema: {e}") from e
+    logger.info(f"Code review completed. Received {len(output.findings)} structured findings.")
+    return output
+
+
+def _request_kwargs(diff_text: str, structured: bool) -> Dict[str, Any]:
+    if not structured:
+        return {
+            "messages": [{"role": "user", "content": get_code_review_prompt(diff_text)}],
+            "max_completion_tokens": LLMConstants.MAX_OUTPUT_TOKENS,
+        }
+    return {
+        "messages": [{"role": "user", "content": get_structured_review_prompt(diff_text)}],
+        "max_completion_tokens": LLMConstants.MAX_OUTPUT_TOKENS,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "code_review", "strict": True, "schema": ReviewOutput.model_json_schema()},
+        },
+    }
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    LLM backend for the OpenAI Chat Completions API.
+
+    Clients are pooled per event loop because their connections cannot be
+    shared across loops (workers run one long-lived loop each). Completions
+    are capped at LLM_MAX_OUTPUT_TOKENS so runaway generations stop early.
+    """
+
+    name = "openai"
+
+    def __init__(self, model: Optional[str] = None, temperature: float = 0.4):
+        self.model = model or os.getenv("MODEL", "gpt-4o-mini")
+        self.temperature = temperature
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+            weakref.WeakKeyDictionary()
         )
-        content = response.choices[0].message.content
-        
-        # Validate response content
-        if not content or not content.strip():
-            logger.error("OpenAI returned empty response")
-            raise ValueError("OpenAI API returned an empty response")
-        
-        logger.info(f"Code review completed. Received {len(content)} characters of Markdown review.")
-        return content.strip()
-        
-    except ValueError as e:
-        raise
-    except Exception as e:
-        logger.error(f"Error during code analysis: {e}", exc_info=True)
-        raise RuntimeError(f"Failed to analyze code diff: {e}") from e
 
+    def _get_async_client(self) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(api_key=_get_api_key(), timeout=LLMConstants.TIMEOUT_SECONDS)
+            self._async_clients[loop] = client
+        return client
+
+    async def review(self, diff_text: str, structured: bool = False) -> Union[str, ReviewOutput]:
+        client = self._get_async_client()
+        try:
+            response = await client.chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                **_request_kwargs(diff_text, structured),
+            )
+            return _extract_structured_review(response) if structured else _extract_review(response)
+
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error during code analysis: {e}", exc_info=True)
+            raise RuntimeError(f"Failed to analyze code diff: {e}") from e
+
+    async def stream(self, diff_text: str) -> AsyncIterator[str]:
+        client = self._get_async_client()
+        pending, finish_reason = "", None
+        try:
+            response = await client.chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                stream=True,
+                **_request_kwargs(diff_text, structured=False),
+            )
+            async with response:
+                async for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    pending += chunk.choices[0].delta.content or ""
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    if "\n" in pending:
+                        lines, pending = pending.rsplit("\n", 1)
+                        yield lines + "\n"
+        except Exception as e:
+            logger.error(f"Error during code analysis: {e}", exc_info=True)
+            raise RuntimeError(f"Failed to analyze code diff: {e}") from e
+        if finish_reason == "length":
+            _drop_unfinished_line(pending)
+        elif pending:
+            yield pending
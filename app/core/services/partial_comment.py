@@ -0,0 +1,101 @@
+"""
+Progressive PR comment updates while a review streams.
+
+The findings of a running review are shown in the bot's review comment,
+which is created as a placeholder on the first update and then edited in
+place (upsert mode). Updates are throttled to one per
+REVIEW_STREAMING_UPDATE_SECONDS; only the latest findings are sent, and
+the finished review later replaces the placeholder through the comment
+task as usual.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from app.core.services.github_client import post_comment_to_github
+from app.core.utils.constants import CommentConstants, ReviewConstants, StreamingConstants
+from app.core.utils.metrics import FIRST_FEEDBACK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class PartialComment:
+    """Posts the latest partial review of a PR at most once per `interval` seconds."""
+
+    def __init__(self, payload: Dict[str, Any], interval: float = StreamingConstants.UPDATE_INTERVAL_SECONDS):
+        self.payload = payload
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._body: Optional[str] = None
+        self._changed = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, body: str):
+        """Replace the partial review to post; it is sent once the throttle interval allows."""
+        if self._closed.is_set():
+            return
+        self._body = body
+        self._changed.set()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        first = True
+        while True:
+            await self._changed.wait()
+            if self._closed.is_set():
+                return
+            self._changed.clear()
+            try:
+                await post_comment_to_github({
+                    "repo": self.payload.get("repo"),
+                    "pr_number": self.payload.get("pr_number"),
+                    "review_result": self._body,
+                    "github_token": self.payload.get("github_token"),
+                })
+            except Exception as e:
+                # Partial updates are best effort; the finished review is still posted by the comment task
+                logger.warning(
+                    "Stopped partial review updates for %s PR #%s: %s",
+                    self.payload.get("repo"), self.payload.get("pr_number"), e,
+                )
+                return
+            if first:
+                FIRST_FEEDBACK_SECONDS.observe(time.perf_counter() - self.started)
+                first = False
+            try:
+                await asyncio.wait_for(self._closed.wait(), timeout=self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        """Stop updating, waiting for an update already being sent so it cannot land after the final review."""
+        self._closed.set()
+        self._changed.set()
+        if self._task is not None:
+            await self._task
+
+
+def partial_comment_for(payload: Dict[str, Any]) -> Optional[PartialComment]:
+    """
+    Return a PartialComment for a review payload, or None if its review is not streamed to the PR.
+
+    Streaming needs REVIEW_STREAMING_ENABLED, a PR with a token, Markdown
+    reviews (not REVIEW_STRUCTURED_OUTPUT) and the summary comment edited in
+    place (GITHUB_COMMENT_MODE=upsert, output mode "comment").
+    """
+    output_mode = payload.get("output_mode") or CommentConstants.OUTPUT_MODE
+    if not (
+        StreamingConstants.ENABLED
+        and payload.get("repo")
+        and payload.get("pr_number")
+        and payload.get("github_token")
+        and not ReviewConstants.STRUCTURED_OUTPUT
+        and CommentConstants.MODE == "upsert"
+        and output_mode == "comment"
+    ):
+        return None
+    return PartialComment(payload)
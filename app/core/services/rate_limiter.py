@@ -0,0 +1,159 @@
+"""
+Shared rate limiting for the OpenAI and GitHub APIs.
+
+Every worker process on a host takes capacity from the same token buckets
+(see app.core.storage.rate_limits) before calling an API, so adding
+workers raises throughput up to the quota and no further, instead of
+turning the excess into 429s and retries.
+
+- LLM calls take one request from the RPM bucket and their estimated
+  tokens (prompt plus expected completion) from the TPM bucket, when
+  OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT are set. A 429 pauses every worker's
+  calls to that backend for LLM_RATE_LIMIT_BACKOFF_SECONDS, with or
+  without those limits.
+- GitHub requests are paced per token from the X-RateLimit-* headers of
+  earlier responses: the remaining quota is spread evenly until it resets.
+  Retry-After and secondary rate limits pause every worker using the token.
+
+Bucket updates are SQLite write transactions that may wait on other
+processes' locks, so they run in a worker thread, off the event loop.
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from typing import List, Mapping
+
+from app.core.storage.rate_limits import BucketRequest, get_rate_limits
+from app.core.utils.constants import RateLimitConstants
+from app.core.utils.metrics import RATE_LIMIT_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Longest single sleep between attempts, so waiters notice freed capacity soon
+MAX_POLL_SECONDS = 2.0
+
+
+class RateLimitTimeout(Exception):
+    """Raised when capacity did not become available within the allowed wait."""
+
+
+async def acquire(api: str, requests: List[BucketRequest], max_wait: float) -> float:
+    """
+    Wait until tokens can be taken from all of the given buckets, then take them.
+
+    Args:
+        api: API name for metrics and logs
+        requests: Buckets and amounts to take (see BucketRequest)
+        max_wait: Seconds to wait at most
+
+    Returns:
+        Seconds spent waiting
+
+    Raises:
+        RateLimitTimeout: If the tokens could not be taken within `max_wait`
+    """
+    start = time.monotonic()
+    limits = get_rate_limits()
+    while True:
+        wait = await asyncio.to_thread(limits.try_acquire, requests)
+        waited = time.monotonic() - start
+        if wait <= 0:
+            if waited > 0:
+                RATE_LIMIT_WAIT_SECONDS.labels(api).observe(waited)
+                logger.info("Waited %.1fs for %s rate limit capacity", waited, api)
+            return waited
+        if waited + wait > max_wait:
+            RATE_LIMIT_WAIT_SECONDS.labels(api).observe(waited)
+            raise RateLimitTimeout(f"{api} rate limit capacity not available within {max_wait:.0f}s")
+        # Jitter spreads waiters out so they do not retry in lockstep
+        await asyncio.sleep(min(wait, MAX_POLL_SECONDS) * random.uniform(1.0, 1.25))
+
+
+def _llm_buckets(backend: str, tokens: int) -> List[BucketRequest]:
+    # The block bucket hands out nothing; it only carries the pause after a 429
+    buckets: List[BucketRequest] = [(f"llm:{backend}:block", 0, 1, 1)]
+    if RateLimitConstants.OPENAI_RPM > 0:
+        rpm = RateLimitConstants.OPENAI_RPM
+        buckets.append((f"llm:{backend}:rpm", 1, rpm, rpm / 60))
+    if RateLimitConstants.OPENAI_TPM > 0:
+        tpm = RateLimitConstants.OPENAI_TPM
+        buckets.append((f"llm:{backend}:tpm", tokens + RateLimitConstants.OPENAI_EXPECTED_OUTPUT_TOKENS, tpm, tpm / 60))
+    return buckets
+
+
+async def acquire_llm(backend: str, prompt_tokens: int):
+    """
+    Take capacity for one LLM call with the given prompt size.
+
+    Raises:
+        RateLimitTimeout: If capacity did not free up within LLM_RATE_LIMIT_MAX_WAIT_SECONDS
+    """
+    await acquire("llm", _llm_buckets(backend, prompt_tokens), RateLimitConstants.LLM_MAX_WAIT_SECONDS)
+
+
+def _block(buckets: List[BucketRequest], until: float):
+    limits = get_rate_limits()
+    for name, _, capacity, rate in buckets:
+        limits.block(name, until, capacity, rate)
+
+
+async def backoff_llm(backend: str):
+    """Pause every worker's LLM calls after the API answered 429."""
+    until = time.time() + RateLimitConstants.LLM_BACKOFF_SECONDS
+    await asyncio.to_thread(_block, _llm_buckets(backend, 0), until)
+    logger.warning("LLM rate limited; pausing %s calls for %.0fs", backend, RateLimitConstants.LLM_BACKOFF_SECONDS)
+
+
+def _github_bucket(token: str) -> str:
+    # Quotas are per token; never store the token itself
+    return "github:" + hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+async def acquire_github(token: str, max_wait: float):
+    """
+    Take capacity for one GitHub request made with `token`.
+
+    Tokens whose quota GitHub has not reported yet are not limited.
+
+    Raises:
+        RateLimitTimeout: If capacity did not free up within `max_wait`
+    """
+    if RateLimitConstants.GITHUB_ENABLED and token:
+        await acquire("github", [(_github_bucket(token), 1, None, None)], max_wait)
+
+
+async def observe_github_quota(token: str, headers: Mapping[str, str]):
+    """Update a token's GitHub bucket from the X-RateLimit-* headers of a response."""
+    if not RateLimitConstants.GITHUB_ENABLED or not token:
+        return
+    if headers.get("X-RateLimit-Resource", "core") != "core":
+        return
+    try:
+        remaining = int(headers["X-RateLimit-Remaining"])
+        reset = float(headers["X-RateLimit-Reset"])
+        limit = int(headers.get("X-RateLimit-Limit", remaining))
+    except (KeyError, ValueError):
+        return
+
+    now = time.time()
+    spare = remaining - RateLimitConstants.GITHUB_RESERVE
+    burst = RateLimitConstants.GITHUB_BURST
+    if spare > 0:
+        # Spread what is left evenly over the rest of the window
+        await asyncio.to_thread(
+            get_rate_limits().update_quota, _github_bucket(token), spare, burst, spare / max(reset - now, 1.0)
+        )
+    else:
+        # Out of quota until the window resets; then pace at the full hourly limit
+        await asyncio.to_thread(
+            get_rate_limits().update_quota, _github_bucket(token), 0, burst, max(limit, 1) / 3600, reset + 1
+        )
+
+
+async def block_github(token: str, seconds: float):
+    """Pause every worker's GitHub requests with `token` (e.g. after Retry-After or a secondary rate limit)."""
+    if RateLimitConstants.GITHUB_ENABLED and token and seconds > 0:
+        # Tokens whose quota GitHub has not reported yet have no bucket to block
+        await asyncio.to_thread(_block, [(_github_bucket(token), 1, None, None)], time.time() + seconds)
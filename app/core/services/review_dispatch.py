@@ -0,0 +1,442 @@
+"""
+Submit and run PR reviews with coalescing.
+
+Reviews of a pull request are keyed on (repo, pr_number, head SHA).
+Submitting a head that is already queued, running or recently reviewed
+returns the existing task id. A new head supersedes older reviews of the
+same PR: queued ones are skipped when they start and running ones are
+cancelled at their next await point. New reviews are delayed by a short
+debounce window so a burst of pushes only reviews the last head.
+
+The API never calls GitHub: a PR review submitted without a "head_sha"
+is enqueued as is, and the worker resolves the PR's head when the review
+starts and registers it then. A review whose head turns out to be already
+queued, running or recently reviewed is dropped as a duplicate.
+
+Every submitted task's progress and outcome is recorded in the review
+result store, where the API serves it to clients waiting on the review.
+Tasks are handed to the review scheduler, which prioritizes them and
+limits how many reviews each tenant has queued at once. Batches of reviews
+are registered together and handed to the scheduler in one bulk publish.
+
+Tasks failed fast by an open circuit breaker are deferred: parked in their
+queue's retry queue, from which the broker returns them after
+CIRCUIT_RETRY_DELAY_SECONDS. A deferred PR review posts a short "review
+deferred" comment, which the real review later replaces.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.rabbit_mq.publisher import publish_task, publish_task_delayed
+from app.core.services.circuit_breaker import GITHUB, CircuitOpen, is_open
+from app.core.services.review_scheduler import finish_review, review_priority, schedule_batch, schedule_review
+from app.core.storage import review_jobs, review_results
+from app.core.storage.review_batches import get_review_batches
+from app.core.storage.review_jobs import get_review_jobs
+from app.core.storage.review_results import get_review_results
+from app.core.utils.constants import CircuitConstants, QueueConstants, ReviewJobConstants, TaskConstants
+from app.core.utils.inline_review import build_inline_review
+from app.core.utils.review_format import format_deferred_notice, format_review_result
+
+logger = logging.getLogger(__name__)
+
+# Review result fields reported by the status API alongside the formatted review
+RESULT_FIELDS = ("chunks", "failed_chunks", "cached_hunks", "truncated", "skipped_files", "incremental_from", "token_budget")
+
+
+class ReviewSuperseded(Exception):
+    """Raised when a review job was superseded by a review of a newer PR head, or duplicates a review of its head."""
+
+    def __init__(self, task_id: str, duplicate_of: Optional[str] = None):
+        super().__init__(f"{task_id} duplicates {duplicate_of}" if duplicate_of else task_id)
+        self.duplicate_of = duplicate_of
+
+
+async def dispatch_review(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Enqueue a review task, coalescing it with existing reviews of the same PR head.
+
+    Reviews that pin the PR head ("head_sha") are coalesced here; other PR
+    reviews are coalesced by the worker once it has resolved the head (see
+    run_review_job). Requests without a PR are enqueued without coalescing.
+
+    Args:
+        payload: Review request payload including the GitHub token
+
+    Returns:
+        Dictionary with "task_id" and "duplicate" (True if an existing task id was returned)
+    """
+    repo, pr_number = payload.get("repo"), payload.get("pr_number")
+    task_id = str(uuid.uuid4())
+    if not _is_pr_review(payload):
+        await _publish_review(payload, task_id, review_priority(payload))
+        return {"task_id": task_id, "duplicate": False}
+
+    if payload.get("head_sha"):
+        task_id, created = await asyncio.to_thread(
+            get_review_jobs().submit, repo, pr_number, payload["head_sha"], task_id
+        )
+        if not created:
+            logger.info("Review of %s PR #%s at %s already submitted as %s", repo, pr_number, payload["head_sha"], task_id)
+            return {"task_id": task_id, "duplicate": True}
+    await _publish_review(payload, task_id, review_priority(payload), countdown=ReviewJobConstants.DEBOUNCE_SECONDS)
+    return {"task_id": task_id, "duplicate": False}
+
+
+def _is_pr_review(payload: Dict[str, Any]) -> bool:
+    repo = payload.get("repo")
+    return bool(repo and "/" in repo and payload.get("pr_number") and not payload.get("diff"))
+
+
+async def _publish_review(payload: Dict[str, Any], task_id: str, priority: int, countdown: Optional[float] = None):
+    # Recorded before publishing, so a fast worker's progress is never overwritten by "queued"
+    results = get_review_results()
+    await asyncio.to_thread(results.update, task_id, review_results.QUEUED)
+    try:
+        await schedule_review(payload, task_id, priority, countdown=countdown)
+    except Exception as e:
+        await asyncio.to_thread(results.update, task_id, review_results.FAILED, error=f"Failed to dispatch task: {e}")
+        raise
+
+
+async def dispatch_batch(payloads: List[Dict[str, Any]], max_in_flight: int) -> Dict[str, Any]:
+    """
+    Enqueue a batch of review tasks under one batch id.
+
+    Reviews are coalesced like single reviews: here when their payload pins
+    the PR head ("head_sha"), otherwise by the worker. All new tasks are recorded and scheduled
+    together, and at most `max_in_flight` of them are queued or running at
+    a time.
+
+    Args:
+        payloads: Review request payloads including the GitHub token
+        max_in_flight: Reviews of the batch that may be queued or running at once
+
+    Returns:
+        Dictionary with "batch_id", "max_in_flight" and "tasks" (one entry
+        per payload with "task_id", "repo", "pr_number" and "duplicate")
+
+    Raises:
+        Exception: If no task of the batch could be published
+    """
+    batch_id = str(uuid.uuid4())
+    # The stores are SQLite, so the batch is registered in a worker thread, off the event loop
+    tasks, entries = await asyncio.to_thread(_register_batch, payloads, batch_id, max_in_flight)
+    failed = await schedule_batch(entries, batch_id, max_in_flight)
+    if failed:
+        await asyncio.to_thread(_record_dispatch_failures, failed)
+    if entries and len(failed) == len(entries):
+        raise next(iter(failed.values()))
+    logger.info("Dispatched batch %s: %d review(s), %d failed to publish", batch_id, len(entries), len(failed))
+    return {"batch_id": batch_id, "max_in_flight": max_in_flight, "tasks": tasks}
+
+
+def _register_batch(
+    payloads: List[Dict[str, Any]], batch_id: str, max_in_flight: int
+) -> Tuple[List[Dict[str, Any]], List[Tuple[str, Dict[str, Any], int]]]:
+    tasks, entries = [], []
+    for payload in payloads:
+        payload["batch_id"] = batch_id
+        repo, pr_number = payload.get("repo"), payload.get("pr_number")
+        task_id, created = str(uuid.uuid4()), True
+        if _is_pr_review(payload) and payload.get("head_sha"):
+            task_id, created = get_review_jobs().submit(repo, pr_number, payload["head_sha"], task_id)
+        tasks.append({"task_id": task_id, "repo": repo, "pr_number": pr_number, "duplicate": not created})
+        if created:
+            entries.append((task_id, payload, review_priority(payload)))
+
+    # Recorded before publishing, so a fast worker's progress is never overwritten by "queued"
+    get_review_results().update_many([task_id for task_id, _, _ in entries], review_results.QUEUED)
+    get_review_batches().create(batch_id, tasks, max_in_flight)
+    return tasks, entries
+
+
+def _record_dispatch_failures(failed: Dict[str, BaseException]):
+    for task_id, error in failed.items():
+        get_review_results().update(task_id, review_results.FAILED, error=f"Failed to dispatch task: {error}")
+        get_review_jobs().finish(task_id, review_jobs.FAILED)
+
+
+def build_comment_payload(
+    payload: Dict[str, Any], review_result: Dict[str, Any], task_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Build the comment task payload for a finished review.
+
+    The summary comment is always included; in inline output mode the
+    findings are also prepared as one Pull Request Review submission, with
+    the summary comment as the fallback if GitHub rejects it.
+
+    When the review's task id is given, the formatted review is stored as
+    the task's result and the comment task reports back to the same record.
+    """
+    comment_payload = {
+        "repo": payload.get("repo"),
+        "pr_number": payload.get("pr_number"),
+        "review_result": format_review_result(review_result),
+        "github_token": payload.get("github_token"),
+    }
+    if "commentable_lines" in review_result:
+        comment_payload["inline_review"] = build_inline_review(review_result, review_result.get("head_sha"))
+    if task_id:
+        comment_payload["review_task_id"] = task_id
+        result = {key: review_result[key] for key in RESULT_FIELDS if key in review_result}
+        result["review"] = comment_payload["review_result"]
+        get_review_results().update(task_id, review_results.RUNNING, stage="posting_comment", result=result)
+    return comment_payload
+
+
+def review_progress(task_id: str) -> Callable[[str], None]:
+    """Return a callback that records the current stage of a running review."""
+    def report(stage: str):
+        get_review_results().update(task_id, review_results.RUNNING, stage=stage)
+    return report
+
+
+def record_comment_result(payload: Dict[str, Any], outcome: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+    """
+    Record the outcome of a comment task on its review's result record.
+
+    Args:
+        payload: Comment task payload (see build_comment_payload)
+        outcome: post_comment_to_github result if the comment was posted
+        error: Error message if posting failed
+    """
+    task_id = payload.get("review_task_id")
+    if not task_id:
+        return
+    if error is not None:
+        get_review_results().update(task_id, review_results.FAILED, stage="posting_comment", error=error)
+    else:
+        get_review_results().update(task_id, review_results.DONE, result={"comment": outcome})
+
+
+async def review_task(payload: Dict[str, Any], task_id: str) -> Dict[str, Any]:
+    """
+    Review the diff of a review task, recording its progress.
+
+    When the review is streamed (see partial_comment_for), its findings so
+    far are shown in the PR comment while it runs.
+
+    Returns:
+        Review result dictionary for build_comment_payload
+    """
+    # Imported here so the API, which only dispatches reviews, does not load the review pipeline
+    from app.core.services.partial_comment import partial_comment_for
+    from app.core.services.review_service import review_code
+
+    partial = partial_comment_for(payload)
+    try:
+        return await review_code(payload, progress=review_progress(task_id), partial=partial.update if partial else None)
+    finally:
+        if partial:
+            await partial.close()
+
+
+def ensure_current(task_id: str):
+    """
+    Raise ReviewSuperseded if a newer review replaced this job.
+
+    Raises:
+        ReviewSuperseded: If the job was superseded
+    """
+    if get_review_jobs().status(task_id) == review_jobs.SUPERSEDED:
+        raise ReviewSuperseded(task_id)
+
+
+async def run_review_job(task_id: str, coro: Awaitable[Any], payload: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Run a review coroutine, cancelling it if a newer push supersedes the job.
+
+    A PR review submitted without a head SHA is registered as a job first:
+    the PR's head is resolved, written into `payload` so the review covers
+    exactly that head, and coalesced with the PR's other reviews. Tasks
+    that are not registered jobs (no PR, or a head that could not be
+    resolved) run unconditionally. The outcome is recorded in the review
+    result store either way, and the job's scheduler slot is freed unless
+    the review is to be deferred.
+
+    Args:
+        task_id: Task id of the review
+        coro: Review coroutine
+        payload: Review task payload, if the job may still need registering
+
+    Returns:
+        The coroutine's result
+
+    Raises:
+        ReviewSuperseded: If the job was superseded before or while running, or duplicates another job
+        CircuitOpen: If an upstream is unavailable; the caller defers the review (see defer_review)
+    """
+    results = get_review_results()
+    try:
+        if payload is not None:
+            try:
+                await _register_job(payload, task_id)
+            except BaseException:
+                coro.close()
+                raise
+        result = await _run_review_job(task_id, coro)
+    except ReviewSuperseded as e:
+        duplicate = {"duplicate_of": e.duplicate_of} if e.duplicate_of else None
+        await asyncio.to_thread(results.update, task_id, review_results.SUPERSEDED, result=duplicate)
+        await finish_review(task_id)
+        raise
+    except CircuitOpen:
+        # Not finished: the job keeps its scheduler slot until it runs again
+        await asyncio.to_thread(results.update, task_id, review_results.QUEUED, stage="deferred")
+        raise
+    except BaseException as e:
+        await asyncio.to_thread(results.update, task_id, review_results.FAILED, error=str(e) or type(e).__name__)
+        await finish_review(task_id)
+        raise
+    await finish_review(task_id)
+    return result
+
+
+async def _register_job(payload: Dict[str, Any], task_id: str):
+    """Resolve the head of a PR review submitted without one and register the review as a job."""
+    if not _is_pr_review(payload) or payload.get("head_sha"):
+        return
+    # Imported here so the API, which never calls GitHub, does not load the GitHub client
+    from app.core.services.github_client import get_pr_info
+
+    repo, pr_number = payload["repo"], payload["pr_number"]
+    owner, name = repo.split("/", 1)
+    try:
+        pr_info = await get_pr_info(owner, name, pr_number, token=payload.get("github_token"))
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        logger.warning("Could not resolve head of %s PR #%s, not coalescing: %s", repo, pr_number, e)
+        return
+    payload["head_sha"] = pr_info["head_sha"]
+    existing, created = await asyncio.to_thread(get_review_jobs().submit, repo, pr_number, payload["head_sha"], task_id)
+    # A redelivered task finds its own job
+    if not created and existing != task_id:
+        logger.info("Review of %s PR #%s at %s already submitted as %s", repo, pr_number, payload["head_sha"], existing)
+        raise ReviewSuperseded(task_id, duplicate_of=existing)
+
+
+async def _run_review_job(task_id: str, coro: Awaitable[Any]) -> Any:
+    jobs = get_review_jobs()
+    status = await asyncio.to_thread(jobs.start, task_id)
+    if status == review_jobs.SUPERSEDED:
+        coro.close()
+        raise ReviewSuperseded(task_id)
+    await asyncio.to_thread(get_review_results().update, task_id, review_results.RUNNING, stage="starting")
+    if status is None:
+        return await coro
+
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=ReviewJobConstants.SUPERSEDE_POLL_SECONDS)
+            if done:
+                break
+            if await asyncio.to_thread(jobs.status, task_id) == review_jobs.SUPERSEDED:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                logger.info("Cancelled review %s: superseded by a newer push", task_id)
+                raise ReviewSuperseded(task_id)
+        result = task.result()
+    except ReviewSuperseded:
+        raise
+    except CircuitOpen:
+        await asyncio.to_thread(jobs.finish, task_id, review_jobs.QUEUED)
+        raise
+    except BaseException:
+        task.cancel()
+        await asyncio.to_thread(jobs.finish, task_id, review_jobs.FAILED)
+        raise
+    await asyncio.to_thread(jobs.finish, task_id, review_jobs.DONE)
+    return result
+
+
+async def _defer_task(
+    queue_name: str, task_name: str, payload: Dict[str, Any], task_id: str, error: CircuitOpen, priority: Optional[int] = None
+) -> int:
+    deferrals = payload.get("deferrals", 0)
+    if deferrals >= CircuitConstants.MAX_DEFERRALS:
+        logger.error("Giving up on task %s after %d deferrals: %s", task_id, deferrals, error)
+        raise error
+    await publish_task_delayed(
+        queue_name, task_name, [{**payload, "deferrals": deferrals + 1}], task_id=task_id, priority=priority
+    )
+    logger.warning(
+        "Deferred task %s by %ds (deferral %d/%d): %s",
+        task_id, QueueConstants.RETRY_DELAY_SECONDS, deferrals + 1, CircuitConstants.MAX_DEFERRALS, error,
+    )
+    return deferrals + 1
+
+
+def _record_deferral_failure(task_id: str, error: str):
+    get_review_results().update(task_id, review_results.FAILED, error=error)
+    get_review_jobs().finish(task_id, review_jobs.FAILED)
+
+
+async def defer_review(payload: Dict[str, Any], task_id: str, error: CircuitOpen) -> Dict[str, Any]:
+    """
+    Park a review failed fast by an open circuit in the review retry queue.
+
+    On the first deferral of a PR review a short "review deferred" comment
+    is queued, unless GitHub itself is the unavailable upstream.
+
+    Args:
+        payload: Review task payload
+        task_id: Review task id; the retried task keeps it
+        error: The CircuitOpen that stopped the review
+
+    Returns:
+        Task result dictionary with status "deferred"
+
+    Raises:
+        CircuitOpen: If the review was already deferred CIRCUIT_MAX_DEFERRALS times
+    """
+    try:
+        deferrals = await _defer_task(
+            QueueConstants.CODE_REVIEW_QUEUE, TaskConstants.REVIEW_CODE_TASK, payload, task_id, error,
+            priority=review_priority(payload),
+        )
+    except BaseException as e:
+        await asyncio.to_thread(_record_deferral_failure, task_id, f"Review could not be deferred: {e}")
+        await finish_review(task_id)
+        raise
+
+    comment_queued = False
+    if (
+        deferrals == 1
+        and CircuitConstants.DEFERRED_COMMENT
+        and payload.get("pr_number")
+        and payload.get("github_token")
+        and not await asyncio.to_thread(is_open, GITHUB)
+    ):
+        notice = {
+            "repo": payload.get("repo"),
+            "pr_number": payload.get("pr_number"),
+            "review_result": format_deferred_notice(error.upstream),
+            "github_token": payload.get("github_token"),
+        }
+        try:
+            await publish_task(QueueConstants.GITHUB_COMMENT_QUEUE, TaskConstants.POST_COMMENT_TASK, [notice])
+            comment_queued = True
+        except Exception:
+            logger.warning("Could not queue the deferred review notice for task %s", task_id, exc_info=True)
+    return {"status": "deferred", "upstream": error.upstream, "comment_queued": comment_queued}
+
+
+async def defer_comment(payload: Dict[str, Any], task_id: str, error: CircuitOpen) -> Dict[str, Any]:
+    """
+    Park a comment task failed fast by an open circuit in the comment retry queue.
+
+    Raises:
+        CircuitOpen: If the comment was already deferred CIRCUIT_MAX_DEFERRALS times
+    """
+    await _defer_task(QueueConstants.GITHUB_COMMENT_QUEUE, TaskConstants.POST_COMMENT_TASK, payload, task_id, error)
+    if payload.get("review_task_id"):
+        await asyncio.to_thread(
+            get_review_results().update, payload["review_task_id"], review_results.RUNNING, stage="comment_deferred"
+        )
+    return {"status": "deferred", "upstream": error.upstream}
@@ -0,0 +1,259 @@
+"""
+Fair scheduling of review tasks across tenants.
+
+Reviews are published to the review queue with an AMQP priority: PRs
+flagged by the caller first, then small diffs, then the rest, with very
+large diffs last. Each tenant (the repository owner) may only have a
+limited number of reviews queued or running, scaled by its configured
+weight; the rest wait in its backlog and are published as its earlier
+reviews finish. A tenant bulk-submitting hundreds of PRs therefore only
+ever occupies its own share of the queue, and other tenants' reviews are
+queued right away.
+
+Reviews submitted as a batch are added to the backlog together and are
+also limited per batch (see schedule_batch). Whatever the backlog can
+release is published in one pipelined bulk publish.
+
+The backlog and the tenants' slots live in SQLite under DEFEXAI_DATA_DIR
+and are read and written in a worker thread, off the event loop. That
+state is host-local, so the scheduler requires the API and the workers to
+run on one host: a worker on another host cannot free the slot of a
+review it finished, and the slot stays taken until its lease
+(REVIEW_SLOT_LEASE_SECONDS) expires. Multi-host deployments must set
+REVIEW_SCHEDULER_ENABLED=false.
+"""
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.rabbit_mq.publisher import publish_confirmed
+from app.core.rabbit_mq.task_message import build_task_message
+from app.core.storage import review_jobs, review_results
+from app.core.storage.review_backlog import BacklogEntry, get_review_backlog
+from app.core.storage.review_jobs import get_review_jobs
+from app.core.storage.review_results import get_review_results
+from app.core.utils.constants import QueueConstants, SchedulerConstants, TaskConstants
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() and weight.strip():
+            try:
+                weights[name.strip().lower()] = float(weight)
+            except ValueError:
+                logger.warning("Ignoring invalid tenant weight %r", item)
+    return weights
+
+
+TENANT_WEIGHTS = _parse_weights(SchedulerConstants.TENANT_WEIGHTS)
+
+
+def tenant_key(payload: Dict[str, Any]) -> str:
+    """Return the tenant a review is scheduled under: the repository owner, or "" for bare diffs."""
+    repo = payload.get("repo") or ""
+    return repo.split("/", 1)[0].lower() if "/" in repo else ""
+
+
+def tenant_limit(tenant: str) -> int:
+    """Return how many reviews a tenant may have queued or running at once (at least one)."""
+    return max(math.ceil(SchedulerConstants.TENANT_CONCURRENCY * TENANT_WEIGHTS.get(tenant, 1.0)), 1)
+
+
+def review_priority(payload: Dict[str, Any], changed_lines: Optional[int] = None) -> int:
+    """
+    Return the queue priority of a review.
+
+    Args:
+        payload: Review request payload; "priority": true flags it as urgent
+        changed_lines: Lines added plus deleted, if known (counted from an inline diff otherwise)
+    """
+    if payload.get("priority"):
+        return SchedulerConstants.PRIORITY_FLAGGED
+    if changed_lines is None and payload.get("diff"):
+        changed_lines = sum(
+            1 for line in payload["diff"].splitlines()
+            if line.startswith(("+", "-")) and not line.startswith(("+++", "---"))
+        )
+    if changed_lines is None:
+        return SchedulerConstants.PRIORITY_DEFAULT
+    if changed_lines <= SchedulerConstants.SMALL_DIFF_LINES:
+        return SchedulerConstants.PRIORITY_SMALL
+    if changed_lines > SchedulerConstants.LARGE_DIFF_LINES:
+        return SchedulerConstants.PRIORITY_LARGE
+    return SchedulerConstants.PRIORITY_DEFAULT
+
+
+def _task_message(task_id: str, payload: Dict[str, Any], priority: int, countdown: Optional[float]):
+    eta = datetime.now(timezone.utc) + timedelta(seconds=countdown) if countdown else None
+    # A batch's reviews are tagged as members of one Celery group
+    return build_task_message(
+        TaskConstants.REVIEW_CODE_TASK, [payload], task_id=task_id, eta=eta, priority=priority,
+        group_id=payload.get("batch_id"),
+    )
+
+
+async def _publish_all(entries: List[Tuple[str, Dict[str, Any], int, Optional[float]]]) -> Dict[str, Optional[Exception]]:
+    # Publishes (task_id, payload, priority, countdown) entries in one bulk publish; maps each task id to its error
+    try:
+        outcomes = await publish_confirmed(
+            QueueConstants.CODE_REVIEW_QUEUE, [_task_message(*entry) for entry in entries]
+        )
+    except Exception as e:
+        outcomes = [e] * len(entries)
+    return {entry[0]: outcome for entry, outcome in zip(entries, outcomes)}
+
+
+async def schedule_review(payload: Dict[str, Any], task_id: str, priority: int, countdown: Optional[float] = None):
+    """
+    Publish a review task now, or hold it in its tenant's backlog until a slot frees up.
+
+    Args:
+        payload: Review task payload
+        task_id: Task id
+        priority: Queue priority (see review_priority)
+        countdown: Seconds to wait before the review may run
+    """
+    if not SchedulerConstants.ENABLED:
+        error = (await _publish_all([(task_id, payload, priority, countdown)]))[task_id]
+        if error is not None:
+            raise error
+        return
+    tenant = tenant_key(payload)
+    backlog = get_review_backlog()
+    await asyncio.to_thread(backlog.add, tenant, task_id, payload, priority, time.time() + (countdown or 0))
+    released = await release_backlog()
+    if released.get(task_id) is not None:
+        # The caller reports the failure; do not publish this task later behind its back
+        await asyncio.to_thread(backlog.remove, task_id)
+        raise released[task_id]
+    if task_id not in released:
+        await asyncio.to_thread(
+            get_review_results().update, task_id, review_results.QUEUED, stage="waiting_for_slot"
+        )
+        logger.info(
+            "Review %s held back: tenant %r is at its limit of %d (%d waiting)",
+            task_id, tenant, tenant_limit(tenant), await asyncio.to_thread(backlog.backlog_size, tenant),
+        )
+
+
+async def schedule_batch(
+    entries: List[Tuple[str, Dict[str, Any], int]], batch_id: str, max_in_flight: int
+) -> Dict[str, Exception]:
+    """
+    Schedule the reviews of a batch with one backlog write and one bulk publish.
+
+    At most `max_in_flight` of the batch's reviews are queued or running at
+    a time, on top of their tenants' limits; the rest wait in the backlog.
+    Without the scheduler (REVIEW_SCHEDULER_ENABLED=false) all reviews are
+    published at once.
+
+    Args:
+        entries: (task_id, payload, priority) of each review
+        batch_id: Batch id
+        max_in_flight: Reviews of the batch that may be queued or running at once
+
+    Returns:
+        Task ids whose publish failed, mapped to the error; they are not retried
+    """
+    if not SchedulerConstants.ENABLED:
+        released = await _publish_all([(task_id, payload, priority, None) for task_id, payload, priority in entries])
+        return {task_id: error for task_id, error in released.items() if error is not None}
+
+    backlog = get_review_backlog()
+    now = time.time()
+    await asyncio.to_thread(
+        backlog.add_many,
+        [(tenant_key(payload), task_id, payload, priority, now) for task_id, payload, priority in entries],
+        batch_id=batch_id,
+        batch_limit=max_in_flight,
+    )
+    released = await release_backlog()
+    failed = {}
+    waiting = []
+    for task_id, _, _ in entries:
+        if released.get(task_id) is not None:
+            # The caller reports the failure; do not publish this task later behind its back
+            await asyncio.to_thread(backlog.remove, task_id)
+            failed[task_id] = released[task_id]
+        elif task_id not in released:
+            waiting.append(task_id)
+    if waiting:
+        await asyncio.to_thread(
+            get_review_results().update_many, waiting, review_results.QUEUED, stage="waiting_for_slot"
+        )
+        logger.info("Batch %s: %d review(s) held back by batch or tenant limits", batch_id, len(waiting))
+    return failed
+
+
+async def release_backlog() -> Dict[str, Optional[Exception]]:
+    """
+    Publish backlog entries whose tenants (and batches) have free slots.
+
+    Entries superseded while waiting are dropped instead of published. The
+    rest are published together; entries the broker did not confirm go
+    back to the backlog and are retried when the next review finishes or is
+    submitted.
+
+    Returns:
+        Task ids that were published or dropped (mapped to None), and ids
+        whose publish failed (mapped to the error)
+    """
+    backlog = get_review_backlog()
+    released: Dict[str, Optional[Exception]] = {}
+    while True:
+        ready, dropped = await asyncio.to_thread(_take_ready, backlog)
+        if not ready:
+            return released
+        released.update(dropped)
+        publish = [
+            (task_id, payload, priority, max(not_before - time.time(), 0))
+            for task_id, payload, priority, not_before, _, _ in ready
+            if task_id not in dropped
+        ]
+
+        outcomes = await _publish_all(publish)
+        failed = [entry for entry in ready if outcomes.get(entry[0]) is not None]
+        for entry in failed:
+            logger.error("Failed to publish scheduled review %s: %s", entry[0], outcomes[entry[0]])
+        if failed:
+            await asyncio.to_thread(_return_to_backlog, backlog, failed)
+        released.update(outcomes)
+        if failed:
+            return released
+        # Slots freed by dropped entries can admit more of the backlog
+        if not dropped:
+            return released
+
+
+def _take_ready(backlog) -> Tuple[List[BacklogEntry], Dict[str, Optional[Exception]]]:
+    """Take the entries that may run now, dropping (and freeing the slots of) those superseded while waiting."""
+    ready = backlog.take_ready(tenant_limit)
+    dropped: Dict[str, Optional[Exception]] = {}
+    for task_id, _, _, _, _, _ in ready:
+        if get_review_jobs().status(task_id) == review_jobs.SUPERSEDED:
+            get_review_results().update(task_id, review_results.SUPERSEDED)
+            backlog.release(task_id)
+            dropped[task_id] = None
+    return ready, dropped
+
+
+def _return_to_backlog(backlog, entries: List[BacklogEntry]):
+    for task_id, payload, priority, not_before, batch_id, batch_limit in entries:
+        backlog.release(task_id)
+        backlog.add(tenant_key(payload), task_id, payload, priority, not_before, batch_id, batch_limit)
+
+
+async def finish_review(task_id: str):
+    """Free a finished review's slot and publish whatever its tenant's backlog can now run."""
+    if SchedulerConstants.ENABLED and await asyncio.to_thread(get_review_backlog().release, task_id):
+        try:
+            await release_backlog()
+        except Exception:
+            logger.exception("Failed to release review backlog after %s", task_id)
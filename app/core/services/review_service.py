@@ -1,38 +1,318 @@
-from fastapi import HTTPException
-
+import asyncio
+import functools
 import logging
 import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
 
-from app.core.models.models import ReviewRequest
-from app.core.services.github_client import get_pr_refs, get_diff_from_github
-from app.core.services.open_ai_agent import analyze_code_diff
+from app.core.models.models import ReviewOutput, ReviewRequest
+from app.core.services.circuit_breaker import CircuitOpen
+from app.core.services.errors import ServiceError
+from app.core.services.github_client import get_pr_info, get_diff_from_github, is_ancestor, is_commit_sha
+from app.core.services.llm_backend import analyze_code_diff_async, get_llm_backend
+from app.core.storage.pr_reviews import PrReviewState, carry_forward_rows, filter_key, get_pr_review_store
+from app.core.storage.review_cache import (
+    assign_rows_to_hunks,
+    get_review_cache,
+    hunk_cache_key,
+    to_absolute_rows,
+    to_relative_rows,
+)
+from app.core.utils.constants import CommentConstants, ReviewConstants
+from app.core.utils.diff_chunker import chunk_diff, chunk_files
+from app.core.utils.diff_parser import DiffFilter, FileDiff, parse_diff
+from app.core.utils.inline_review import commentable_lines
+from app.core.utils.log_utils import log_sampled, redact
+from app.core.utils.metrics import DIFF_BACKEND_FALLBACKS, DIFF_BYTES, DIFF_TRUNCATIONS, LLM_SECONDS, PROMPT_TOKENS
+from app.core.utils.prompt_budget import budget_files
+from app.core.utils.prompts import PROMPT_VERSION, STRUCTURED_PROMPT_VERSION
+from app.core.utils.review_format import (
+    finding_to_row,
+    format_partial_review,
+    merge_reviews,
+    parse_review_markdown,
+    render_review_output,
+    render_review_table,
+)
+from app.core.utils.tokens import count_tokens
 
 
 logger = logging.getLogger(__name__)
 
+DIFF_BACKENDS = ("github", "git")
+
+
+async def review_chunks(
+    chunks: List[str],
+    max_concurrency: int,
+    structured: bool = False,
+    on_text: Optional[Callable[[int, str], None]] = None,
+) -> List[Optional[Union[str, ReviewOutput]]]:
+    """
+    Review diff chunks concurrently with at most `max_concurrency` LLM calls in flight.
+
+    Args:
+        chunks: Diff chunks to review
+        max_concurrency: Maximum number of concurrent LLM calls
+        structured: Request schema-validated JSON findings instead of Markdown
+        on_text: Stream the Markdown reviews, calling this with a chunk's index and
+            its review so far as it grows (see analyze_code_diff_async)
+
+    Returns:
+        Review per chunk (Markdown, or ReviewOutput if `structured`), in chunk order;
+        None for chunks whose review failed
+
+    Raises:
+        CircuitOpen: If the LLM's circuit opened, so the whole review can be
+            deferred instead of posted with chunks missing
+    """
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    backend = get_llm_backend().name
+
+    async def review_chunk(index: int, chunk: str) -> Union[str, ReviewOutput]:
+        async with semaphore:
+            logger.info("Reviewing diff chunk %d/%d (%d chars)", index + 1, len(chunks), len(chunk))
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                review = await analyze_code_diff_async(
+                    chunk, structured=structured, on_text=functools.partial(on_text, index) if on_text else None
+                )
+                outcome = "ok"
+                return review
+            except CircuitOpen:
+                outcome = "circuit_open"
+                raise
+            finally:
+                LLM_SECONDS.labels(backend, outcome).observe(time.perf_counter() - start)
+
+    results = await asyncio.gather(
+        *(review_chunk(index, chunk) for index, chunk in enumerate(chunks)),
+        return_exceptions=True,
+    )
+
+    circuit_open = next((result for result in results if isinstance(result, CircuitOpen)), None)
+    if circuit_open is not None:
+        raise circuit_open
+
+    reviews: List[Optional[Union[str, ReviewOutput]]] = []
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            logger.error("AI analysis failed for diff chunk %d/%d", index + 1, len(chunks), exc_info=result)
+            reviews.append(None)
+        else:
+            reviews.append(result)
+    return reviews
+
+
+async def review_files(
+    files: List[FileDiff], raw_text: Optional[str] = None, partial: Optional[Callable[[str], None]] = None
+) -> Dict[str, Any]:
+    """
+    Review parsed file diffs, reusing cached per-hunk reviews where possible.
+
+    The diff is first compacted and trimmed to the prompt token budget. Only
+    hunks missing from the review cache are then chunked and sent to the LLM.
+    Rows of freshly reviewed chunks are attributed back to their hunks and
+    cached; cached rows are rebuilt into a table alongside the fresh reviews.
+
+    Args:
+        files: Parsed file diffs
+        raw_text: Original diff text, reviewed as-is if it contained no parseable files
+        partial: Stream Markdown reviews, calling this with a placeholder comment
+            (format_partial_review) whenever findings are added: first the cached
+            ones, then each table row as the LLM completes it
+
+    Returns:
+        Dictionary with "reviews" (Markdown per reviewed chunk), "chunks",
+        "failed_chunks", "cached_hunks" and "token_budget"
+
+    Raises:
+        ServiceError: If every chunk sent to the LLM failed
+    """
+    structured = ReviewConstants.STRUCTURED_OUTPUT
+    model = get_llm_backend().model
+    prompt_version = STRUCTURED_PROMPT_VERSION if structured else PROMPT_VERSION
+    parsed = bool(files)
+    files, token_budget = budget_files(files, model=model, structured=structured)
+    hunks = [(diff_file, hunk) for diff_file in files for hunk in diff_file.hunks]
+    cache = get_review_cache() if hunks else None
+
+    keys = [hunk_cache_key(diff_file, hunk, model, prompt_version) for diff_file, hunk in hunks]
+    # The cache is SQLite, so its calls run in a worker thread, off the event loop
+    cached = await asyncio.to_thread(cache.get_many, keys) if cache else {}
+    key_by_hunk = {id(hunk): key for (_, hunk), key in zip(hunks, keys)}
+
+    if not parsed and raw_text:
+        # Not a parseable unified diff; review the text in chunks cut at line boundaries
+        chunk_texts = chunk_diff(raw_text, ReviewConstants.CHUNK_TOKEN_BUDGET)
+        chunks = []
+    else:
+        # Header-only files (renames, mode changes) are only worth a look alongside fresh hunks
+        has_fresh = not hunks or any(key not in cached for key in keys)
+        fresh_files = []
+        for diff_file in files:
+            fresh = [hunk for hunk in diff_file.hunks if key_by_hunk[id(hunk)] not in cached]
+            if fresh or (not diff_file.hunks and has_fresh):
+                fresh_files.append(diff_file.copy_with(fresh))
+        chunks = chunk_files(fresh_files, ReviewConstants.CHUNK_TOKEN_BUDGET)
+        chunk_texts = [chunk.text for chunk in chunks]
+    token_budget["prompt_tokens"] = (
+        token_budget["instruction_tokens"] * len(chunk_texts)
+        + sum(count_tokens(text, model) for text in chunk_texts)
+    )
+    PROMPT_TOKENS.observe(token_budget["prompt_tokens"])
+    logger.info(
+        "Reviewing %d file(s): %d/%d hunks cached, %d chunk(s) to review",
+        len(files), len(cached), len(hunks), len(chunk_texts),
+    )
+
+    cached_rows = [
+        row
+        for (_, hunk), key in zip(hunks, keys)
+        if key in cached
+        for row in to_absolute_rows(cached[key], hunk)
+    ]
+    cached_reviews = [render_review_table(cached_rows)] if cached_rows else []
+
+    on_text = None
+    if partial is not None and chunk_texts and not structured:
+        streamed = [""] * len(chunk_texts)
 
-async def review_code(payload):
+        def report_text(index: int, text: str):
+            added, streamed[index] = text[len(streamed[index]):], text
+            # Re-rendered only when a table row was completed
+            if "|" in added:
+                partial(format_partial_review(cached_reviews + streamed, len(chunk_texts)))
+
+        on_text = report_text
+
+        if cached_reviews:
+            partial(format_partial_review(cached_reviews, len(chunk_texts)))
+
+    results = (
+        await review_chunks(
+            chunk_texts, ReviewConstants.MAX_CONCURRENT_LLM_CALLS, structured=structured, on_text=on_text
+        )
+        if chunk_texts else []
+    )
+    # Structured findings are rendered to Markdown so the result stays JSON-serializable for the comment task
+    reviews = [
+        render_review_output(review) if isinstance(review, ReviewOutput) else review
+        for review in results
+        if review is not None
+    ]
+    failed_chunks = len(results) - len(reviews)
+    if results and not reviews:
+        # Every chunk failed; return a controlled 500 to client (stack traces were logged per chunk)
+        raise ServiceError(status_code=500, detail="AI code review failed for all diff chunks")
+
+    if cache and chunks:
+        # Oversized hunks can span several chunks; cache them only if every part was reviewed
+        fresh_rows: Dict[str, List[List[str]]] = {}
+        failed_keys = set()
+        for chunk, review in zip(chunks, results):
+            chunk_keys = [key_by_hunk[id(hunk)] for _, hunk in chunk.hunks]
+            if review is None:
+                failed_keys.update(chunk_keys)
+                continue
+            if isinstance(review, ReviewOutput):
+                rows = [finding_to_row(finding) for finding in review.findings]
+            else:
+                _, rows = parse_review_markdown(review)
+            for (_, hunk), key, hunk_rows in zip(chunk.hunks, chunk_keys, assign_rows_to_hunks(rows, chunk.hunks)):
+                fresh_rows.setdefault(key, []).extend(to_relative_rows(hunk_rows, hunk))
+        await asyncio.to_thread(cache.put_many, {key: rows for key, rows in fresh_rows.items() if key not in failed_keys})
+
+    reviews.extend(cached_reviews)
+
+    # Per-chunk reviews are merged into one table by format_review_result
+    return {
+        "reviews": reviews,
+        "chunks": len(chunk_texts),
+        "failed_chunks": failed_chunks,
+        "cached_hunks": len(cached),
+        "token_budget": token_budget,
+    }
+
+
+async def fetch_diff(
+    backend: Optional[str],
+    owner: str,
+    repo: str,
+    base: str,
+    head: str,
+    max_bytes: int,
+    token: str,
+    diff_filter: DiffFilter,
+    pr_number: Optional[int] = None,
+):
+    """
+    Fetch the diff of `base...head` from the selected diff backend.
+
+    The "git" backend computes it in a local mirror of the repository (see
+    git_mirror); if the mirror cannot be fetched or diffed, the diff comes
+    from the compare API instead. The "github" backend uses the compare API.
+
+    Returns:
+        Tuple of (files, truncated, skipped_paths), as from get_diff_from_github
+
+    Raises:
+        ServiceError: 400 if the backend is unknown
+    """
+    backend = (backend or ReviewConstants.DIFF_BACKEND).lower()
+    if backend not in DIFF_BACKENDS:
+        raise ServiceError(status_code=400, detail=f"Unknown diff_backend {backend!r}; expected 'github' or 'git'")
+    if backend == "git":
+        # Imported here so deployments on the compare API never load the mirror code
+        from app.core.services.git_mirror import get_diff_from_mirror
+
+        try:
+            return await get_diff_from_mirror(
+                owner, repo, base, head, max_bytes, token=token, diff_filter=diff_filter, pr_number=pr_number
+            )
+        except Exception as e:
+            DIFF_BACKEND_FALLBACKS.inc()
+            logger.warning("Git mirror diff of %s/%s failed, using the compare API: %s", owner, repo, e)
+    return await get_diff_from_github(owner, repo, base, head, max_bytes, token=token, diff_filter=diff_filter)
+
+
+async def review_code(
+    payload, progress: Optional[Callable[[str], None]] = None, partial: Optional[Callable[[str], None]] = None
+):
+    """
+    Review a diff, given as text or fetched from GitHub for a PR or base/head range.
+
+    Args:
+        payload: ReviewRequest or equivalent dictionary
+        progress: Called with the name of each stage ("fetching_diff", "reviewing") as it starts
+        partial: Called with a placeholder comment of the findings so far while the
+            review streams (see review_files)
+
+    Returns:
+        Review result dictionary for format_review_result
+    """
+    progress = progress or (lambda stage: None)
     if isinstance(payload, ReviewRequest):
         payload_dict = payload.dict()
     else:
         payload_dict = payload
     
     if not payload_dict.get('github_token'):
-        raise HTTPException(status_code=401, detail="github_token is required")
+        raise ServiceError(status_code=401, detail="github_token is required")
     
     diff_text = payload_dict.get('diff')
-    try:
-        # TODO remove FUNKY 
-        logger.info("FUNKY review_code payload: %s", payload_dict)
-    except Exception:
-        # Fallback to repr() if dict() isn't available for some reason
-        logger.info("review_code payload (repr): %s", repr(payload_dict))
+    diff_filter = DiffFilter(include=payload_dict.get('include_paths'), exclude=payload_dict.get('exclude_paths'))
+    max_bytes = payload_dict.get('max_bytes') or ReviewConstants.MAX_DIFF_BYTES
+    pr_store = pr_state = incremental_from = None
+    log_sampled(logger, "review_code payload: %s", redact(payload_dict))
     if not diff_text:
         if not payload_dict.get('repo'):
-            raise HTTPException(status_code=400, detail="Either diff or repo info must be provided")
+            raise ServiceError(status_code=400, detail="Either diff or repo info must be provided")
 
         if "/" not in payload_dict.get('repo'):
-            raise HTTPException(status_code=400, detail="repo must be 'owner/repo'")
+            raise ServiceError(status_code=400, detail="repo must be 'owner/repo'")
 
         owner, repo = payload_dict.get('repo').split("/", 1)
 
@@ -43,38 +323,77 @@ async def review_code(payload):
         if payload_dict.get('pr_number'):
             try:
                 
-                base, head = get_pr_refs(owner, repo, payload_dict.get('pr_number'), token=token)
-                # TODO remove FUNKY 
-                logger.info("FUNKY Fetched PR refs for %s/%s PR %s: %s...%s", owner, repo, payload_dict.get('pr_number'), base, head)
+                pr_info = await get_pr_info(owner, repo, payload_dict.get('pr_number'), token=token)
+                # Compare commit SHAs rather than branch names: same diff, but immutable and cacheable
+                # A head SHA pinned at submission wins, so coalesced jobs review exactly that head
+                base, head = pr_info["base_sha"], payload_dict.get('head_sha') or pr_info["head_sha"]
+                logger.debug("Fetched PR refs for %s/%s PR %s: %s...%s", owner, repo, payload_dict.get('pr_number'), base, head)
             except Exception:
                 logger.exception("Failed to fetch PR refs for %s/%s PR %s", owner, repo, payload_dict.get('pr_number'))
                 raise
 
         if not base or not head:
-            raise HTTPException(status_code=400, detail="Provide either diff or base/head or pr_number")
+            raise ServiceError(status_code=400, detail="Provide either diff or base/head or pr_number")
 
+        # After a PR was reviewed, review only the commits pushed since (unless history was rewritten)
+        pr_number = payload_dict.get('pr_number')
+        pr_store = get_pr_review_store() if pr_number and is_commit_sha(head) else None
+        review_filter_key = filter_key(payload_dict.get('include_paths'), payload_dict.get('exclude_paths'))
+        pr_state = await asyncio.to_thread(pr_store.get, payload_dict['repo'], pr_number) if pr_store else None
+        if pr_state and pr_state.filter_key == review_filter_key and pr_state.head_sha != head:
+            try:
+                if await is_ancestor(owner, repo, pr_state.head_sha, head, token=token):
+                    incremental_from = pr_state.head_sha
+                    base = incremental_from
+                    logger.info("Reviewing %s/%s PR %s incrementally from %s", owner, repo, pr_number, incremental_from)
+            except Exception:
+                logger.warning("Could not compare %s with last reviewed head; reviewing the full PR", head, exc_info=True)
+
+        progress("fetching_diff")
         try:
-            diff_text, truncated = get_diff_from_github(owner, repo, base, head, payload_dict.get('max_bytes'), token=token)
-            # TODO remove FUNKY 
-            logger.info("FUNKY Fetched diff for %s/%s %s...%s (truncated=%s) ", owner, repo, base, head, truncated)
-            # TODO remove FUNKY 
-            logger.info("FUNKY Diff content : %s", diff_text)
+            files, truncated, skipped_paths = await fetch_diff(
+                payload_dict.get('diff_backend'), owner, repo, base, head, max_bytes,
+                token=token, diff_filter=diff_filter, pr_number=pr_number,
+            )
+            logger.info("Fetched diff for %s/%s %s...%s: %d file(s) (truncated=%s)", owner, repo, base, head, len(files), truncated)
+            log_sampled(logger, "Diff files: %s (skipped: %s)", [f.path for f in files], skipped_paths)
         except Exception:
             logger.exception("Failed to fetch diff for %s/%s %s...%s", owner, repo, base, head)
             raise
     else:
-        truncated = False
+        if not diff_text.strip():
+            raise ServiceError(status_code=400, detail="Empty diff (no changes found)")
+        files, parser = parse_diff(diff_text, diff_filter, max_bytes)
+        truncated, skipped_paths = parser.truncated, parser.skipped_paths
+        DIFF_BYTES.observe(parser.bytes_kept)
 
-    if not diff_text.strip():
-        raise HTTPException(status_code=400, detail="Empty diff (no changes found)")
-    try:
-        review_markdown = analyze_code_diff(diff_text)
-    except Exception as e:
-        # Log stack trace for server-side debugging, then return a controlled 500 to client
-        logger.exception("AI analysis failed")
-        raise HTTPException(status_code=500, detail=f"AI code review failed: {e}")
+    if not files and not skipped_paths and not diff_text and not incremental_from:
+        raise ServiceError(status_code=400, detail="Empty diff (no changes found)")
 
-    return {
-        "truncated": truncated,
-        "review": review_markdown
-    }
\ No newline at end of file
+    # Fall back to the raw text only if it was not a diff at all (rather than fully filtered out)
+    progress("reviewing")
+    review_result = await review_files(files, raw_text=None if skipped_paths else diff_text, partial=partial)
+    review_result["truncated"] = truncated
+    review_result["skipped_files"] = skipped_paths
+    if truncated:
+        DIFF_TRUNCATIONS.labels("max_bytes").inc()
+    if review_result["token_budget"]["dropped_hunks"]:
+        DIFF_TRUNCATIONS.labels("token_budget").inc()
+
+    if (payload_dict.get('output_mode') or CommentConstants.OUTPUT_MODE) == "inline" and payload_dict.get('pr_number') and not diff_text:
+        # Inline comments can only anchor to lines in the PR diff; a delta diff is only safe for added lines
+        review_result["commentable_lines"] = commentable_lines(files, added_only=bool(incremental_from))
+        review_result["head_sha"] = head if is_commit_sha(head) else None
+    if incremental_from:
+        # Earlier findings still apply unless the new commits touched their lines
+        carried_rows = carry_forward_rows(pr_state.rows, files)
+        if carried_rows:
+            review_result["reviews"].insert(0, render_review_table(carried_rows))
+        review_result["incremental_from"] = incremental_from
+    if pr_store and not (truncated or review_result["failed_chunks"] or review_result["token_budget"]["dropped_hunks"]):
+        # Only a complete review is a safe starting point for the next incremental one
+        _, rows = parse_review_markdown(merge_reviews(review_result["reviews"]))
+        await asyncio.to_thread(
+            pr_store.put, payload_dict['repo'], pr_number, PrReviewState(head, review_filter_key, rows)
+        )
+    return review_result
\ No newline at end of file
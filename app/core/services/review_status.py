@@ -0,0 +1,196 @@
+"""
+Serve review task status to clients waiting on a review.
+
+Workers in other processes update the shared review result store, so
+waiting requests are woken by a poller that re-reads the records of every
+watched task in one query every few hundred milliseconds, in a worker
+thread so the API's event loop never blocks on SQLite. Long-poll requests
+return when the task reaches a terminal status; event streams send every
+stage change and end with the final result. Batch status aggregates the
+records of all of a batch's tasks.
+"""
+import asyncio
+import json
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.storage.review_batches import get_review_batches
+from app.core.storage.review_results import TERMINAL_STATUSES, get_review_results
+from app.core.utils.constants import ReviewResultConstants
+
+
+def _is_update(record: Optional[Dict[str, Any]], after_version: int) -> bool:
+    return record is None or record["version"] > after_version or record["status"] in TERMINAL_STATUSES
+
+
+class _RecordPoller:
+    """Re-read the records of all watched tasks once per poll interval and wake the waiters whose task changed."""
+
+    def __init__(self):
+        self.waiters: Dict[str, List[Tuple[int, asyncio.Future]]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def watch(self, task_id: str, after_version: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(task_id, []).append((after_version, future))
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return future
+
+    async def _run(self):
+        results = get_review_results()
+        try:
+            while self.waiters:
+                await asyncio.sleep(ReviewResultConstants.POLL_SECONDS)
+                task_ids = list(self.waiters)
+                records = await asyncio.to_thread(results.get_many, task_ids)
+                for task_id in task_ids:
+                    record = records.get(task_id)
+                    for after_version, future in self.waiters.get(task_id, []):
+                        if not future.done() and _is_update(record, after_version):
+                            future.set_result(record)
+                    # Waiters that timed out are cancelled, so they are dropped here too
+                    pending = [waiter for waiter in self.waiters.get(task_id, []) if not waiter[1].done()]
+                    if pending:
+                        self.waiters[task_id] = pending
+                    else:
+                        self.waiters.pop(task_id, None)
+        finally:
+            self.task = None
+
+
+# One poller per event loop; futures cannot be shared across loops
+_pollers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _RecordPoller]" = weakref.WeakKeyDictionary()
+
+
+def _get_poller() -> _RecordPoller:
+    loop = asyncio.get_running_loop()
+    poller = _pollers.get(loop)
+    if poller is None:
+        poller = _RecordPoller()
+        _pollers[loop] = poller
+    return poller
+
+
+async def wait_for_update(task_id: str, after_version: int, timeout: float) -> Optional[Dict[str, Any]]:
+    """
+    Wait until a task's record is newer than `after_version`, is terminal, or the timeout passes.
+
+    Args:
+        task_id: Review task id
+        after_version: Version of the record the caller already has (0 for none)
+        timeout: Seconds to wait at most
+
+    Returns:
+        The task's latest record, or None if the task is unknown or its record expired
+    """
+    record = await asyncio.to_thread(get_review_results().get, task_id)
+    if _is_update(record, after_version) or timeout <= 0:
+        return record
+    try:
+        return await asyncio.wait_for(_get_poller().watch(task_id, after_version), timeout)
+    except asyncio.TimeoutError:
+        # Unchanged as of the last poll
+        return record
+
+
+async def wait_for_result(task_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """
+    Wait until a task reaches a terminal status or the timeout passes.
+
+    Returns:
+        The task's latest record, or None if the task is unknown or its record expired
+    """
+    deadline = time.monotonic() + max(min(timeout, ReviewResultConstants.MAX_WAIT_SECONDS), 0)
+    record = await asyncio.to_thread(get_review_results().get, task_id)
+    while record is not None and record["status"] not in TERMINAL_STATUSES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        record = await wait_for_update(task_id, record["version"], remaining)
+    return record
+
+
+async def batch_status(batch_id: str, include_results: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Return the aggregated progress of a review batch.
+
+    Args:
+        batch_id: Batch id
+        include_results: Include each finished task's result (the formatted review and its stats)
+
+    Returns:
+        Dictionary with "batch_id", "status" ("running" until every task is
+        terminal, then "done"), "total", "completed", per-status "counts",
+        "max_in_flight", "created_at" and one entry per task; None if the
+        batch is unknown or expired
+    """
+    batch = await asyncio.to_thread(get_review_batches().get, batch_id)
+    if batch is None:
+        return None
+    records = await asyncio.to_thread(get_review_results().get_many, [task["task_id"] for task in batch["tasks"]])
+    counts: Dict[str, int] = {}
+    tasks = []
+    for task in batch["tasks"]:
+        record = records.get(task["task_id"])
+        # Expired records count as finished, so a batch outliving its results still completes
+        status = record["status"] if record else "expired"
+        counts[status] = counts.get(status, 0) + 1
+        entry = {
+            **task,
+            "status": status,
+            "stage": record["stage"] if record else None,
+            "error": record["error"] if record else None,
+        }
+        if include_results:
+            entry["result"] = record["result"] if record else None
+        tasks.append(entry)
+    completed = sum(count for status, count in counts.items() if status in TERMINAL_STATUSES or status == "expired")
+    return {
+        "batch_id": batch_id,
+        "status": "done" if completed == len(tasks) else "running",
+        "total": len(tasks),
+        "completed": completed,
+        "counts": counts,
+        "max_in_flight": batch["max_in_flight"],
+        "created_at": batch["created_at"],
+        "tasks": tasks,
+    }
+
+
+def _event(name: str, record: Dict[str, Any]) -> str:
+    return f"id: {record['version']}\nevent: {name}\ndata: {json.dumps(record)}\n\n"
+
+
+async def stream_review_events(task_id: str, after_version: int = 0) -> AsyncIterator[str]:
+    """
+    Yield server-sent events for a task until it reaches a terminal status.
+
+    A "progress" event is sent for each new record version and a final
+    "result" event for the terminal record. Idle periods are filled with
+    comment lines so proxies keep the stream open. The stream ends after
+    REVIEW_RESULT_MAX_WAIT_SECONDS; clients reconnect with Last-Event-ID.
+
+    Args:
+        task_id: Review task id (must exist)
+        after_version: Last record version the client received
+    """
+    deadline = time.monotonic() + ReviewResultConstants.MAX_WAIT_SECONDS
+    version = after_version
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        record = await wait_for_update(task_id, version, min(ReviewResultConstants.HEARTBEAT_SECONDS, remaining))
+        if record is None:
+            yield "event: expired\ndata: {}\n\n"
+            return
+        if record["status"] in TERMINAL_STATUSES:
+            yield _event("result", record)
+            return
+        if record["version"] > version:
+            version = record["version"]
+            yield _event("progress", record)
+        else:
+            yield ": keep-alive\n\n"
@@ -0,0 +1,95 @@
+"""
+Local deterministic LLM backend for load tests and benchmarks.
+
+The review of a diff depends only on the diff: one finding on the first
+added line of each file. Latency, failures and output speed are simulated
+from LLM_STUB_* settings so the rest of the pipeline sees realistic timing.
+"""
+import asyncio
+import random
+import threading
+from typing import AsyncIterator, Optional, Union
+
+from app.core.models.models import ReviewFinding, ReviewOutput
+from app.core.services.llm_backend import LLMBackend
+from app.core.utils.constants import LLMConstants
+from app.core.utils.diff_parser import parse_diff
+from app.core.utils.review_format import render_review_output
+from app.core.utils.tokens import estimate_tokens
+
+
+class StubBackend(LLMBackend):
+    name = "stub"
+    model = "stub"
+
+    def __init__(
+        self,
+        latency_seconds: float = LLMConstants.STUB_LATENCY_SECONDS,
+        error_rate: float = LLMConstants.STUB_ERROR_RATE,
+        tokens_per_second: float = LLMConstants.STUB_TOKENS_PER_SECOND,
+        seed: int = LLMConstants.STUB_SEED,
+    ):
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _build_review(self, diff_text: str) -> ReviewOutput:
+        files, _ = parse_diff(diff_text)
+        findings = []
+        for diff_file in files:
+            for hunk in diff_file.hunks:
+                new_line = hunk.new_start
+                line: Optional[int] = None
+                for diff_line in hunk.lines:
+                    if diff_line.startswith("+"):
+                        line = new_line
+                        break
+                    if not diff_line.startswith(("-", "\\")):
+                        new_line += 1
+                if line is not None:
+                    findings.append(ReviewFinding(
+                        category="Other",
+                        file=diff_file.path,
+                        lines=str(line),
+                        severity="Low",
+                        issue="Stub finding for load testing",
+                        suggestion="No action needed",
+                    ))
+                    break
+        return ReviewOutput(summary=f"Stub review of {len(files)} file(s).", findings=findings)
+
+    def _plan(self, diff_text: str):
+        output = self._build_review(diff_text)
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            # Latency varies +/-50% around the mean, reproducibly for a given seed
+            delay = self.latency_seconds * self._random.uniform(0.5, 1.5)
+        if self.tokens_per_second > 0:
+            delay += estimate_tokens(render_review_output(output)) / self.tokens_per_second
+        return output, failed, delay
+
+    @staticmethod
+    def _result(output: ReviewOutput, failed: bool, structured: bool) -> Union[str, ReviewOutput]:
+        if failed:
+            raise RuntimeError("Failed to analyze code diff: simulated stub LLM error")
+        return output if structured else render_review_output(output)
+
+    async def review(self, diff_text: str, structured: bool = False) -> Union[str, ReviewOutput]:
+        output, failed, delay = self._plan(diff_text)
+        await asyncio.sleep(delay)
+        return self._result(output, failed, structured)
+
+    async def stream(self, diff_text: str) -> AsyncIterator[str]:
+        output, failed, delay = self._plan(diff_text)
+        lines = render_review_output(output).splitlines(keepends=True)
+        # Lines arrive at the simulated output speed after the initial latency
+        line_seconds = [
+            estimate_tokens(line) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0 for line in lines
+        ]
+        await asyncio.sleep(max(delay - sum(line_seconds), 0.0))
+        self._result(output, failed, structured=False)
+        for line, seconds in zip(lines, line_seconds):
+            await asyncio.sleep(seconds)
+            yield line
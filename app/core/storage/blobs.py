@@ -0,0 +1,144 @@
+"""
+Content-addressed blob store for large task payloads.
+
+Blobs are keyed by the SHA-256 of their content, so storing the same
+content again keeps one copy and only refreshes its age. Messages carry
+the key instead of the content (claim check) and consumers fetch it back.
+
+Blobs are never deleted when read: with late acknowledgement a message can
+be redelivered and read again. Instead, blobs not written for
+PAYLOAD_BLOB_TTL_SECONDS are pruned.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from app.core.utils.constants import PayloadConstants
+
+logger = logging.getLogger(__name__)
+
+BLOB_KEY_RE = re.compile(r"[0-9a-f]{64}")
+# How often a process scans the store for expired blobs
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class BlobStore(ABC):
+    """Stores immutable blobs under the SHA-256 of their content."""
+
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        """Store a blob (or refresh an identical one) and return its key."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """
+        Return a stored blob.
+
+        Raises:
+            KeyError: If no blob is stored under `key` (e.g. it expired)
+        """
+
+
+class FileBlobStore(BlobStore):
+    """Blob store on the local filesystem, one file per blob in 256 subdirectories."""
+
+    def __init__(self, root: Optional[str] = None, ttl_seconds: int = PayloadConstants.BLOB_TTL_SECONDS):
+        self.root = root or PayloadConstants.BLOB_DIR
+        self.ttl_seconds = ttl_seconds
+        self._pruned_at = 0.0
+        self._prune_lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        if not BLOB_KEY_RE.fullmatch(key):
+            raise KeyError(key)
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        path = self._path(key)
+        try:
+            # Already stored: written content never changes, only its age is refreshed
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written to a temporary file and renamed, so readers never see a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        self._maybe_prune()
+        return key
+
+    def get(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def prune(self) -> int:
+        """
+        Delete blobs (and abandoned temporary files) not written within the TTL.
+
+        Returns:
+            Number of files deleted
+        """
+        cutoff = time.time() - self.ttl_seconds
+        deleted = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.unlink(path)
+                        deleted += 1
+                except FileNotFoundError:
+                    pass
+        if deleted:
+            logger.info("Pruned %d expired payload blob(s) from %s", deleted, self.root)
+        return deleted
+
+    def _maybe_prune(self):
+        now = time.time()
+        if now - self._pruned_at < PRUNE_INTERVAL_SECONDS or not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self._pruned_at = now
+            self.prune()
+        except OSError:
+            logger.warning("Could not prune payload blobs in %s", self.root, exc_info=True)
+        finally:
+            self._prune_lock.release()
+
+
+def create_blob_store(name: str) -> BlobStore:
+    """
+    Create a blob store by name.
+
+    Raises:
+        ValueError: If the blob store name is unknown
+    """
+    if name == "file":
+        return FileBlobStore()
+    raise ValueError(f"Unknown PAYLOAD_BLOB_STORE {name!r}; expected 'file'")
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store selected by PAYLOAD_BLOB_STORE."""
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = create_blob_store(PayloadConstants.BLOB_STORE)
+    return _blob_store
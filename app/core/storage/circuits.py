@@ -0,0 +1,112 @@
+"""
+Circuit breaker state shared by every worker process on a host.
+
+A circuit is closed while its upstream works. After a run of consecutive
+failures it opens and calls fail fast. Once the cooldown has passed, one
+caller is let through as a probe (half-open): its success closes the
+circuit, its failure opens it again for another cooldown. A probe that
+never reports back is replaced after the cooldown.
+"""
+import time
+from typing import Optional
+
+from app.core.storage.sqlite import connect, db_path
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class Circuits:
+    """SQLite-backed circuit breaker states."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or db_path("circuits")
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS circuits ("
+                " name TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " failures INTEGER NOT NULL,"
+                " changed_at REAL NOT NULL)"
+            )
+
+    def state(self, name: str) -> str:
+        """Return the state of a circuit (closed if it never failed)."""
+        with connect(self.path, write=False) as conn:
+            row = conn.execute("SELECT state FROM circuits WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else CLOSED
+
+    def allow(self, name: str, cooldown: float) -> Optional[float]:
+        """
+        Decide whether a call may go through.
+
+        Returns:
+            None if the call may proceed (possibly as the half-open probe),
+            otherwise seconds until the circuit lets a probe through
+        """
+        now = time.time()
+        with connect(self.path, write=False) as conn:
+            row = conn.execute("SELECT state, changed_at FROM circuits WHERE name = ?", (name,)).fetchone()
+        if row is None or row[0] == CLOSED:
+            return None
+        with connect(self.path) as conn:
+            row = conn.execute("SELECT state, changed_at FROM circuits WHERE name = ?", (name,)).fetchone()
+            if row is None or row[0] == CLOSED:
+                return None
+            state, changed_at = row
+            if changed_at + cooldown > now:
+                return changed_at + cooldown - now
+            # Open past its cooldown, or a half-open probe that never reported back
+            conn.execute(
+                "UPDATE circuits SET state = ?, changed_at = ? WHERE name = ?", (HALF_OPEN, now, name)
+            )
+        return None
+
+    def record_success(self, name: str) -> Optional[str]:
+        """
+        Close a circuit after a successful call.
+
+        Returns:
+            The previous state if it changed, else None
+        """
+        with connect(self.path, write=False) as conn:
+            row = conn.execute("SELECT state, failures FROM circuits WHERE name = ?", (name,)).fetchone()
+        if row is None or row == (CLOSED, 0):
+            return None
+        with connect(self.path) as conn:
+            conn.execute(
+                "UPDATE circuits SET state = ?, failures = 0, changed_at = ? WHERE name = ?",
+                (CLOSED, time.time(), name),
+            )
+        return row[0] if row[0] != CLOSED else None
+
+    def record_failure(self, name: str, threshold: int) -> Optional[str]:
+        """
+        Count a failed call, opening the circuit at `threshold` consecutive failures or on a failed probe.
+
+        Returns:
+            The new state if the circuit opened, else None
+        """
+        now = time.time()
+        with connect(self.path) as conn:
+            row = conn.execute("SELECT state, failures, changed_at FROM circuits WHERE name = ?", (name,)).fetchone()
+            state, failures, changed_at = row if row else (CLOSED, 0, now)
+            failures += 1
+            opens = state == HALF_OPEN or (state == CLOSED and failures >= threshold)
+            conn.execute(
+                "INSERT OR REPLACE INTO circuits (name, state, failures, changed_at) VALUES (?, ?, ?, ?)",
+                (name, OPEN if opens else state, failures, now if opens else changed_at),
+            )
+        return OPEN if opens else None
+
+
+_circuits: Optional[Circuits] = None
+
+
+def get_circuits() -> Circuits:
+    """Return the process-wide circuit breaker store."""
+    global _circuits
+    if _circuits is None:
+        _circuits = Circuits()
+    return _circuits
@@ -0,0 +1,80 @@
+"""
+Index of the local git mirrors used by the "git" diff backend.
+
+The mirrors themselves are bare repositories on disk; this store records
+each one's size and last use so the least recently used ones can be
+deleted once there are more than GIT_MIRROR_MAX_MIRRORS or they take more
+than GIT_MIRROR_MAX_BYTES.
+"""
+import time
+from typing import List, Optional
+
+from app.core.storage.sqlite import connect, db_path
+from app.core.utils.constants import GitMirrorConstants
+
+
+class GitMirrorIndex:
+    """SQLite-backed record of mirror sizes and last use, shared by the workers on a host."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_mirrors: int = GitMirrorConstants.MAX_MIRRORS,
+        max_bytes: int = GitMirrorConstants.MAX_BYTES,
+    ):
+        self.path = path or db_path("git_mirrors")
+        self.max_mirrors = max_mirrors
+        self.max_bytes = max_bytes
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS git_mirrors ("
+                " key TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+
+    def touch(self, key: str, size: Optional[int] = None):
+        """Record a use of a mirror, and its size on disk if it was measured."""
+        with connect(self.path) as conn:
+            conn.execute(
+                "INSERT INTO git_mirrors (key, size, last_used) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET size = COALESCE(?, size), last_used = excluded.last_used",
+                (key, size or 0, time.time(), size),
+            )
+
+    def remove(self, key: str):
+        """Forget a deleted mirror."""
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM git_mirrors WHERE key = ?", (key,))
+
+    def eviction_candidates(self, keep: str) -> List[str]:
+        """
+        Return the mirrors to delete to get within the limits, least recently used first.
+
+        Args:
+            keep: Mirror that must not be evicted (the one in use)
+        """
+        with connect(self.path, write=False) as conn:
+            rows = conn.execute("SELECT key, size FROM git_mirrors ORDER BY last_used").fetchall()
+        count, total = len(rows), sum(size for _, size in rows)
+        candidates = []
+        for key, size in rows:
+            if count <= self.max_mirrors and total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            candidates.append(key)
+            count -= 1
+            total -= size
+        return candidates
+
+
+_git_mirror_index: Optional[GitMirrorIndex] = None
+
+
+def get_git_mirror_index() -> GitMirrorIndex:
+    """Return the process-wide git mirror index."""
+    global _git_mirror_index
+    if _git_mirror_index is None:
+        _git_mirror_index = GitMirrorIndex()
+    return _git_mirror_index
@@ -0,0 +1,116 @@
+"""
+Conditional-request cache for GitHub API responses.
+
+Stores the body plus ETag/Last-Modified per URL so later requests can send
+`If-None-Match`/`If-Modified-Since`; GitHub does not count 304 responses
+against the rate limit. Responses for immutable resources (e.g. a compare
+between two commit SHAs) are served without touching the network at all.
+Entries expire after a TTL and the cache is bounded by total body size.
+"""
+import hashlib
+import time
+from typing import Optional
+
+from app.core.storage.sqlite import connect, db_path, evict_lru
+from app.core.utils.constants import HttpCacheConstants
+
+# A hit only rewrites last_used when it is older than this, so most hits stay read-only
+TOUCH_INTERVAL_SECONDS = 60
+
+
+class CachedEntry:
+    __slots__ = ("etag", "last_modified", "body", "immutable")
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], body: bytes, immutable: bool):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.immutable = immutable
+
+
+def cache_key(url: str, accept: str, token: str) -> str:
+    """
+    Build the cache key for a request.
+
+    The token is part of the key (hashed) so one token is never served a
+    response fetched with another token's permissions.
+    """
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    return hashlib.sha256(f"{url}\n{accept}\n{token_hash}".encode()).hexdigest()
+
+
+class HttpCache:
+    """SQLite-backed response cache with TTL expiry and size-bounded LRU eviction."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = HttpCacheConstants.MAX_BYTES,
+        ttl_seconds: int = HttpCacheConstants.TTL_SECONDS,
+    ):
+        self.path = path or db_path("http_cache")
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS http_cache ("
+                " key TEXT PRIMARY KEY,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " body BLOB NOT NULL,"
+                " immutable INTEGER NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS http_cache_last_used ON http_cache (last_used)")
+            conn.execute("CREATE INDEX IF NOT EXISTS http_cache_stored_at ON http_cache (stored_at)")
+
+    def get(self, key: str) -> Optional[CachedEntry]:
+        """Return the unexpired entry for `key`, marking it as recently used at most once a minute."""
+        now = time.time()
+        with connect(self.path, write=False) as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified, body, immutable, last_used FROM http_cache"
+                " WHERE key = ? AND stored_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body, immutable, last_used = row
+        if last_used < now - TOUCH_INTERVAL_SECONDS:
+            with connect(self.path) as conn:
+                conn.execute("UPDATE http_cache SET last_used = ? WHERE key = ?", (now, key))
+        return CachedEntry(etag, last_modified, bytes(body), bool(immutable))
+
+    def put(self, key: str, body: bytes, etag: Optional[str], last_modified: Optional[str], immutable: bool = False):
+        """Store a response body with its validators, then expire and evict old entries."""
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO http_cache"
+                " (key, etag, last_modified, body, immutable, size, stored_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, etag, last_modified, body, int(immutable), len(body), now, now),
+            )
+            conn.execute("DELETE FROM http_cache WHERE stored_at < ?", (now - self.ttl_seconds,))
+            evict_lru(conn, "http_cache", self.max_bytes)
+
+    def refresh(self, key: str):
+        """Restart the TTL of an entry that GitHub just revalidated with a 304."""
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute("UPDATE http_cache SET stored_at = ?, last_used = ? WHERE key = ?", (now, now, key))
+
+
+_http_cache: Optional[HttpCache] = None
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Return the process-wide HTTP cache, or None if caching is disabled."""
+    global _http_cache
+    if not HttpCacheConstants.ENABLED:
+        return None
+    if _http_cache is None:
+        _http_cache = HttpCache()
+    return _http_cache
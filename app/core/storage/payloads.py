@@ -0,0 +1,111 @@
+"""
+Compact encoding of large task payload fields for the broker.
+
+Task payloads can carry whole diffs and rendered reviews. Top-level fields
+of at least PAYLOAD_COMPRESS_MIN_BYTES are compressed (zstd when the
+`zstandard` package is installed, gzip otherwise) and embedded as base64;
+fields still at least PAYLOAD_CLAIM_CHECK_MIN_BYTES after compression are
+written to the blob store and only their key travels in the message.
+Encoded fields are marked, so consumers decode them and pass every other
+field through unchanged; messages from older producers decode as-is.
+"""
+import base64
+import gzip
+import json
+import logging
+from typing import Any, Dict, Tuple
+
+from app.core.storage.blobs import get_blob_store
+from app.core.utils.constants import PayloadConstants
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Key marking an encoded field; its value names the compression codec
+ENCODED_KEY = "__encoded__"
+
+
+def _compress(data: bytes) -> Tuple[str, bytes]:
+    if PayloadConstants.COMPRESSION == "zstd" and ZSTD_AVAILABLE:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(data)
+    # A fixed mtime keeps the output deterministic, so identical content maps to one blob
+    return "gzip", gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ValueError("Payload is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown payload codec {codec!r}")
+
+
+def encode_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compress the large fields of a task payload, moving the largest to the blob store.
+
+    Args:
+        payload: JSON-serializable task payload
+
+    Returns:
+        Payload to publish; small fields are unchanged
+    """
+    encoded: Dict[str, Any] = {}
+    for field, value in payload.items():
+        if isinstance(value, str):
+            raw, is_json = value.encode(), False
+        elif isinstance(value, (dict, list)):
+            raw, is_json = json.dumps(value).encode(), True
+        else:
+            encoded[field] = value
+            continue
+        if len(raw) < PayloadConstants.COMPRESS_MIN_BYTES:
+            encoded[field] = value
+            continue
+
+        codec, data = _compress(raw)
+        marker: Dict[str, Any] = {ENCODED_KEY: codec, "json": is_json}
+        if len(data) >= PayloadConstants.CLAIM_CHECK_MIN_BYTES:
+            marker["blob"] = get_blob_store().put(data)
+        else:
+            marker["data"] = base64.b64encode(data).decode("ascii")
+        logger.debug("Encoded payload field %s: %d -> %d bytes (%s%s)", field, len(raw), len(data), codec,
+                     ", claim check" if "blob" in marker else "")
+        encoded[field] = marker
+    return encoded
+
+
+def decode_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Restore the fields of a payload encoded by encode_payload.
+
+    Raises:
+        ValueError: If a field cannot be decoded or its blob no longer exists
+    """
+    decoded: Dict[str, Any] = {}
+    for field, value in payload.items():
+        if not (isinstance(value, dict) and ENCODED_KEY in value):
+            decoded[field] = value
+            continue
+        if "blob" in value:
+            try:
+                data = get_blob_store().get(value["blob"])
+            except KeyError:
+                raise ValueError(f"Payload field {field!r} refers to missing blob {value['blob']}") from None
+        else:
+            data = base64.b64decode(value.get("data", ""))
+        try:
+            raw = _decompress(value[ENCODED_KEY], data)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Payload field {field!r} is corrupt: {e}") from e
+        decoded[field] = json.loads(raw) if value.get("json") else raw.decode()
+    return decoded
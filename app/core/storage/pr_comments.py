@@ -0,0 +1,68 @@
+"""
+Review comment ids and body hashes per pull request.
+
+Lets the comment upsert find the bot's comment without listing the PR's
+comments, and skip the API call when the rendered body has not changed.
+"""
+import hashlib
+import time
+from typing import Optional, Tuple
+
+from app.core.storage.sqlite import connect, db_path
+from app.core.utils.constants import ReviewJobConstants
+
+
+def body_hash(body: str) -> str:
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class PrCommentStore:
+    """SQLite-backed map of (repo, PR) to the bot's review comment id and last posted body hash."""
+
+    def __init__(self, path: Optional[str] = None, retention_seconds: int = ReviewJobConstants.RETENTION_SECONDS):
+        self.path = path or db_path("pr_comments")
+        self.retention_seconds = retention_seconds
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pr_comments ("
+                " repo TEXT NOT NULL,"
+                " pr_number INTEGER NOT NULL,"
+                " comment_id INTEGER NOT NULL,"
+                " body_hash TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (repo, pr_number))"
+            )
+
+    def get(self, repo: str, pr_number: int) -> Optional[Tuple[int, str]]:
+        """Return (comment id, body hash) of the PR's review comment, if known."""
+        with connect(self.path, write=False) as conn:
+            row = conn.execute(
+                "SELECT comment_id, body_hash FROM pr_comments WHERE repo = ? AND pr_number = ?",
+                (repo, pr_number),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, repo: str, pr_number: int, comment_id: int, hash_: str):
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pr_comments (repo, pr_number, comment_id, body_hash, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (repo, pr_number, comment_id, hash_, now),
+            )
+            conn.execute("DELETE FROM pr_comments WHERE updated_at < ?", (now - self.retention_seconds,))
+
+    def delete(self, repo: str, pr_number: int):
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM pr_comments WHERE repo = ? AND pr_number = ?", (repo, pr_number))
+
+
+_pr_comment_store: Optional[PrCommentStore] = None
+
+
+def get_pr_comment_store() -> PrCommentStore:
+    """Return the process-wide PR comment store."""
+    global _pr_comment_store
+    if _pr_comment_store is None:
+        _pr_comment_store = PrCommentStore()
+    return _pr_comment_store
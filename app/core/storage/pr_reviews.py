@@ -0,0 +1,144 @@
+"""
+Last reviewed state of each pull request, for incremental re-reviews.
+
+For every PR the store keeps the head SHA that was last reviewed in full
+and the findings (review table rows) at that head. On the next push only
+the commits added since that head are reviewed; earlier findings are
+carried forward by mapping their line numbers through the new commits'
+hunks, and findings on lines those commits changed are dropped.
+"""
+import hashlib
+import json
+import time
+from typing import List, Optional
+
+from app.core.storage.review_cache import LINE_NUMBER_RE, path_matches
+from app.core.storage.sqlite import connect, db_path
+from app.core.utils.constants import IncrementalReviewConstants, ReviewJobConstants
+from app.core.utils.diff_parser import FileDiff, Hunk
+
+
+class PrReviewState:
+    __slots__ = ("head_sha", "filter_key", "rows")
+
+    def __init__(self, head_sha: str, filter_key: str, rows: List[List[str]]):
+        self.head_sha = head_sha
+        self.filter_key = filter_key
+        self.rows = rows
+
+
+def filter_key(include: Optional[List[str]], exclude: Optional[List[str]]) -> str:
+    """Fingerprint the file filters a review ran with; state is only reused under the same filters."""
+    return hashlib.sha256(json.dumps([include, exclude]).encode()).hexdigest()
+
+
+def _map_old_line(line: int, hunks: List[Hunk]) -> Optional[int]:
+    """Map a line number of the old file through `hunks`; None if the line was changed or removed."""
+    offset = 0
+    for hunk in sorted(hunks, key=lambda h: h.old_start):
+        # A pure insertion ("-5,0") goes after old line 5
+        first = hunk.old_start if hunk.old_count else hunk.old_start + 1
+        if line < first:
+            break
+        if line >= first + hunk.old_count:
+            offset += hunk.new_count - hunk.old_count
+            continue
+        old_line, new_line = hunk.old_start, hunk.new_start
+        for diff_line in hunk.lines:
+            if diff_line.startswith("+"):
+                new_line += 1
+            elif diff_line.startswith("-"):
+                if old_line == line:
+                    return None
+                old_line += 1
+            elif not diff_line.startswith("\\"):
+                if old_line == line:
+                    return new_line
+                old_line += 1
+                new_line += 1
+        return None
+    return line + offset
+
+
+def carry_forward_rows(rows: List[List[str]], delta_files: List[FileDiff]) -> List[List[str]]:
+    """
+    Carry review rows from the previous head across the commits in `delta_files`.
+
+    Rows of untouched files are kept as-is. Rows of changed files get their
+    line numbers remapped and follow renames; rows on changed lines or in
+    deleted files are dropped, since the new review covers those lines.
+    """
+    carried = []
+    for row in rows:
+        diff_file = next(
+            (f for f in delta_files if len(row) > 1 and path_matches(row[1], f.old_path or f.path)), None
+        )
+        if diff_file is None:
+            carried.append(row)
+            continue
+        if diff_file.new_path == "/dev/null":
+            continue
+        if len(row) > 2:
+            numbers = [int(n) for n in LINE_NUMBER_RE.findall(row[2])]
+            mapped = {n: _map_old_line(n, diff_file.hunks) for n in numbers}
+            if any(m is None for m in mapped.values()):
+                continue
+            lines_cell = LINE_NUMBER_RE.sub(lambda m: str(mapped[int(m.group())]), row[2])
+            row = row[:2] + [lines_cell] + row[3:]
+        if diff_file.old_path != diff_file.path:
+            row = [row[0], f"`{diff_file.path}`" if row[1].startswith("`") else diff_file.path] + row[2:]
+        carried.append(row)
+    return carried
+
+
+class PrReviewStore:
+    """SQLite-backed store of the last reviewed head and findings per PR."""
+
+    def __init__(self, path: Optional[str] = None, retention_seconds: int = ReviewJobConstants.RETENTION_SECONDS):
+        self.path = path or db_path("pr_reviews")
+        self.retention_seconds = retention_seconds
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pr_reviews ("
+                " repo TEXT NOT NULL,"
+                " pr_number INTEGER NOT NULL,"
+                " head_sha TEXT NOT NULL,"
+                " filter_key TEXT NOT NULL,"
+                " rows TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (repo, pr_number))"
+            )
+
+    def get(self, repo: str, pr_number: int) -> Optional[PrReviewState]:
+        with connect(self.path, write=False) as conn:
+            row = conn.execute(
+                "SELECT head_sha, filter_key, rows FROM pr_reviews WHERE repo = ? AND pr_number = ?",
+                (repo, pr_number),
+            ).fetchone()
+        if row is None:
+            return None
+        return PrReviewState(row[0], row[1], json.loads(row[2]))
+
+    def put(self, repo: str, pr_number: int, state: PrReviewState):
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pr_reviews (repo, pr_number, head_sha, filter_key, rows, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (repo, pr_number, state.head_sha, state.filter_key, json.dumps(state.rows), now),
+            )
+            # PRs untouched for the retention period are most likely closed
+            conn.execute("DELETE FROM pr_reviews WHERE updated_at < ?", (now - self.retention_seconds,))
+
+
+_pr_review_store: Optional[PrReviewStore] = None
+
+
+def get_pr_review_store() -> Optional[PrReviewStore]:
+    """Return the process-wide PR review store, or None if incremental reviews are disabled."""
+    global _pr_review_store
+    if not IncrementalReviewConstants.ENABLED:
+        return None
+    if _pr_review_store is None:
+        _pr_review_store = PrReviewStore()
+    return _pr_review_store
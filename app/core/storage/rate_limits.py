@@ -0,0 +1,139 @@
+"""
+Token buckets shared by every worker process on a host.
+
+Each bucket holds up to `capacity` tokens and refills at `rate` tokens per
+second; a caller takes tokens before calling a rate-limited API and waits
+when there are not enough. Buckets can also be blocked until a point in
+time (e.g. after a 429 or until a quota resets). State lives in SQLite so
+all processes draw from the same buckets.
+"""
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.storage.sqlite import connect, db_path
+
+# (bucket name, tokens to take, capacity, refill rate per second); a capacity
+# and rate of None use the bucket's stored quota, and skip it if it has none
+BucketRequest = Tuple[str, float, Optional[float], Optional[float]]
+
+
+class RateLimits:
+    """SQLite-backed token buckets."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or db_path("rate_limits")
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " name TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " capacity REAL NOT NULL,"
+                " rate REAL NOT NULL,"
+                " blocked_until REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def _refilled(row, now: float) -> Tuple[float, float, float, float]:
+        tokens, capacity, rate, blocked_until, updated_at = row
+        return min(capacity, tokens + max(now - updated_at, 0) * rate), capacity, rate, blocked_until
+
+    def try_acquire(self, requests: Sequence[BucketRequest]) -> float:
+        """
+        Take tokens from several buckets at once, or from none of them.
+
+        A configured bucket seen for the first time starts full. Requests
+        larger than a bucket's capacity take the whole bucket, so they are
+        delayed but never starved.
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they could be
+        """
+        now = time.time()
+        with connect(self.path) as conn:
+            states: List[Tuple[str, float, float, float, float]] = []
+            wait = 0.0
+            for name, amount, capacity, rate in requests:
+                row = conn.execute(
+                    "SELECT tokens, capacity, rate, blocked_until, updated_at FROM rate_limits WHERE name = ?", (name,)
+                ).fetchone()
+                if row is None:
+                    if capacity is None:
+                        continue
+                    tokens, blocked_until = capacity, 0.0
+                else:
+                    tokens, stored_capacity, stored_rate, blocked_until = self._refilled(row, now)
+                    if capacity is None:
+                        capacity, rate = stored_capacity, stored_rate
+                amount = min(amount, capacity)
+                if blocked_until > now:
+                    wait = max(wait, blocked_until - now)
+                elif tokens < amount:
+                    wait = max(wait, (amount - tokens) / rate if rate > 0 else 1.0)
+                states.append((name, tokens - amount, capacity, rate, blocked_until))
+            if wait > 0:
+                return wait
+            conn.executemany(
+                "INSERT OR REPLACE INTO rate_limits (name, tokens, capacity, rate, blocked_until, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(name, tokens, capacity, rate, blocked_until, now) for name, tokens, capacity, rate, blocked_until in states],
+            )
+        return 0.0
+
+    def update_quota(self, name: str, available: float, capacity: float, rate: float, blocked_until: float = 0.0):
+        """
+        Apply a quota reported by the API (e.g. in response headers) to a bucket.
+
+        The bucket never holds more than `available` tokens, but tokens other
+        processes already took stay taken, so concurrent responses reporting
+        slightly stale quotas cannot refill it.
+
+        Args:
+            name: Bucket name
+            available: Tokens the API reports as still available
+            capacity: Bucket capacity (burst size)
+            rate: Refill rate per second
+            blocked_until: Epoch seconds before which no tokens are handed out (an
+                existing block, e.g. after a 429, is kept if it lasts longer)
+        """
+        now = time.time()
+        with connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT tokens, capacity, rate, blocked_until, updated_at FROM rate_limits WHERE name = ?", (name,)
+            ).fetchone()
+            tokens, blocked = (self._refilled(row, now)[0], row[3]) if row else (capacity, 0.0)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (name, tokens, capacity, rate, blocked_until, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (name, min(tokens, available, capacity), capacity, rate, max(blocked, blocked_until), now),
+            )
+
+    def block(self, name: str, until: float, capacity: Optional[float] = None, rate: Optional[float] = None):
+        """
+        Make callers of a bucket wait until `until` (epoch seconds).
+
+        A bucket that does not exist yet is created full with the given
+        capacity and rate; without a capacity, only existing buckets are blocked.
+        """
+        now = time.time()
+        with connect(self.path) as conn:
+            if capacity is not None:
+                conn.execute(
+                    "INSERT OR IGNORE INTO rate_limits (name, tokens, capacity, rate, blocked_until, updated_at)"
+                    " VALUES (?, ?, ?, ?, 0, ?)",
+                    (name, capacity, capacity, rate or 0.0, now),
+                )
+            conn.execute(
+                "UPDATE rate_limits SET blocked_until = MAX(blocked_until, ?) WHERE name = ?", (until, name)
+            )
+
+
+_rate_limits: Optional[RateLimits] = None
+
+
+def get_rate_limits() -> RateLimits:
+    """Return the process-wide rate limit store."""
+    global _rate_limits
+    if _rate_limits is None:
+        _rate_limits = RateLimits()
+    return _rate_limits
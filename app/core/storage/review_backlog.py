@@ -0,0 +1,168 @@
+"""
+Per-tenant review slots and backlog used by the review scheduler.
+
+A tenant (the repository owner, i.e. the GitHub account or installation)
+may have a limited number of reviews in the broker queue or running at a
+time; each holds a slot. Further reviews wait in the tenant's backlog and
+are released into the queue, highest priority first, as its slots free up.
+Slots are leases: one whose worker died without releasing it expires.
+
+Reviews submitted as a batch additionally count against their batch's
+in-flight limit, so one large batch cannot fill its tenants' slots.
+
+Backlog entries hold the full task payload (including the GitHub token)
+until they are published, just as a queued broker message does.
+"""
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.storage.sqlite import connect, db_path, ensure_column
+from app.core.utils.constants import SchedulerConstants
+
+BacklogEntry = Tuple[str, Dict[str, Any], int, float, Optional[str], Optional[int]]
+
+
+class ReviewBacklog:
+    """SQLite-backed review slots and backlog, shared by the API and workers."""
+
+    def __init__(self, path: Optional[str] = None, lease_seconds: int = SchedulerConstants.SLOT_LEASE_SECONDS):
+        self.path = path or db_path("review_backlog")
+        self.lease_seconds = lease_seconds
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS review_slots ("
+                " task_id TEXT PRIMARY KEY,"
+                " tenant TEXT NOT NULL,"
+                " leased_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS review_slots_tenant ON review_slots (tenant)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS review_backlog ("
+                " task_id TEXT PRIMARY KEY,"
+                " tenant TEXT NOT NULL,"
+                " priority INTEGER NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " not_before REAL NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS review_backlog_tenant ON review_backlog (tenant, priority, created_at)")
+            ensure_column(conn, "review_slots", "batch_id", "TEXT")
+            ensure_column(conn, "review_backlog", "batch_id", "TEXT")
+            ensure_column(conn, "review_backlog", "batch_limit", "INTEGER")
+
+    def add(
+        self,
+        tenant: str,
+        task_id: str,
+        payload: Dict[str, Any],
+        priority: int,
+        not_before: float,
+        batch_id: Optional[str] = None,
+        batch_limit: Optional[int] = None,
+    ):
+        """Add a review to its tenant's backlog."""
+        self.add_many([(tenant, task_id, payload, priority, not_before)], batch_id, batch_limit)
+
+    def add_many(
+        self,
+        entries: Iterable[Tuple[str, str, Dict[str, Any], int, float]],
+        batch_id: Optional[str] = None,
+        batch_limit: Optional[int] = None,
+    ):
+        """
+        Add reviews to their tenants' backlogs in one transaction.
+
+        Args:
+            entries: (tenant, task_id, payload, priority, not_before) of each review
+            batch_id: Batch the reviews belong to, if any
+            batch_limit: Reviews of the batch that may be queued or running at once
+        """
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO review_backlog"
+                " (task_id, tenant, priority, payload, not_before, created_at, batch_id, batch_limit)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (task_id, tenant, priority, json.dumps(payload), not_before, now, batch_id, batch_limit)
+                    for tenant, task_id, payload, priority, not_before in entries
+                ],
+            )
+
+    def take_ready(self, limit_for: Callable[[str], int]) -> List[BacklogEntry]:
+        """
+        Move backlog entries into free slots of their tenants.
+
+        Within a tenant, higher priority entries go first, then older ones.
+        Entries of a batch at its in-flight limit are skipped.
+
+        Args:
+            limit_for: Returns a tenant's slot limit
+
+        Returns:
+            (task_id, payload, priority, not_before, batch_id, batch_limit) of each
+            entry to publish now, highest priority first
+        """
+        now = time.time()
+        ready: List[BacklogEntry] = []
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM review_slots WHERE leased_at < ?", (now - self.lease_seconds,))
+            used = dict(conn.execute("SELECT tenant, COUNT(*) FROM review_slots GROUP BY tenant").fetchall())
+            batch_used = dict(conn.execute(
+                "SELECT batch_id, COUNT(*) FROM review_slots WHERE batch_id IS NOT NULL GROUP BY batch_id"
+            ).fetchall())
+            for (tenant,) in conn.execute("SELECT DISTINCT tenant FROM review_backlog").fetchall():
+                free = limit_for(tenant) - used.get(tenant, 0)
+                if free <= 0:
+                    continue
+                taken = []
+                rows = conn.execute(
+                    "SELECT task_id, payload, priority, not_before, batch_id, batch_limit FROM review_backlog"
+                    " WHERE tenant = ? ORDER BY priority DESC, created_at",
+                    (tenant,),
+                )
+                for task_id, payload, priority, not_before, batch_id, batch_limit in rows:
+                    if batch_id is not None:
+                        if batch_used.get(batch_id, 0) >= (batch_limit or 1):
+                            continue
+                        batch_used[batch_id] = batch_used.get(batch_id, 0) + 1
+                    taken.append((task_id, batch_id))
+                    ready.append((task_id, json.loads(payload), priority, not_before, batch_id, batch_limit))
+                    free -= 1
+                    if free <= 0:
+                        break
+                for task_id, batch_id in taken:
+                    conn.execute("DELETE FROM review_backlog WHERE task_id = ?", (task_id,))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO review_slots (task_id, tenant, leased_at, batch_id) VALUES (?, ?, ?, ?)",
+                        (task_id, tenant, now, batch_id),
+                    )
+        ready.sort(key=lambda entry: -entry[2])
+        return ready
+
+    def remove(self, task_id: str):
+        """Remove a review from the backlog without publishing it."""
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM review_backlog WHERE task_id = ?", (task_id,))
+
+    def release(self, task_id: str) -> bool:
+        """Free a review's slot; returns True if it held one."""
+        with connect(self.path) as conn:
+            return conn.execute("DELETE FROM review_slots WHERE task_id = ?", (task_id,)).rowcount > 0
+
+    def backlog_size(self, tenant: str) -> int:
+        """Return the number of reviews waiting in a tenant's backlog."""
+        with connect(self.path, write=False) as conn:
+            return conn.execute("SELECT COUNT(*) FROM review_backlog WHERE tenant = ?", (tenant,)).fetchone()[0]
+
+
+_review_backlog: Optional[ReviewBacklog] = None
+
+
+def get_review_backlog() -> ReviewBacklog:
+    """Return the process-wide review backlog."""
+    global _review_backlog
+    if _review_backlog is None:
+        _review_backlog = ReviewBacklog()
+    return _review_backlog
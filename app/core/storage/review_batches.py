@@ -0,0 +1,77 @@
+"""
+Review batch store.
+
+A batch groups the review tasks submitted by one batch request (e.g. a
+nightly sweep over many repositories) under one batch id. The store keeps
+each batch's tasks and in-flight limit; their progress and results live in
+the review result store. Batches expire with their tasks' results.
+"""
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.storage.sqlite import connect, db_path
+from app.core.utils.constants import ReviewResultConstants
+
+
+class ReviewBatches:
+    """SQLite-backed store of review batches, shared by the API processes."""
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: int = ReviewResultConstants.TTL_SECONDS):
+        self.path = path or db_path("review_batches")
+        self.ttl_seconds = ttl_seconds
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS review_batches ("
+                " batch_id TEXT PRIMARY KEY,"
+                " tasks TEXT NOT NULL,"
+                " max_in_flight INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    def create(self, batch_id: str, tasks: List[Dict[str, Any]], max_in_flight: int):
+        """
+        Record a batch.
+
+        Args:
+            batch_id: Batch id
+            tasks: One dictionary per submitted review, with at least "task_id"
+            max_in_flight: Reviews of the batch that may be queued or running at once
+        """
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM review_batches WHERE expires_at < ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO review_batches (batch_id, tasks, max_in_flight, created_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (batch_id, json.dumps(tasks), max_in_flight, now, now + self.ttl_seconds),
+            )
+
+    def get(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a batch, or None if it is unknown or expired.
+
+        Returns:
+            Dictionary with "batch_id", "tasks", "max_in_flight" and "created_at"
+        """
+        with connect(self.path, write=False) as conn:
+            row = conn.execute(
+                "SELECT tasks, max_in_flight, created_at FROM review_batches WHERE batch_id = ? AND expires_at >= ?",
+                (batch_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        tasks, max_in_flight, created_at = row
+        return {"batch_id": batch_id, "tasks": json.loads(tasks), "max_in_flight": max_in_flight, "created_at": created_at}
+
+
+_review_batches: Optional[ReviewBatches] = None
+
+
+def get_review_batches() -> ReviewBatches:
+    """Return the process-wide review batch store."""
+    global _review_batches
+    if _review_batches is None:
+        _review_batches = ReviewBatches()
+    return _review_batches
@@ -0,0 +1,169 @@
+"""
+Content-addressed cache of per-hunk review rows.
+
+Entries are keyed by a hash of the normalized hunk, its file path, the model
+and the prompt template version, so an unchanged hunk is never sent to the
+LLM twice. Line numbers are stored relative to the start of the hunk, which
+keeps entries valid when earlier edits shift a hunk up or down the file.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.storage.sqlite import connect, db_path, evict_lru
+from app.core.utils.constants import ReviewCacheConstants
+from app.core.utils.diff_parser import FileDiff, Hunk
+from app.core.utils.prompts import PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+LINE_NUMBER_RE = re.compile(r"\d+")
+
+
+def hunk_cache_key(diff_file: FileDiff, hunk: Hunk, model: str, prompt_version: str = PROMPT_VERSION) -> str:
+    """
+    Build the cache key for a hunk.
+
+    The hunk header's line numbers and trailing whitespace are ignored so
+    the key only changes when the reviewed content does.
+    """
+    normalized = {
+        "prompt_version": prompt_version,
+        "model": model,
+        "path": diff_file.path,
+        "section": hunk.section.strip(),
+        "lines": [line.rstrip() for line in hunk.lines],
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def _shift_lines(lines_cell: str, delta: int) -> str:
+    return LINE_NUMBER_RE.sub(lambda m: str(max(int(m.group()) + delta, 0)), lines_cell)
+
+
+def to_relative_rows(rows: List[List[str]], hunk: Hunk) -> List[List[str]]:
+    """Rewrite the Lines column of review rows relative to the start of the hunk."""
+    return [row[:2] + [_shift_lines(row[2], -hunk.new_start)] + row[3:] if len(row) > 2 else row for row in rows]
+
+
+def to_absolute_rows(rows: List[List[str]], hunk: Hunk) -> List[List[str]]:
+    """Rewrite the Lines column of cached review rows back to file line numbers."""
+    return [row[:2] + [_shift_lines(row[2], hunk.new_start)] + row[3:] if len(row) > 2 else row for row in rows]
+
+
+def _first_line_number(row: List[str]) -> Optional[int]:
+    match = LINE_NUMBER_RE.search(row[2]) if len(row) > 2 else None
+    return int(match.group()) if match else None
+
+
+def path_matches(file_cell: str, path: str) -> bool:
+    """Return True if a review row's File cell refers to `path`."""
+    file_cell = file_cell.strip("` ")
+    return bool(file_cell) and (file_cell == path or path.endswith("/" + file_cell) or file_cell.endswith("/" + path))
+
+
+def assign_rows_to_hunks(
+    rows: List[List[str]], hunks: List[Tuple[FileDiff, Hunk]]
+) -> List[List[List[str]]]:
+    """
+    Attribute review rows to the hunks they refer to.
+
+    A row goes to the hunk of its file whose new line range contains the
+    row's first line number, else to the nearest hunk of that file, else to
+    the first hunk of the chunk.
+
+    Args:
+        rows: Review table rows produced for a chunk
+        hunks: (file, hunk) pairs covered by the chunk
+
+    Returns:
+        One list of rows per entry in `hunks`
+    """
+    assigned: List[List[List[str]]] = [[] for _ in hunks]
+    if not hunks:
+        return assigned
+    for row in rows:
+        line = _first_line_number(row)
+        candidates = [i for i, (f, _) in enumerate(hunks) if len(row) > 1 and path_matches(row[1], f.path)]
+        if not candidates:
+            assigned[0].append(row)
+            continue
+        best = candidates[0]
+        if line is not None:
+            def distance(index: int) -> int:
+                hunk = hunks[index][1]
+                if hunk.new_start <= line <= hunk.new_end:
+                    return 0
+                return min(abs(line - hunk.new_start), abs(line - hunk.new_end))
+            best = min(candidates, key=distance)
+        assigned[best].append(row)
+    return assigned
+
+
+class ReviewCache:
+    """SQLite-backed LRU cache of review rows, bounded by total stored bytes."""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = ReviewCacheConstants.MAX_BYTES):
+        self.path = path or db_path("review_cache")
+        self.max_bytes = max_bytes
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS review_cache ("
+                " key TEXT PRIMARY KEY,"
+                " rows TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS review_cache_last_used ON review_cache (last_used)")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[List[str]]]:
+        """Return cached rows for the keys that are present, marking them as recently used."""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[List[str]]] = {}
+        if not keys:
+            return found
+        with connect(self.path) as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, rows in conn.execute(
+                    f"SELECT key, rows FROM review_cache WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = json.loads(rows)
+                if found:
+                    conn.execute(
+                        f"UPDATE review_cache SET last_used = ? WHERE key IN ({placeholders})",
+                        [time.time()] + batch,
+                    )
+        return found
+
+    def put_many(self, entries: Dict[str, List[List[str]]]):
+        """Store rows for several keys, then evict least-recently-used entries over the size bound."""
+        if not entries:
+            return
+        now = time.time()
+        with connect(self.path) as conn:
+            for key, rows in entries.items():
+                data = json.dumps(rows)
+                conn.execute(
+                    "INSERT OR REPLACE INTO review_cache (key, rows, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, data, len(data), now),
+                )
+            evict_lru(conn, "review_cache", self.max_bytes)
+
+
+_review_cache: Optional[ReviewCache] = None
+
+
+def get_review_cache() -> Optional[ReviewCache]:
+    """Return the process-wide review cache, or None if caching is disabled."""
+    global _review_cache
+    if not ReviewCacheConstants.ENABLED:
+        return None
+    if _review_cache is None:
+        _review_cache = ReviewCache()
+    return _review_cache
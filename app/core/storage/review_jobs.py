@@ -0,0 +1,124 @@
+"""
+Review job registry used to coalesce reviews of the same pull request.
+
+Every PR review submitted through the API is recorded with the head SHA it
+reviews. A submission for a head that is already queued, running or was
+reviewed recently returns the existing task id; a submission for a new head
+supersedes the older jobs of that PR, which then stop at their next check.
+"""
+import time
+from typing import Optional, Tuple
+
+from app.core.storage.sqlite import connect, db_path
+from app.core.utils.constants import ReviewJobConstants
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SUPERSEDED = "superseded"
+
+
+class ReviewJobs:
+    """SQLite-backed registry of PR review jobs, shared by the API and workers."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dedupe_ttl_seconds: int = ReviewJobConstants.DEDUPE_TTL_SECONDS,
+        retention_seconds: int = ReviewJobConstants.RETENTION_SECONDS,
+    ):
+        self.path = path or db_path("review_jobs")
+        self.dedupe_ttl_seconds = dedupe_ttl_seconds
+        self.retention_seconds = retention_seconds
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS review_jobs ("
+                " task_id TEXT PRIMARY KEY,"
+                " repo TEXT NOT NULL,"
+                " pr_number INTEGER NOT NULL,"
+                " head_sha TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS review_jobs_pr ON review_jobs (repo, pr_number, created_at)")
+
+    def submit(self, repo: str, pr_number: int, head_sha: str, task_id: str) -> Tuple[str, bool]:
+        """
+        Register a review of a PR head unless an equivalent job already exists.
+
+        Args:
+            repo: Repository ("owner/repo")
+            pr_number: Pull request number
+            head_sha: Head commit SHA to review
+            task_id: Task id to use if a new job is created
+
+        Returns:
+            Tuple of (task id to report, whether a new job was created)
+        """
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM review_jobs WHERE updated_at < ?", (now - self.retention_seconds,))
+            latest = conn.execute(
+                "SELECT task_id, head_sha, status, updated_at FROM review_jobs"
+                " WHERE repo = ? AND pr_number = ? ORDER BY created_at DESC LIMIT 1",
+                (repo, pr_number),
+            ).fetchone()
+            if latest is not None:
+                latest_id, latest_head, status, updated_at = latest
+                if latest_head == head_sha and (
+                    status in (QUEUED, RUNNING) or (status == DONE and updated_at >= now - self.dedupe_ttl_seconds)
+                ):
+                    return latest_id, False
+            conn.execute(
+                "UPDATE review_jobs SET status = ?, updated_at = ?"
+                " WHERE repo = ? AND pr_number = ? AND status IN (?, ?)",
+                (SUPERSEDED, now, repo, pr_number, QUEUED, RUNNING),
+            )
+            conn.execute(
+                "INSERT INTO review_jobs (task_id, repo, pr_number, head_sha, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (task_id, repo, pr_number, head_sha, QUEUED, now, now),
+            )
+        return task_id, True
+
+    def status(self, task_id: str) -> Optional[str]:
+        """Return the status of a job, or None if the task is not a registered job."""
+        with connect(self.path, write=False) as conn:
+            row = conn.execute("SELECT status FROM review_jobs WHERE task_id = ?", (task_id,)).fetchone()
+        return row[0] if row else None
+
+    def start(self, task_id: str) -> Optional[str]:
+        """
+        Mark a job as running unless it was superseded.
+
+        Returns:
+            The job's status after the call, or None if the task is not a registered job
+        """
+        with connect(self.path) as conn:
+            conn.execute(
+                "UPDATE review_jobs SET status = ?, updated_at = ? WHERE task_id = ? AND status != ?",
+                (RUNNING, time.time(), task_id, SUPERSEDED),
+            )
+            row = conn.execute("SELECT status FROM review_jobs WHERE task_id = ?", (task_id,)).fetchone()
+        return row[0] if row else None
+
+    def finish(self, task_id: str, status: str):
+        """Record the outcome of a job that was not superseded in the meantime."""
+        with connect(self.path) as conn:
+            conn.execute(
+                "UPDATE review_jobs SET status = ?, updated_at = ? WHERE task_id = ? AND status != ?",
+                (status, time.time(), task_id, SUPERSEDED),
+            )
+
+
+_review_jobs: Optional[ReviewJobs] = None
+
+
+def get_review_jobs() -> ReviewJobs:
+    """Return the process-wide review job registry."""
+    global _review_jobs
+    if _review_jobs is None:
+        _review_jobs = ReviewJobs()
+    return _review_jobs
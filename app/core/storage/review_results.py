@@ -0,0 +1,191 @@
+"""
+Review task status and result store.
+
+Every review task submitted through the API gets a record that the workers
+update as it moves through its stages (queued, fetching the diff,
+reviewing, posting the comment) and that finally holds the formatted review
+or the error. Records expire after a TTL and the store keeps at most a
+fixed number of them, so it stays small without a separate cleanup job.
+"""
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.storage.sqlite import connect, db_path
+from app.core.utils.constants import ReviewResultConstants
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SUPERSEDED = "superseded"
+
+TERMINAL_STATUSES = (DONE, FAILED, SUPERSEDED)
+
+# Task ids per query when reading many records (below SQLite's bound parameter limit)
+READ_BATCH_SIZE = 500
+
+
+class ReviewResults:
+    """SQLite-backed store of review task progress and results, shared by the API and workers."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: int = ReviewResultConstants.TTL_SECONDS,
+        max_entries: int = ReviewResultConstants.MAX_ENTRIES,
+    ):
+        self.path = path or db_path("review_results")
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS review_results ("
+                " task_id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " stage TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " version INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS review_results_updated ON review_results (updated_at)")
+
+    def update(
+        self,
+        task_id: str,
+        status: str,
+        stage: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ):
+        """
+        Create or update a task record.
+
+        Terminal records are not moved back to a non-terminal status, so a
+        late progress update cannot hide a finished result.
+
+        Args:
+            task_id: Review task id
+            status: One of queued, running, done, failed or superseded
+            stage: Current stage; defaults to the status
+            result: Result fields, merged into the fields already stored
+            error: Error message for failed tasks
+        """
+        with connect(self.path) as conn:
+            if self._update(conn, time.time(), task_id, status, stage, result, error):
+                self._evict(conn)
+
+    def update_many(self, task_ids: Iterable[str], status: str, stage: Optional[str] = None):
+        """Create or update the records of many tasks in one transaction (see update)."""
+        now = time.time()
+        with connect(self.path) as conn:
+            created = [self._update(conn, now, task_id, status, stage, None, None) for task_id in task_ids]
+            if any(created):
+                self._evict(conn)
+
+    def _update(
+        self,
+        conn,
+        now: float,
+        task_id: str,
+        status: str,
+        stage: Optional[str],
+        result: Optional[Dict[str, Any]],
+        error: Optional[str],
+    ) -> bool:
+        # Returns True if a new record was created
+        row = conn.execute(
+            "SELECT status, result FROM review_results WHERE task_id = ? AND expires_at >= ?", (task_id, now)
+        ).fetchone()
+        if row is None:
+            conn.execute("DELETE FROM review_results WHERE task_id = ? OR expires_at < ?", (task_id, now))
+            conn.execute(
+                "INSERT INTO review_results"
+                " (task_id, status, stage, result, error, version, created_at, updated_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)",
+                (
+                    task_id, status, stage or status,
+                    json.dumps(result) if result is not None else None,
+                    error, now, now, now + self.ttl_seconds,
+                ),
+            )
+            return True
+
+        current_status, current_result = row
+        if current_status in TERMINAL_STATUSES and status not in TERMINAL_STATUSES:
+            return False
+        if result is not None:
+            result = {**(json.loads(current_result) if current_result else {}), **result}
+        conn.execute(
+            "UPDATE review_results SET status = ?, stage = ?, result = COALESCE(?, result),"
+            " error = COALESCE(?, error), version = version + 1, updated_at = ?, expires_at = ?"
+            " WHERE task_id = ?",
+            (
+                status, stage or status,
+                json.dumps(result) if result is not None else None,
+                error, now, now + self.ttl_seconds, task_id,
+            ),
+        )
+        return False
+
+    def _evict(self, conn):
+        count = conn.execute("SELECT COUNT(*) FROM review_results").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM review_results WHERE task_id IN"
+                " (SELECT task_id FROM review_results ORDER BY updated_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a task record, or None if the task is unknown or its record expired.
+
+        Returns:
+            Dictionary with "task_id", "status", "stage", "result", "error",
+            "version", "created_at" and "updated_at"
+        """
+        return self.get_many([task_id]).get(task_id)
+
+    def get_many(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the records of many tasks, keyed by task id (see get).
+
+        Unknown and expired tasks are left out.
+        """
+        records: Dict[str, Dict[str, Any]] = {}
+        now = time.time()
+        with connect(self.path, write=False) as conn:
+            for start in range(0, len(task_ids), READ_BATCH_SIZE):
+                ids = task_ids[start:start + READ_BATCH_SIZE]
+                rows = conn.execute(
+                    "SELECT task_id, status, stage, result, error, version, created_at, updated_at FROM review_results"
+                    f" WHERE task_id IN ({', '.join('?' * len(ids))}) AND expires_at >= ?",
+                    (*ids, now),
+                ).fetchall()
+                for task_id, status, stage, result, error, version, created_at, updated_at in rows:
+                    records[task_id] = {
+                        "task_id": task_id,
+                        "status": status,
+                        "stage": stage,
+                        "result": json.loads(result) if result else None,
+                        "error": error,
+                        "version": version,
+                        "created_at": created_at,
+                        "updated_at": updated_at,
+                    }
+        return records
+
+
+_review_results: Optional[ReviewResults] = None
+
+
+def get_review_results() -> ReviewResults:
+    """Return the process-wide review result store."""
+    global _review_results
+    if _review_results is None:
+        _review_results = ReviewResults()
+    return _review_results
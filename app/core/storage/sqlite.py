@@ -0,0 +1,69 @@
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from app.core.utils.constants import StorageConstants
+
+logger = logging.getLogger(__name__)
+
+
+def db_path(name: str) -> str:
+    """Return the path of a named SQLite database in the shared data directory."""
+    os.makedirs(StorageConstants.DATA_DIR, exist_ok=True)
+    return os.path.join(StorageConstants.DATA_DIR, f"{name}.sqlite3")
+
+
+@contextmanager
+def connect(path: str, write: bool = True):
+    """
+    Open a SQLite connection suitable for sharing a database across processes.
+
+    WAL mode lets readers run alongside a writer, and the busy timeout makes
+    concurrent writers wait instead of failing. Write transactions take the
+    write lock up front so they never fail on lock upgrade. The transaction
+    is committed when the block exits without an exception.
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def ensure_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    """Add a column to a table created by an earlier version of the store, if it is missing."""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def evict_lru(conn: sqlite3.Connection, table: str, max_bytes: int) -> int:
+    """
+    Delete least-recently-used rows until the table's total `size` fits in `max_bytes`.
+
+    The table must have `key`, `size` and `last_used` columns.
+
+    Returns:
+        Number of rows evicted
+    """
+    total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    evicted = 0
+    for key, size in conn.execute(f"SELECT key, size FROM {table} ORDER BY last_used").fetchall():
+        if total <= max_bytes:
+            break
+        conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+        total -= size
+        evicted += 1
+    logger.info("Evicted %d entries from %s (size now %d bytes)", evicted, table, total)
+    return evicted
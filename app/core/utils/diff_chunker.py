@@ -0,0 +1,163 @@
+"""
+Split unified diffs into reviewable chunks.
+
+Large diffs are split at file and hunk boundaries into chunks that fit a
+token budget, so each chunk can be reviewed by a separate LLM call.
+"""
+from typing import List, Optional, Tuple
+
+from app.core.utils.diff_parser import FileDiff, Hunk, parse_diff
+from app.core.utils.tokens import count_tokens
+
+
+def split_hunk(hunk: Hunk, token_budget: int) -> List[Hunk]:
+    """Split an oversized hunk into smaller hunks with recomputed line ranges."""
+    parts: List[Hunk] = []
+    old_line, new_line = hunk.old_start, hunk.new_start
+    current: Optional[Hunk] = None
+    current_tokens = 0
+    for line in hunk.lines:
+        line_tokens = count_tokens(line)
+        if current is None or (current.lines and current_tokens + line_tokens > token_budget):
+            current = Hunk(old_line, 0, new_line, 0, hunk.section)
+            parts.append(current)
+            current_tokens = 0
+        current.lines.append(line)
+        current_tokens += line_tokens
+        if line.startswith("-"):
+            old_line += 1
+            current.old_count += 1
+        elif line.startswith("+"):
+            new_line += 1
+            current.new_count += 1
+        elif not line.startswith("\\"):
+            old_line += 1
+            new_line += 1
+            current.old_count += 1
+            current.new_count += 1
+    return parts
+
+
+class DiffChunk:
+    """A piece of a diff sized for one LLM call, with the hunks it covers."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.tokens = 0
+        # Original (unsplit) hunks covered by this chunk, in order and without duplicates
+        self.hunks: List[Tuple[FileDiff, Hunk]] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def add(self, text: str, tokens: int):
+        self.parts.append(text)
+        self.tokens += tokens
+
+    def cover(self, diff_file: FileDiff, hunk: Hunk):
+        if not any(h is hunk for _, h in self.hunks):
+            self.hunks.append((diff_file, hunk))
+
+
+def chunk_files(files: List[FileDiff], token_budget: int) -> List[DiffChunk]:
+    """
+    Pack parsed file diffs into chunks of at most roughly `token_budget` tokens.
+
+    Chunks are cut at file and hunk boundaries. When a file spans several
+    chunks its header is repeated so every chunk is a valid diff on its own.
+    Hunks larger than the budget are split at line boundaries with
+    recomputed hunk headers so line numbers stay correct.
+
+    Args:
+        files: Parsed file diffs, as returned by the diff parser
+        token_budget: Approximate token budget per chunk
+
+    Returns:
+        List of DiffChunk objects
+    """
+    chunks: List[DiffChunk] = []
+    chunk = DiffChunk()
+
+    def flush():
+        nonlocal chunk
+        if chunk.parts:
+            chunks.append(chunk)
+        chunk = DiffChunk()
+
+    for diff_file in files:
+        header = diff_file.header
+        header_tokens = count_tokens(header)
+        header_in_chunk = False
+        if not diff_file.hunks:
+            # Binary files, pure renames and mode changes: header only
+            if chunk.tokens + header_tokens > token_budget:
+                flush()
+            chunk.add(header, header_tokens)
+            continue
+
+        hunk_budget = max(token_budget - header_tokens, 1)
+        for hunk in diff_file.hunks:
+            hunk_tokens = count_tokens(hunk.text)
+            pieces = [hunk] if hunk_tokens <= hunk_budget else split_hunk(hunk, hunk_budget)
+            for piece in pieces:
+                piece_text = piece.text
+                piece_tokens = count_tokens(piece_text)
+                needed = piece_tokens + (0 if header_in_chunk else header_tokens)
+                if chunk.parts and chunk.tokens + needed > token_budget:
+                    flush()
+                    header_in_chunk = False
+                if not header_in_chunk:
+                    chunk.add(header, header_tokens)
+                    header_in_chunk = True
+                chunk.add(piece_text, piece_tokens)
+                chunk.cover(diff_file, hunk)
+
+    flush()
+    return chunks
+
+
+def split_text(text: str, token_budget: int) -> List[str]:
+    """
+    Split text that is not a diff into chunks of at most roughly `token_budget` tokens.
+
+    Chunks are cut at line boundaries; lines larger than the budget are cut
+    into pieces of proportional length.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in text.splitlines(keepends=True):
+        line_tokens = count_tokens(line)
+        if line_tokens > token_budget:
+            piece_length = max(len(line) * token_budget // line_tokens, 1)
+            pieces = [line[start:start + piece_length] for start in range(0, len(line), piece_length)]
+        else:
+            pieces = [line]
+        for piece in pieces:
+            piece_tokens = line_tokens if len(pieces) == 1 else count_tokens(piece)
+            if current and current_tokens + piece_tokens > token_budget:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def chunk_diff(diff_text: str, token_budget: int) -> List[str]:
+    """
+    Split a unified diff into chunks of at most roughly `token_budget` tokens.
+
+    Args:
+        diff_text: Unified diff text
+        token_budget: Approximate token budget per chunk
+
+    Returns:
+        List of diff chunks; text with no recognizable hunks is split at line boundaries
+    """
+    files, _ = parse_diff(diff_text)
+    if not any(f.hunks for f in files):
+        return split_text(diff_text, token_budget) if diff_text.strip() else []
+    return [chunk.text for chunk in chunk_files(files, token_budget)]
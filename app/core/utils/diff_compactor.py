@@ -0,0 +1,152 @@
+"""
+Shrink parsed diffs before they are sent to the LLM.
+
+Compaction keeps every changed line but drops what the reviewer does not
+need: context beyond a few lines around each change, hunks that only
+change trailing whitespace or blank lines, hunks repeated verbatim across files, and blocks of code
+that were moved from one place to another unchanged.
+"""
+from typing import Dict, List, Tuple
+
+from app.core.utils.diff_parser import FileDiff, Hunk
+
+# Shorter repeated/moved blocks are kept; they are cheap and often coincidental
+MIN_DEDUPE_LINES = 3
+
+
+class CompactionStats:
+    __slots__ = ("collapsed_context_lines", "whitespace_hunks", "duplicate_hunks", "moved_hunks")
+
+    def __init__(self):
+        self.collapsed_context_lines = 0
+        self.whitespace_hunks = 0
+        self.duplicate_hunks = 0
+        self.moved_hunks = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _is_change(line: str) -> bool:
+    return line.startswith(("+", "-"))
+
+
+def collapse_context(hunk: Hunk, context: int) -> List[Hunk]:
+    """
+    Trim context to `context` lines around each change, splitting the hunk where needed.
+
+    Returns:
+        Hunks with recomputed line ranges; empty if the hunk has no changes
+    """
+    lines = hunk.lines
+    changes = [index for index, line in enumerate(lines) if _is_change(line)]
+    if not changes:
+        return []
+
+    positions: List[Tuple[int, int]] = []
+    old_line, new_line = hunk.old_start, hunk.new_start
+    for line in lines:
+        positions.append((old_line, new_line))
+        if line.startswith("-"):
+            old_line += 1
+        elif line.startswith("+"):
+            new_line += 1
+        elif not line.startswith("\\"):
+            old_line += 1
+            new_line += 1
+
+    ranges: List[List[int]] = []
+    for index in changes:
+        start, end = max(index - context, 0), min(index + context, len(lines) - 1)
+        if ranges and start <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+
+    if len(ranges) == 1 and ranges[0] == [0, len(lines) - 1]:
+        return [hunk]
+
+    parts = []
+    for start, end in ranges:
+        # Keep "\ No newline at end of file" with the line it annotates
+        while end + 1 < len(lines) and lines[end + 1].startswith("\\"):
+            end += 1
+        part_lines = lines[start:end + 1]
+        part = Hunk(
+            positions[start][0],
+            sum(1 for line in part_lines if not line.startswith(("+", "\\"))),
+            positions[start][1],
+            sum(1 for line in part_lines if not line.startswith(("-", "\\"))),
+            hunk.section,
+        )
+        part.lines = part_lines
+        parts.append(part)
+    return parts
+
+
+def _normalized(lines: List[str], prefix: str) -> List[str]:
+    # Indentation is kept: in Python, YAML or Makefiles re-indenting a line changes what it does
+    normalized = (line[1:].rstrip() for line in lines if line.startswith(prefix))
+    return [line for line in normalized if line]
+
+
+def is_whitespace_only(hunk: Hunk) -> bool:
+    """Return True if the hunk only changes trailing whitespace or blank lines."""
+    return _normalized(hunk.lines, "-") == _normalized(hunk.lines, "+")
+
+
+def compact_files(files: List[FileDiff], context: int) -> Tuple[List[FileDiff], CompactionStats]:
+    """
+    Compact parsed file diffs for review.
+
+    Args:
+        files: Parsed file diffs
+        context: Context lines to keep around each change
+
+    Returns:
+        Tuple of (compacted files, stats); files whose hunks were all dropped are omitted
+    """
+    stats = CompactionStats()
+    compacted: List[Tuple[FileDiff, List[Hunk]]] = []
+    seen_changes = set()
+    for diff_file in files:
+        hunks: List[Hunk] = []
+        for hunk in diff_file.hunks:
+            if is_whitespace_only(hunk):
+                stats.whitespace_hunks += 1
+                continue
+            changed = tuple(line.rstrip() for line in hunk.lines if _is_change(line))
+            if len(changed) >= MIN_DEDUPE_LINES:
+                if changed in seen_changes:
+                    stats.duplicate_hunks += 1
+                    continue
+                seen_changes.add(changed)
+            parts = collapse_context(hunk, context)
+            stats.collapsed_context_lines += len(hunk.lines) - sum(len(part.lines) for part in parts)
+            hunks.extend(parts)
+        compacted.append((diff_file, hunks))
+
+    # Pure deletions whose lines reappear verbatim as a pure addition elsewhere are moves
+    removed: Dict[Tuple[str, ...], List[Tuple[int, Hunk]]] = {}
+    added: Dict[Tuple[str, ...], List[Tuple[int, Hunk]]] = {}
+    for file_index, (_, hunks) in enumerate(compacted):
+        for hunk in hunks:
+            minus = tuple(_normalized(hunk.lines, "-"))
+            plus = tuple(_normalized(hunk.lines, "+"))
+            if minus and not plus and len(minus) >= MIN_DEDUPE_LINES:
+                removed.setdefault(minus, []).append((file_index, hunk))
+            elif plus and not minus and len(plus) >= MIN_DEDUPE_LINES:
+                added.setdefault(plus, []).append((file_index, hunk))
+    moved = set()
+    for block, deletions in removed.items():
+        for deletion, addition in zip(deletions, added.get(block, [])):
+            moved.add(id(deletion[1]))
+            moved.add(id(addition[1]))
+    stats.moved_hunks = len(moved)
+
+    result = []
+    for diff_file, hunks in compacted:
+        kept = [hunk for hunk in hunks if id(hunk) not in moved]
+        if kept or not diff_file.hunks:
+            result.append(diff_file.copy_with(kept))
+    return result, stats
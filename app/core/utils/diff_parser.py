@@ -0,0 +1,385 @@
+"""
+Incremental unified diff parser.
+
+DiffStreamParser consumes a diff in arbitrary byte chunks (e.g. straight
+from an HTTP response) and emits compact FileDiff/Hunk records as soon as
+each file is complete. Include/exclude rules are applied while streaming, so
+lockfiles, vendored and generated code, minified assets and binaries are
+never buffered, and a byte budget is enforced at hunk boundaries instead of
+cutting the diff at an arbitrary byte (or mid UTF-8 sequence).
+"""
+import codecs
+import fnmatch
+import os
+import re
+from typing import Iterable, List, Optional, Tuple, Union
+
+HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+# Patterns without a "/" match the file name, others match the whole path
+DEFAULT_EXCLUDE_PATTERNS = (
+    # Lockfiles
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock",
+    "Pipfile.lock", "Cargo.lock", "go.sum", "composer.lock", "Gemfile.lock", "uv.lock",
+    # Vendored dependencies
+    "vendor/*", "*/vendor/*", "third_party/*", "*/third_party/*", "node_modules/*", "*/node_modules/*",
+    # Generated code and build output
+    "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.generated.*", "*.g.dart",
+    "dist/*", "*/dist/*", "build/*", "*/build/*",
+    # Minified assets and source maps
+    "*.min.js", "*.min.css", "*.map",
+)
+
+
+def _env_patterns(name: str) -> Optional[List[str]]:
+    value = os.getenv(name)
+    if value is None:
+        return None
+    return [pattern.strip() for pattern in value.split(",") if pattern.strip()]
+
+
+def _strip_diff_prefix(path: str) -> str:
+    path = path.strip().split("\t", 1)[0]
+    if path.startswith(("a/", "b/")):
+        return path[2:]
+    return path
+
+
+def _parse_hunk_header(line: str) -> Optional[Tuple[int, int, int, int, str]]:
+    match = HUNK_HEADER_RE.match(line)
+    if not match:
+        return None
+    old_start, old_count, new_start, new_count, section = match.groups()
+    return (
+        int(old_start),
+        int(old_count) if old_count is not None else 1,
+        int(new_start),
+        int(new_count) if new_count is not None else 1,
+        section,
+    )
+
+
+class Hunk:
+    """One hunk of a file diff with its old/new line ranges."""
+
+    __slots__ = ("old_start", "old_count", "new_start", "new_count", "section", "lines")
+
+    def __init__(self, old_start: int, old_count: int, new_start: int, new_count: int, section: str = ""):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.section = section
+        self.lines: List[str] = []
+
+    @property
+    def header(self) -> str:
+        return f"@@ -{self.old_start},{self.old_count} +{self.new_start},{self.new_count} @@{self.section}"
+
+    @property
+    def new_end(self) -> int:
+        """Last line of the hunk in the new version of the file."""
+        return self.new_start + max(self.new_count, 1) - 1
+
+    @property
+    def text(self) -> str:
+        return "\n".join([self.header] + self.lines) + "\n"
+
+
+class FileDiff:
+    """Header lines and hunks for one file in a unified diff."""
+
+    __slots__ = ("header_lines", "old_path", "new_path", "is_binary", "hunks")
+
+    def __init__(self, header_lines: Optional[List[str]] = None):
+        self.header_lines: List[str] = []
+        self.old_path = ""
+        self.new_path = ""
+        self.is_binary = False
+        self.hunks: List[Hunk] = []
+        for line in header_lines or []:
+            self.add_header_line(line)
+
+    def add_header_line(self, line: str):
+        self.header_lines.append(line)
+        if line.startswith("diff --git "):
+            # Quoted or space-containing paths are refined by the ---/+++ lines below
+            old, _, new = line[len("diff --git "):].partition(" b/")
+            self.old_path = self.old_path or _strip_diff_prefix(old)
+            self.new_path = self.new_path or new.strip()
+        elif line.startswith("--- "):
+            self.old_path = _strip_diff_prefix(line[4:])
+        elif line.startswith("+++ "):
+            self.new_path = _strip_diff_prefix(line[4:])
+        elif line.startswith("rename to ") or line.startswith("copy to "):
+            self.new_path = line.split(" to ", 1)[1].strip()
+        elif line.startswith("Binary files ") or line == "GIT binary patch":
+            self.is_binary = True
+
+    @property
+    def path(self) -> str:
+        """Path of the file in the new version (old path for deletions)."""
+        if self.new_path and self.new_path != "/dev/null":
+            return self.new_path
+        return self.old_path
+
+    @property
+    def header(self) -> str:
+        return "\n".join(self.header_lines) + "\n" if self.header_lines else ""
+
+    def copy_with(self, hunks: List[Hunk]) -> "FileDiff":
+        """Return a FileDiff with the same header and the given hunks."""
+        copy = FileDiff()
+        copy.header_lines = self.header_lines
+        copy.old_path = self.old_path
+        copy.new_path = self.new_path
+        copy.is_binary = self.is_binary
+        copy.hunks = hunks
+        return copy
+
+
+class DiffFilter:
+    """
+    Include/exclude rules for files in a diff.
+
+    Exclude patterns default to DEFAULT_EXCLUDE_PATTERNS and can be replaced
+    with the DIFF_EXCLUDE_PATTERNS environment variable (comma-separated);
+    DIFF_INCLUDE_PATTERNS restricts the review to matching files.
+    """
+
+    def __init__(
+        self,
+        include: Optional[Iterable[str]] = None,
+        exclude: Optional[Iterable[str]] = None,
+        skip_binary: bool = True,
+    ):
+        if include is None:
+            include = _env_patterns("DIFF_INCLUDE_PATTERNS")
+        if exclude is None:
+            exclude = _env_patterns("DIFF_EXCLUDE_PATTERNS")
+            if exclude is None:
+                exclude = DEFAULT_EXCLUDE_PATTERNS
+        self.include = list(include or [])
+        self.exclude = list(exclude)
+        self.skip_binary = skip_binary
+
+    @staticmethod
+    def _matches(path: str, patterns: List[str]) -> bool:
+        name = path.rsplit("/", 1)[-1]
+        for pattern in patterns:
+            target = path if "/" in pattern else name
+            if fnmatch.fnmatchcase(target, pattern):
+                return True
+        return False
+
+    def accepts(self, file_diff: FileDiff) -> bool:
+        if self.skip_binary and file_diff.is_binary:
+            return False
+        path = file_diff.path
+        if self.include and not self._matches(path, self.include):
+            return False
+        return not self._matches(path, self.exclude)
+
+
+class DiffStreamParser:
+    """
+    Parse a unified diff incrementally.
+
+    Feed it bytes or text in chunks of any size; each call returns the files
+    completed so far. Hunk line counts are tracked, so removed lines that
+    start with "--" are never mistaken for a new file header.
+
+    When `max_bytes` is set, the parser stops at the last hunk that fits the
+    budget, sets `truncated` and ignores further input; callers can stop
+    reading as soon as `done` is True.
+    """
+
+    def __init__(self, diff_filter: Optional[DiffFilter] = None, max_bytes: Optional[int] = None):
+        self.diff_filter = diff_filter
+        self.max_bytes = max_bytes
+        self.truncated = False
+        self.skipped_paths: List[str] = []
+        self.bytes_kept = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._file: Optional[FileDiff] = None
+        self._file_accepted: Optional[bool] = None
+        self._hunk: Optional[Hunk] = None
+        self._hunk_bytes = 0
+        self._old_remaining = 0
+        self._new_remaining = 0
+        self._pending_minus: Optional[str] = None
+        self._completed: List[FileDiff] = []
+
+    @property
+    def done(self) -> bool:
+        return self.truncated
+
+    def feed(self, data: Union[bytes, str]) -> List[FileDiff]:
+        """Consume a chunk of the diff and return files completed by it."""
+        if self.done:
+            return []
+        text = self._decoder.decode(data) if isinstance(data, bytes) else data
+        self._buffer += text
+        lines = self._buffer.split("\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            if self.done:
+                break
+            self._process_line(line)
+        return self._take_completed()
+
+    def close(self) -> List[FileDiff]:
+        """Flush buffered input and return the remaining completed files."""
+        if not self.done:
+            self._buffer += self._decoder.decode(b"", final=True)
+            if self._buffer:
+                self._process_line(self._buffer)
+            self._buffer = ""
+            self._flush_pending_minus()
+            self._finish_file()
+        return self._take_completed()
+
+    def _take_completed(self) -> List[FileDiff]:
+        completed, self._completed = self._completed, []
+        return completed
+
+    def _check_file(self) -> bool:
+        if self._file_accepted is None:
+            self._file_accepted = self.diff_filter is None or self.diff_filter.accepts(self._file)
+            if self._file_accepted:
+                size = len(self._file.header)
+                if self.max_bytes is not None and self.bytes_kept + size > self.max_bytes:
+                    # Not even the file's header fits: stop before this file
+                    self._file = None
+                    self._hunk = None
+                    self._file_accepted = False
+                    self.truncated = True
+                    return False
+                self.bytes_kept += size
+        return self._file_accepted
+
+    def _start_file(self, header_lines: List[str]):
+        self._finish_file()
+        if self.done:
+            return
+        self._file = FileDiff(header_lines)
+        self._file_accepted = None
+
+    def _finish_file(self):
+        self._hunk = None
+        if self._file is None:
+            return
+        accepted = self._check_file()
+        if self._file is None:
+            return
+        if accepted:
+            self._completed.append(self._file)
+        elif self._file.path:
+            self.skipped_paths.append(self._file.path)
+        self._file = None
+
+    def _truncate(self):
+        # Drop the hunk that does not fit and keep everything before it
+        if self._hunk is not None and self._file.hunks and self._file.hunks[-1] is self._hunk:
+            self._file.hunks.pop()
+            self.bytes_kept -= self._hunk_bytes
+        self._hunk = None
+        if self._file is not None and not self._file.hunks:
+            self._file = None
+        self.truncated = True
+        self._finish_file()
+
+    def _flush_pending_minus(self):
+        if self._pending_minus is not None:
+            if self._file is not None and self._hunk is None:
+                self._file.add_header_line(self._pending_minus)
+            self._pending_minus = None
+
+    def _add_hunk_line(self, line: str):
+        if line.startswith("-"):
+            self._old_remaining -= 1
+        elif line.startswith("+"):
+            self._new_remaining -= 1
+        elif not line.startswith("\\"):
+            self._old_remaining -= 1
+            self._new_remaining -= 1
+        if not self._file_accepted:
+            return
+        size = len(line) + 1
+        if self.max_bytes is not None and self.bytes_kept + size > self.max_bytes:
+            self._truncate()
+            return
+        self._hunk.lines.append(line)
+        self._hunk_bytes += size
+        self.bytes_kept += size
+
+    def _process_line(self, line: str):
+        if self._hunk is not None and (self._old_remaining > 0 or self._new_remaining > 0):
+            self._add_hunk_line(line)
+            return
+
+        if line.startswith("\\") and self._hunk is not None:
+            # "\ No newline at end of file" belongs to the preceding hunk
+            self._add_hunk_line(line)
+            return
+
+        if self._pending_minus is not None:
+            pending, self._pending_minus = self._pending_minus, None
+            if line.startswith("+++ "):
+                self._start_file([pending, line])
+                return
+            if self._file is not None and self._hunk is None:
+                self._file.add_header_line(pending)
+
+        if line.startswith("diff --git "):
+            self._start_file([line])
+            return
+
+        if line.startswith("--- "):
+            in_git_header = (
+                self._file is not None and self._hunk is None and not self._file.hunks
+                and self._file.header_lines[0].startswith("diff --git ")
+            )
+            if in_git_header:
+                self._file.add_header_line(line)
+            else:
+                self._pending_minus = line
+            return
+
+        parsed = _parse_hunk_header(line)
+        if parsed and self._file is not None:
+            old_start, old_count, new_start, new_count, section = parsed
+            self._hunk = Hunk(old_start, old_count, new_start, new_count, section)
+            self._hunk_bytes = 0
+            self._old_remaining, self._new_remaining = old_count, new_count
+            if self._check_file():
+                size = len(line) + 1
+                if self.max_bytes is not None and self.bytes_kept + size > self.max_bytes:
+                    self._truncate()
+                    return
+                self._file.hunks.append(self._hunk)
+                self._hunk_bytes = size
+                self.bytes_kept += size
+            return
+
+        if self._file is not None and self._hunk is None and not self._file.hunks:
+            self._file.add_header_line(line)
+        # Anything else (preamble, trailing text) carries no reviewable content
+
+
+def parse_diff(
+    diff_text: str,
+    diff_filter: Optional[DiffFilter] = None,
+    max_bytes: Optional[int] = None,
+) -> Tuple[List[FileDiff], DiffStreamParser]:
+    """
+    Parse a complete diff string.
+
+    Returns:
+        Tuple of (accepted files in diff order, the parser for truncation and skip details)
+    """
+    parser = DiffStreamParser(diff_filter, max_bytes)
+    files = parser.feed(diff_text)
+    files.extend(parser.close())
+    return files, parser
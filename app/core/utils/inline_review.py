@@ -0,0 +1,96 @@
+"""
+Turn review findings into inline Pull Request Review comments.
+
+Findings are anchored to the diff by file path and new-file line number
+(GitHub's `line`/`side` anchors). A finding can only be anchored to a line
+that appears in the reviewed diff; everything else stays in the review's
+summary body. All comments are submitted together as one review.
+"""
+from typing import Any, Dict, List, Optional
+
+from app.core.storage.review_cache import LINE_NUMBER_RE, path_matches
+from app.core.utils.diff_parser import FileDiff
+from app.core.utils.review_format import format_review_result, merge_reviews, parse_review_markdown, render_review_table
+
+
+def commentable_lines(files: List[FileDiff], added_only: bool = False) -> Dict[str, List[List[int]]]:
+    """
+    Collect the new-file lines of a diff that inline comments can be attached to.
+
+    Args:
+        files: Parsed file diffs (uncompacted, as fetched)
+        added_only: Only allow added lines, e.g. when the diff is not the PR's own diff
+
+    Returns:
+        Mapping of file path to sorted, merged [start, end] line ranges
+    """
+    commentable: Dict[str, List[List[int]]] = {}
+    for diff_file in files:
+        if diff_file.new_path == "/dev/null":
+            continue
+        ranges: List[List[int]] = []
+        for hunk in diff_file.hunks:
+            new_line = hunk.new_start
+            for line in hunk.lines:
+                if line.startswith("-") or line.startswith("\\"):
+                    continue
+                if line.startswith("+") or not added_only:
+                    if ranges and ranges[-1][1] + 1 >= new_line:
+                        ranges[-1][1] = max(ranges[-1][1], new_line)
+                    else:
+                        ranges.append([new_line, new_line])
+                new_line += 1
+        if ranges:
+            commentable[diff_file.path] = ranges
+    return commentable
+
+
+def _anchor(row: List[str], commentable: Dict[str, List[List[int]]]) -> Optional[Dict[str, Any]]:
+    if len(row) < 3:
+        return None
+    match = LINE_NUMBER_RE.search(row[2])
+    if not match:
+        return None
+    line = int(match.group())
+    for path, ranges in commentable.items():
+        if path_matches(row[1], path) and any(start <= line <= end for start, end in ranges):
+            return {"path": path, "line": line, "side": "RIGHT"}
+    return None
+
+
+def _comment_body(row: List[str]) -> str:
+    category, _, _, severity, issue, suggestion = (row + [""] * 6)[:6]
+    body = f"**{severity or 'Note'} · {category}**: {issue}"
+    return f"{body}\n\n{suggestion}" if suggestion else body
+
+
+def build_inline_review(review_result: Dict[str, Any], head_sha: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Split a review result into inline comments and a summary body.
+
+    Args:
+        review_result: Result of review_code, including "commentable_lines"
+        head_sha: Commit the comments refer to
+
+    Returns:
+        Dictionary with "body", "comments" (path/line/side/body) and "commit_id",
+        ready for POST /repos/{repo}/pulls/{n}/reviews
+    """
+    commentable = review_result.get("commentable_lines") or {}
+    summary, rows = parse_review_markdown(merge_reviews(review_result.get("reviews") or []))
+
+    comments, leftover = [], []
+    for row in rows:
+        anchor = _anchor(row, commentable)
+        if anchor is None:
+            leftover.append(row)
+        else:
+            comments.append({**anchor, "body": _comment_body(row)})
+
+    sections = ["\n".join(summary)] if summary else []
+    if comments and not summary:
+        sections.append(f"Found {len(comments)} issue(s); see the inline comments.")
+    if leftover:
+        sections.append(render_review_table(leftover))
+    body = format_review_result({**review_result, "reviews": ["\n\n".join(sections)] if sections else []})
+    return {"body": body, "comments": comments, "commit_id": head_sha}
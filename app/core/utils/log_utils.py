@@ -0,0 +1,32 @@
+import logging
+import random
+from typing import Any
+
+from app.core.utils.constants import LoggingConstants
+
+REDACTED_KEYS = ("github_token",)
+
+
+def cap(value: Any, max_chars: int = LoggingConstants.DEBUG_MAX_CHARS) -> str:
+    """Render a value for logging, truncated to `max_chars` characters."""
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+
+
+def redact(payload: dict) -> dict:
+    """Copy a payload with secrets masked."""
+    return {key: "***" if key in REDACTED_KEYS and value else value for key, value in payload.items()}
+
+
+def log_sampled(logger: logging.Logger, message: str, *args: Any):
+    """
+    Log a DEBUG message for a sample of calls, with every argument size-capped.
+
+    Used for payload and diff details that are too large and too frequent
+    to log on every request.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= LoggingConstants.DEBUG_SAMPLE_RATE:
+        return
+    logger.debug(message, *(cap(arg) for arg in args))
@@ -0,0 +1,66 @@
+"""
+Prometheus metrics for the review pipeline.
+
+Metrics are recorded wherever the work happens (API, Celery or asyncio
+workers). When PROMETHEUS_MULTIPROC_DIR is set for every process on a host,
+prometheus_client's multiprocess mode shares them through that directory,
+so the API's /metrics endpoint reports the workers' metrics too.
+"""
+import logging
+import os
+from typing import Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY as DEFAULT_REGISTRY
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+TOKEN_BUCKETS = (500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000)
+
+GITHUB_FETCH_SECONDS = Histogram(
+    "defexai_github_fetch_seconds", "Time to fetch PR metadata or diffs from GitHub", ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+GITHUB_RETRIES = Counter("defexai_github_retries_total", "GitHub requests retried", ["reason"])
+DIFF_BYTES = Histogram("defexai_diff_bytes", "Reviewable diff bytes per review", buckets=SIZE_BUCKETS)
+DIFF_BACKEND_FALLBACKS = Counter(
+    "defexai_diff_backend_fallbacks_total", "Diffs fetched from the compare API because the git mirror failed",
+)
+DIFF_TRUNCATIONS = Counter("defexai_diff_truncations_total", "Reviews whose diff was cut", ["reason"])
+PROMPT_TOKENS = Histogram("defexai_prompt_tokens", "Prompt tokens sent to the LLM per review", buckets=TOKEN_BUCKETS)
+LLM_SECONDS = Histogram(
+    "defexai_llm_call_seconds", "LLM review call latency", ["backend", "outcome"], buckets=LATENCY_BUCKETS,
+)
+COMMENT_POST_SECONDS = Histogram(
+    "defexai_comment_post_seconds", "Time to post or update the review on GitHub", ["action"],
+    buckets=LATENCY_BUCKETS,
+)
+FIRST_FEEDBACK_SECONDS = Histogram(
+    "defexai_first_feedback_seconds", "Time from review start to the first partial findings on the PR",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TRUNCATIONS = Counter(
+    "defexai_llm_truncations_total", "LLM responses cut off at the output token cap", ["backend"],
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "defexai_rate_limit_wait_seconds", "Time spent waiting for shared API rate limit capacity", ["api"],
+    buckets=LATENCY_BUCKETS,
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "defexai_circuit_transitions_total", "Upstream circuit breaker state changes", ["upstream", "state"],
+)
+QUEUE_DEPTH = Gauge(
+    "defexai_queue_depth", "Messages waiting in a task queue", ["queue"], multiprocess_mode="mostrecent",
+)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Render all metrics in the Prometheus text format, aggregating worker processes if configured."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(DEFAULT_REGISTRY), CONTENT_TYPE_LATEST
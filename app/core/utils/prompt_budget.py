@@ -0,0 +1,154 @@
+"""
+Fit a parsed diff into the review token budget.
+
+Compacts the diff, then ranks hunks by how much they are worth reviewing
+and keeps the most relevant ones that fit within the per-request token
+budget. Everything is counted locally so the budget can be reported
+before any LLM call is made.
+"""
+import logging
+import posixpath
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.utils.constants import PromptBudgetConstants
+from app.core.utils.diff_compactor import compact_files
+from app.core.utils.diff_parser import FileDiff, Hunk
+from app.core.utils.prompts import get_code_review_prompt, get_structured_review_prompt
+from app.core.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SECURITY_KEYWORDS = (
+    "auth", "crypt", "jwt", "login", "oauth", "password", "permission",
+    "secret", "security", "session", "sql", "token",
+)
+CONFIG_SUFFIXES = (".yml", ".yaml", ".toml", ".tf", ".ini", ".cfg", ".conf")
+DOC_SUFFIXES = (".md", ".rst", ".txt", ".adoc")
+TEST_MARKERS = ("test/", "tests/", "__tests__/", "spec/", "fixtures/")
+
+
+def _path_weight(path: str) -> float:
+    lower = path.lower()
+    name = posixpath.basename(lower)
+    if lower.endswith(DOC_SUFFIXES) or lower.startswith(("docs/", "doc/")) or "/docs/" in lower:
+        return 0.3
+    if (
+        any(lower.startswith(marker) or "/" + marker in lower for marker in TEST_MARKERS)
+        or name.startswith("test_")
+        or ".test." in name
+        or ".spec." in name
+        or name.endswith("_test.py")
+    ):
+        return 0.6
+    if lower.endswith(CONFIG_SUFFIXES) or name == "dockerfile" or lower.startswith(".github/"):
+        return 1.2
+    return 1.0
+
+
+def hunk_relevance(diff_file: FileDiff, hunk: Hunk) -> float:
+    """
+    Score how much a hunk is worth reviewing.
+
+    Added lines count more than removed ones; security-sensitive code is
+    boosted while tests and docs are demoted.
+    """
+    added = sum(1 for line in hunk.lines if line.startswith("+"))
+    removed = sum(1 for line in hunk.lines if line.startswith("-"))
+    score = added + 0.3 * removed
+    weight = _path_weight(diff_file.path)
+    changed = " ".join(line.lower() for line in hunk.lines if line.startswith(("+", "-")))
+    if any(keyword in diff_file.path.lower() or keyword in changed for keyword in SECURITY_KEYWORDS):
+        weight *= 1.5
+    return score * weight
+
+
+def _diff_tokens(files: List[FileDiff], model: Optional[str]) -> int:
+    return sum(count_tokens(f.header, model) + sum(count_tokens(h.text, model) for h in f.hunks) for f in files)
+
+
+def select_hunks(
+    files: List[FileDiff], max_tokens: int, model: Optional[str] = None
+) -> Tuple[List[FileDiff], int, int]:
+    """
+    Keep the most relevant hunks that fit within `max_tokens` (0 keeps them all).
+
+    A file's header is charged once, with its first kept hunk. Kept hunks
+    stay in diff order.
+
+    Returns:
+        Tuple of (selected files, selected tokens, number of dropped hunks)
+    """
+    header_tokens = [count_tokens(f.header, model) for f in files]
+    candidates = [
+        (hunk_relevance(f, hunk), index, position, hunk)
+        for index, f in enumerate(files)
+        for position, hunk in enumerate(f.hunks)
+    ]
+    candidates.sort(key=lambda item: (-item[0], item[1], item[2]))
+
+    kept: Dict[int, List[Tuple[int, Hunk]]] = {}
+    used = sum(tokens for f, tokens in zip(files, header_tokens) if not f.hunks)
+    dropped = 0
+    for _, index, position, hunk in candidates:
+        cost = count_tokens(hunk.text, model) + (0 if index in kept else header_tokens[index])
+        if max_tokens and used + cost > max_tokens:
+            dropped += 1
+            continue
+        used += cost
+        kept.setdefault(index, []).append((position, hunk))
+
+    selected = []
+    for index, f in enumerate(files):
+        if not f.hunks:
+            selected.append(f)
+        elif index in kept:
+            selected.append(f.copy_with([hunk for _, hunk in sorted(kept[index], key=lambda item: item[0])]))
+    return selected, used, dropped
+
+
+def budget_files(
+    files: List[FileDiff],
+    model: Optional[str] = None,
+    max_tokens: int = PromptBudgetConstants.MAX_REVIEW_TOKENS,
+    context_lines: int = PromptBudgetConstants.CONTEXT_LINES,
+    structured: bool = False,
+) -> Tuple[List[FileDiff], Dict[str, Any]]:
+    """
+    Compact a parsed diff and fit it into the review token budget.
+
+    Args:
+        files: Parsed file diffs
+        model: Model name used to pick the tokenizer
+        max_tokens: Maximum diff tokens sent to the LLM for the whole request (0 = no limit)
+        context_lines: Unchanged context lines kept around each change
+        structured: Whether the structured (JSON) review prompt is used
+
+    Returns:
+        Tuple of (files to review, budget report)
+    """
+    raw_tokens = _diff_tokens(files, model)
+    compacted, stats = compact_files(files, context_lines)
+    compacted_tokens = _diff_tokens(compacted, model)
+    selected, selected_tokens, dropped = select_hunks(compacted, max_tokens, model)
+
+    prompt = get_structured_review_prompt("") if structured else get_code_review_prompt("")
+    report = {
+        "max_tokens": max_tokens,
+        "raw_tokens": raw_tokens,
+        "compacted_tokens": compacted_tokens,
+        "selected_tokens": selected_tokens,
+        "instruction_tokens": count_tokens(prompt, model),
+        "total_hunks": sum(len(f.hunks) for f in compacted),
+        "dropped_hunks": dropped,
+        **stats.as_dict(),
+    }
+    logger.info(
+        "Diff budget: %d raw -> %d compacted -> %d selected tokens (limit %d, %d hunk(s) dropped)",
+        raw_tokens, compacted_tokens, selected_tokens, max_tokens, dropped,
+    )
+    if dropped:
+        logger.warning(
+            "Token budget dropped %d of %d hunk(s) from the review; raise REVIEW_MAX_DIFF_TOKENS to review them",
+            dropped, report["total_hunks"],
+        )
+    return selected, report
@@ -5,6 +5,9 @@ This module contains all prompts used for AI-powered code reviews.
 Centralizing prompts makes them easier to update, test, and version control.
 """
 
+# Bump whenever a prompt template changes; cached reviews are keyed on it
+PROMPT_VERSION = "1"
+
 
 def get_code_review_prompt(diff_text: str) -> str:
     """
@@ -62,3 +65,51 @@ Now, review the following diff and return your Markdown review (no code fences,
 Diff: ```{diff_text}```  
 """
 
+
+
+# Bump whenever the structured (JSON) prompt template changes
+STRUCTURED_PROMPT_VERSION = "json-1"
+
+
+def get_structured_review_prompt(diff_text: str) -> str:
+    """
+    Generate the prompt for code review analysis with structured JSON output.
+
+    The response format itself is enforced with a JSON schema; the prompt
+    describes what belongs in each field.
+
+    Args:
+        diff_text: The code diff to analyze
+
+    Returns:
+        Formatted prompt string for the AI model
+    """
+    return f"""
+You are a senior software engineer providing a professional code review for a GitHub pull request.
+Your goal is to help the developer *improve their code quality and maintainability*.
+
+Analyze the provided code diff and identify:
+
+- Potential bugs or logical issues
+- Performance or scalability issues
+- Readability and maintainability issues
+- Security vulnerabilities
+- Style or PEP-8 violations
+- Missing documentation or best-practice gaps
+- Opportunities for cleaner, more idiomatic code or Suggestions for improvement
+- Any other relevant issues
+
+Respond with a JSON object:
+- "summary": 2–3 short lines summarizing overall quality and the key issues found (friendly, encouraging tone).
+- "findings": one entry per issue, each with:
+  - "category": Bug, Performance, Readability, Security, Style, Documentation or Other
+  - "file": the file path exactly as it appears in the diff
+  - "lines": line numbers in the new version of the file, e.g. "12" or "7, 10"
+  - "severity": "Low", "Medium" or "High"
+  - "issue": a concise description of the problem
+  - "suggestion": a concise, actionable fix
+
+If no issues are found, return an empty "findings" list and say the code looks good in "summary".
+
+Diff: ```{diff_text}```
+"""
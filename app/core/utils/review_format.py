@@ -1,32 +1,234 @@
-from typing import Dict, Any
+import re
+from typing import Dict, Any, List, Tuple
+
+from app.core.models.models import ReviewFinding, ReviewOutput
+
+REVIEW_TABLE_HEADER = "| Category | File | Lines | Severity | Issue | Suggestion |"
+REVIEW_TABLE_SEPARATOR = "|-----------|------|--------|-----------|--------|-------------|"
+
+# Lower rank sorts first in the merged table
+SEVERITY_RANK = {"high": 0, "medium": 1, "low": 2}
+SEVERITY_LABELS = {"Low": "🟢 Low", "Medium": "🟡 Medium", "High": "🔴 High"}
+UPSTREAM_NAMES = {"github": "GitHub", "openai": "the AI review service", "stub": "the AI review service"}
+
+# Cell separators: pipes not escaped with a backslash
+CELL_SEPARATOR_RE = re.compile(r"(?<!\\)\|")
+
+
+def _split_row(line: str) -> List[str]:
+    line = line.strip()
+    line = line[1:] if line.startswith("|") else line
+    line = line[:-1] if line.endswith("|") and not line.endswith("\\|") else line
+    return [cell.strip() for cell in CELL_SEPARATOR_RE.split(line)]
+
+
+def _escape_cell(text: str) -> str:
+    return " ".join(text.split()).replace("|", "\\|")
+
+
+def _is_separator_row(cells: List[str]) -> bool:
+    return all(cell and set(cell) <= set("-: ") for cell in cells)
+
+
+def parse_review_markdown(review_markdown: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Split an AI-generated Markdown review into summary lines and table rows.
+
+    Args:
+        review_markdown: Markdown review in the format requested by the code review prompt
+
+    Returns:
+        Tuple of (summary lines, table rows as lists of cell strings)
+    """
+    summary: List[str] = []
+    rows: List[List[str]] = []
+    for line in review_markdown.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            cells = _split_row(stripped)
+            if _is_separator_row(cells) or [c.lower() for c in cells[:2]] == ["category", "file"]:
+                continue
+            rows.append(cells)
+        elif stripped and stripped != "---" and not rows:
+            # Only text before the table is summary; trailing notes are dropped
+            summary.append(stripped)
+    return summary, rows
+
+
+def _severity_rank(row: List[str]) -> int:
+    severity = row[3].lower() if len(row) > 3 else ""
+    for name, rank in SEVERITY_RANK.items():
+        if name in severity:
+            return rank
+    return len(SEVERITY_RANK)
+
+
+def _row_key(row: List[str]) -> Tuple[str, ...]:
+    # Category, file, lines and issue identify a finding; suggestions vary in wording
+    return tuple(" ".join(cell.lower().split()) for cell in (row[:3] + row[4:5]))
+
+
+def finding_to_row(finding: ReviewFinding) -> List[str]:
+    """Convert a structured finding into a review table row."""
+    return [
+        _escape_cell(finding.category),
+        _escape_cell(finding.file),
+        _escape_cell(finding.lines),
+        SEVERITY_LABELS[finding.severity],
+        _escape_cell(finding.issue),
+        _escape_cell(finding.suggestion),
+    ]
+
+
+def render_review_output(output: ReviewOutput) -> str:
+    """Render a structured review as Markdown: the summary followed by the findings table."""
+    sections = [output.summary.strip()] if output.summary.strip() else []
+    if output.findings:
+        sections.append(render_review_table([finding_to_row(finding) for finding in output.findings]))
+    return "\n\n".join(sections)
+
+
+def render_review_table(rows: List[List[str]]) -> str:
+    """Render review rows as a Markdown table in the format requested by the code review prompt."""
+    table = [REVIEW_TABLE_HEADER, REVIEW_TABLE_SEPARATOR]
+    table.extend("| " + " | ".join(row) + " |" for row in rows)
+    return "\n".join(table)
+
+
+def merge_reviews(reviews: List[str]) -> str:
+    """
+    Merge several per-chunk Markdown reviews into one review with a single deduplicated table.
+
+    Args:
+        reviews: Markdown reviews, one per reviewed diff chunk
+
+    Returns:
+        Merged Markdown review
+    """
+    reviews = [review for review in reviews if review and review.strip()]
+    if len(reviews) == 1:
+        return reviews[0].strip()
+
+    summaries: List[str] = []
+    rows: List[List[str]] = []
+    seen = set()
+    for review in reviews:
+        summary, review_rows = parse_review_markdown(review)
+        if summary and " ".join(summary) not in summaries:
+            summaries.append(" ".join(summary))
+        for row in review_rows:
+            key = _row_key(row)
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(row)
+
+    rows.sort(key=lambda row: (_severity_rank(row), row[1] if len(row) > 1 else ""))
+
+    sections = []
+    if summaries:
+        sections.append("\n".join(f"- {summary}" for summary in summaries))
+    if rows:
+        sections.append(render_review_table(rows))
+    return "\n\n".join(sections)
+
+
+def format_partial_review(reviews: List[str], chunks: int) -> str:
+    """
+    Format the findings of a review that is still running as a placeholder comment.
+
+    Args:
+        reviews: Markdown reviewed so far: cached rows and the streamed (possibly unfinished) chunk reviews
+        chunks: Number of diff parts being reviewed
+
+    Returns:
+        Markdown comment listing the findings so far
+    """
+    _, rows = parse_review_markdown(merge_reviews(reviews))
+    comment = (
+        "## Code Review In Progress\n\n"
+        f"⏳ Reviewing {chunks} diff part(s). Findings so far are listed below; "
+        "this comment is updated until the review is complete."
+    )
+    if rows:
+        rows.sort(key=lambda row: (_severity_rank(row), row[1] if len(row) > 1 else ""))
+        comment += "\n\n" + render_review_table(rows)
+    return comment
+
+
+def format_deferred_notice(upstream: str) -> str:
+    """Format the comment posted while a review waits for an unavailable upstream."""
+    name = UPSTREAM_NAMES.get(upstream, upstream)
+    return (
+        "## Code Review Deferred\n\n"
+        f"⏳ The review of this pull request is delayed because {name} is currently unavailable. "
+        "It will be retried automatically and this comment updated with the results."
+    )
 
 
 def format_review_result(review_result: Dict[str, Any]) -> str:
     """
     Format a review result dictionary into a readable markdown comment string.
-    
+
     Args:
         review_result: Dictionary containing review results with keys:
             - "review": Markdown string containing the AI-generated review
+            - "reviews": (optional) List of per-chunk Markdown reviews, merged into one table
             - "truncated": Boolean indicating if diff was truncated
-    
+            - "failed_chunks": (optional) Number of diff chunks that could not be reviewed
+            - "skipped_files": (optional) Paths excluded from review (lockfiles, generated, binary)
+            - "token_budget": (optional) Prompt budget report; hunks dropped to fit it are
+              flagged at the top of the comment
+            - "incremental_from": (optional) Previously reviewed head this review continues from
+
     Returns:
         Formatted markdown string ready to be posted as a GitHub comment
     """
-    review_markdown = review_result.get("review", "")
+    if review_result.get("reviews") is not None:
+        review_markdown = merge_reviews(review_result["reviews"])
+    else:
+        review_markdown = review_result.get("review", "")
     truncated = review_result.get("truncated", False)
-    
+    failed_chunks = review_result.get("failed_chunks", 0)
+    skipped_files = review_result.get("skipped_files") or []
+    token_budget = review_result.get("token_budget") or {}
+    dropped_hunks = token_budget.get("dropped_hunks", 0)
+    incremental_from = review_result.get("incremental_from")
+
     if not review_markdown or not review_markdown.strip():
-        return "## Code Review Results\n\n✅ No issues found!"
-    
-    # Start with the AI-generated review
-    comment_lines = [review_markdown.strip()]
-    
+        review_markdown = "## Code Review Results\n\n✅ No issues found!"
+        if not skipped_files and not dropped_hunks and not incremental_from:
+            return review_markdown
+
+    # An incomplete review must not read as a clean one, so partial coverage leads the comment
+    comment_lines = []
+    if dropped_hunks:
+        total_hunks = token_budget.get("total_hunks") or dropped_hunks
+        comment_lines.append(
+            f"> ⚠️ **Partial review:** {dropped_hunks} of {total_hunks} changes "
+            f"({dropped_hunks * 100 // total_hunks}%) were not reviewed to stay within the token budget."
+        )
+
+    # Then the AI-generated review
+    comment_lines.append(review_markdown.strip())
+
     # Add truncation note if applicable
-    if truncated:
+    if truncated or failed_chunks or skipped_files or incremental_from:
         comment_lines.append("")
         comment_lines.append("---")
+    if incremental_from:
+        comment_lines.append(
+            f"_Note: Reviewed the commits pushed since `{incremental_from[:7]}`; earlier findings were carried forward._"
+        )
+    if truncated:
         comment_lines.append("_Note: Diff was truncated due to size limits._")
-    
-    return "\n\n".join(comment_lines)
+    if skipped_files:
+        comment_lines.append(
+            f"_Note: {len(skipped_files)} file(s) were not reviewed (lockfiles, vendored, generated or binary)._"
+        )
+    if failed_chunks:
+        comment_lines.append(
+            f"_Note: {failed_chunks} of {review_result.get('chunks', failed_chunks)} diff parts could not be reviewed._"
+        )
 
+    return "\n\n".join(comment_lines)
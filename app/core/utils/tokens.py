@@ -0,0 +1,56 @@
+"""
+Local token counting for prompt budgeting.
+
+Uses tiktoken when it is installed (and its encoding can be loaded);
+otherwise falls back to a characters-per-token estimate that is close
+enough for budgeting code diffs.
+"""
+import logging
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for code; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: Optional[str]):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use; offline workers fall back to the estimate
+        logger.warning("tiktoken encoding unavailable (%s); estimating tokens from length", e)
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of LLM tokens in a piece of text from its length."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the LLM tokens in a piece of text.
+
+    Args:
+        text: Text to count
+        model: Model name used to pick the tokenizer (default encoding if unknown)
+
+    Returns:
+        Exact token count with tiktoken, else an estimate
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,8 +1,13 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+import asyncio
 import logging
 import sys
 
+from app.core.rabbit_mq.connection import close_pool, get_pool
 from app.core.routers.code_reviewer import router
+from app.core.utils.constants import QueueConstants
+from app.core.utils.metrics import QUEUE_DEPTH, render_metrics
 
 # Configure logging so that module loggers (like app.core.routers.code_reviewer)
 # emit INFO+ messages to stdout. GitHub Actions captures stdout/stderr, so
@@ -13,9 +18,35 @@ logging.basicConfig(
 	format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
 )
 
-app = FastAPI(title="DefexAI Code Reviewer")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled broker connection per API process, shared by all requests
+    get_pool()
+    yield
+    await close_pool()
+
+
+app = FastAPI(title="DefexAI Code Reviewer", lifespan=lifespan)
 app.include_router(router)
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "message": "App is running healthy!"}
+
+
+@app.get("/metrics")
+async def metrics():
+    # Queue depth is sampled from the broker at scrape time
+    for queue_name in (
+        QueueConstants.CODE_REVIEW_QUEUE,
+        QueueConstants.GITHUB_COMMENT_QUEUE,
+        *QueueConstants.RETRY_QUEUES.values(),
+    ):
+        try:
+            depth = await asyncio.wait_for(get_pool().queue_depth(queue_name), timeout=2)
+            QUEUE_DEPTH.labels(queue_name).set(depth)
+        except Exception as e:
+            logging.getLogger(__name__).warning("Could not read depth of %s: %s", queue_name, e)
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,222 @@
+"""
+Asyncio worker for the review and comment queues.
+
+An alternative to the Celery worker: one long-lived event loop consumes
+`code_review_queue` and `github_comment_queue` with aio_pika and processes
+hundreds of messages concurrently using the async GitHub and OpenAI clients.
+Messages use Celery's task protocol, so this worker and Celery workers can
+share the same queues.
+
+Run with:
+    python -m app.workers.async_worker
+"""
+import asyncio
+import logging
+import signal
+import sys
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict
+
+import aio_pika
+
+from app.core.rabbit_mq.connection import close_pool, get_connection
+from app.core.rabbit_mq.publisher import publish_task, publish_task_delayed
+from app.core.rabbit_mq.task_message import parse_task_message, task_eta
+from app.core.services.circuit_breaker import CircuitOpen
+from app.core.services.github_client import post_comment_to_github
+from app.core.services.review_dispatch import (
+    ReviewSuperseded,
+    build_comment_payload,
+    defer_comment,
+    defer_review,
+    record_comment_result,
+    review_task,
+    run_review_job,
+)
+from app.core.services.review_scheduler import finish_review
+from app.core.utils.constants import AsyncWorkerConstants, QueueConstants, TaskConstants
+
+logger = logging.getLogger(__name__)
+
+
+async def handle_review(payload: dict, task_id: str) -> Dict[str, Any]:
+    """Review code and enqueue the comment task, mirroring review_code_worker."""
+    try:
+        review_result = await run_review_job(task_id, review_task(payload, task_id), payload)
+    except ReviewSuperseded:
+        logger.info(f"Review of {payload.get('repo')} PR #{payload.get('pr_number')} superseded by a newer push")
+        return {"status": "superseded", "comment_queued": False}
+    except CircuitOpen as e:
+        return await defer_review(payload, task_id, e)
+    logger.info(f"Review completed for {payload.get('repo')} PR #{payload.get('pr_number')}")
+
+    github_token = payload.get("github_token")
+    if not github_token:
+        raise ValueError("github_token is required to publish comment")
+
+    # Builds and stores the result record (SQLite), so it runs in a worker thread, off the event loop
+    comment_payload = await asyncio.to_thread(build_comment_payload, payload, review_result, task_id=task_id)
+    await publish_task(QueueConstants.GITHUB_COMMENT_QUEUE, TaskConstants.POST_COMMENT_TASK, [comment_payload])
+    logger.info("Review result dispatched to comment queue")
+    return {
+        "status": "success",
+        "chunks": review_result.get("chunks"),
+        "failed_chunks": review_result.get("failed_chunks"),
+        "comment_queued": True,
+    }
+
+
+async def handle_comment(payload: dict, task_id: str) -> Dict[str, Any]:
+    """Post a review comment, mirroring post_comment_worker."""
+    if not payload.get("github_token"):
+        raise ValueError("github_token is required")
+    try:
+        outcome = await post_comment_to_github(payload)
+    except CircuitOpen as e:
+        try:
+            return await defer_comment(payload, task_id, e)
+        except Exception as e:
+            await asyncio.to_thread(record_comment_result, payload, error=f"Failed to post comment: {e}")
+            raise
+    except Exception as e:
+        await asyncio.to_thread(record_comment_result, payload, error=f"Failed to post comment: {e}")
+        raise
+    await asyncio.to_thread(record_comment_result, payload, outcome)
+    logger.info(f"Comment posted successfully to {payload.get('repo')} PR #{payload.get('pr_number')}")
+    return {"status": "success", "repo": payload.get("repo"), "pr_number": payload.get("pr_number")}
+
+
+TASK_HANDLERS: Dict[str, Callable[[dict, str], Awaitable[Dict[str, Any]]]] = {
+    TaskConstants.REVIEW_CODE_TASK: handle_review,
+    TaskConstants.POST_COMMENT_TASK: handle_comment,
+}
+
+
+class AsyncWorker:
+    """
+    Consume task queues on one event loop with a per-queue concurrency limit.
+
+    The prefetch count of each queue's channel equals its concurrency limit,
+    so the broker never hands this process more unacknowledged messages than
+    it is allowed to work on. Like Celery's task_acks_late, a message is only
+    acknowledged once its handler finishes: successes are acked, failures are
+    rejected without requeue, and messages in flight when the process dies
+    are redelivered by the broker. Tasks whose ETA has not passed are moved
+    to their queue's retry queue until it does, instead of holding a slot.
+    """
+
+    def __init__(self, concurrency: Dict[str, int]):
+        self.concurrency = concurrency
+        self.connection = None
+        self.consumers: list = []
+        self.in_flight: set = set()
+        self.stopping = asyncio.Event()
+
+    async def start(self):
+        self.connection = await get_connection()
+        for queue_name, limit in self.concurrency.items():
+            channel = await self.connection.channel()
+            await channel.set_qos(prefetch_count=limit)
+            queue = await channel.declare_queue(queue_name, durable=True, arguments=QueueConstants.ARGUMENTS.get(queue_name))
+            consumer_tag = await queue.consume(self._on_message)
+            self.consumers.append((queue, consumer_tag))
+            logger.info("Consuming %s with concurrency %d", queue_name, limit)
+
+    async def _on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        # Run each message as its own task so the consumer callback returns immediately
+        task = asyncio.create_task(self._process(message))
+        self.in_flight.add(task)
+        task.add_done_callback(self.in_flight.discard)
+
+    async def _process(self, message: aio_pika.abc.AbstractIncomingMessage):
+        try:
+            task_name, task_id, args, kwargs = parse_task_message(message)
+        except ValueError as e:
+            logger.error("Dropping malformed message from %s: %s", message.routing_key, e)
+            await message.reject(requeue=False)
+            await self._release_slot(message, (message.headers or {}).get("id") or message.correlation_id)
+            return
+
+        handler = TASK_HANDLERS.get(task_name)
+        if handler is None:
+            # Requeueing would only redeliver it to this worker in a tight loop
+            logger.error("No handler for task %s (id %s); rejecting", task_name, task_id)
+            await message.reject(requeue=False)
+            await self._release_slot(message, task_id)
+            return
+
+        eta = task_eta(message)
+        if eta is not None and eta > datetime.now(timezone.utc):
+            # Debounced tasks (see dispatch_review) wait out their ETA in the retry queue, not in a slot
+            try:
+                await publish_task_delayed(
+                    message.routing_key, task_name, args,
+                    task_id=task_id, priority=message.priority, kwargs=kwargs, eta=eta,
+                )
+            except Exception as e:
+                logger.error("Could not park task %s (id %s) until its ETA: %s", task_name, task_id, e)
+                await message.reject(requeue=True)
+            else:
+                await message.ack()
+                logger.info("Task %s (id %s) parked in the retry queue until %s", task_name, task_id, eta.isoformat())
+            return
+
+        try:
+            payload = args[0] if args else kwargs.get("payload", {})
+            logger.info("Processing task %s (id %s, redelivered=%s)", task_name, task_id, message.redelivered)
+            await handler(payload, task_id)
+        except Exception as e:
+            logger.error(f"Error in task {task_name} (id {task_id}): {e}", exc_info=True)
+            await message.reject(requeue=False)
+        else:
+            await message.ack()
+
+    async def _release_slot(self, message: aio_pika.abc.AbstractIncomingMessage, task_id):
+        # A dropped review never reaches run_review_job, which would otherwise free its scheduler slot
+        if message.routing_key != QueueConstants.CODE_REVIEW_QUEUE or not task_id:
+            return
+        try:
+            await finish_review(str(task_id))
+        except Exception as e:
+            logger.error("Could not free the scheduler slot of dropped review %s: %s", task_id, e)
+
+    async def stop(self):
+        """Stop consuming, let in-flight messages finish and get acked, then close the connection."""
+        if self.connection is None:
+            return
+        for queue, consumer_tag in self.consumers:
+            await queue.cancel(consumer_tag)
+        self.consumers.clear()
+        logger.info("Stopping async worker; waiting for %d in-flight task(s)", len(self.in_flight))
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight, return_exceptions=True)
+        await self.connection.close()
+        self.connection = None
+        await close_pool()
+
+    async def run(self):
+        await self.start()
+        try:
+            await self.stopping.wait()
+        finally:
+            await self.stop()
+
+
+async def main():
+    worker = AsyncWorker({
+        QueueConstants.CODE_REVIEW_QUEUE: AsyncWorkerConstants.REVIEW_CONCURRENCY,
+        QueueConstants.GITHUB_COMMENT_QUEUE: AsyncWorkerConstants.COMMENT_CONCURRENCY,
+    })
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stopping.set)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        stream=sys.stdout,
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    )
+    asyncio.run(main())
@@ -1,13 +1,17 @@
-import asyncio
 import logging
 
 from app.celery_app import app
+from app.workers.event_loop import run_async
 from app.core.services.github_client import post_comment_to_github
+from app.core.services.circuit_breaker import CircuitOpen
+from app.core.services.review_dispatch import defer_comment, record_comment_result
+from app.core.storage.payloads import decode_payload
+from app.core.utils.constants import TaskConstants
 
 logger = logging.getLogger(__name__)
 
 
-@app.task(bind=True, name="defexai.post_comment_worker")
+@app.task(bind=True, name=TaskConstants.POST_COMMENT_TASK)
 def post_comment_worker(self, payload: dict):
     """
     Celery task to post a comment to a GitHub PR.
@@ -22,6 +26,7 @@ def post_comment_worker(self, payload: dict):
         Dictionary with status and details
     """
     try:
+        payload = decode_payload(payload)
         # Log payload without exposing token
         payload_log = {k: v for k, v in payload.items() if k != "github_token"}
         payload_log["github_token"] = "***" if payload.get("github_token") else "MISSING"
@@ -31,8 +36,12 @@ def post_comment_worker(self, payload: dict):
             logger.error("ERROR: github_token is missing from payload!")
             raise ValueError("github_token is required")
         
-        # Run async post_comment_to_github function in sync context
-        asyncio.run(post_comment_to_github(payload))
+        # Run async post_comment_to_github function on the long-lived worker event loop
+        try:
+            outcome = run_async(post_comment_to_github(payload))
+        except CircuitOpen as e:
+            return run_async(defer_comment(payload, self.request.id, e))
+        record_comment_result(payload, outcome)
         logger.info(f"Comment posted successfully to {payload.get('repo')} PR #{payload.get('pr_number')}")
         
         return {
@@ -42,4 +51,5 @@ def post_comment_worker(self, payload: dict):
         }
     except Exception as e:
         logger.error(f"Error in post_comment_task: {e}", exc_info=True)
+        record_comment_result(payload, error=f"Failed to post comment: {e}")
         raise
@@ -0,0 +1,28 @@
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable
+
+_local = threading.local()
+
+
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the event loop shared by all Celery tasks run by this worker thread.
+
+    A long-lived loop lets pooled async HTTP and OpenAI clients keep their
+    connections between tasks, unlike asyncio.run() which creates and closes
+    a loop per task. A fresh loop is created after fork (prefork pool) and
+    per thread (threads pool), since a loop can only run in one thread.
+    """
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed() or getattr(_local, "pid", None) != os.getpid():
+        loop = asyncio.new_event_loop()
+        _local.loop = loop
+        _local.pid = os.getpid()
+    return loop
+
+
+def run_async(coro: Awaitable[Any]) -> Any:
+    """Run a coroutine to completion on the worker event loop."""
+    return get_worker_loop().run_until_complete(coro)
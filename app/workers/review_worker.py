@@ -1,15 +1,23 @@
-import asyncio
 import logging
 
 from app.celery_app import app
-from app.core.services.review_service import review_code
-from app.core.utils.constants import QueueConstants
-from app.core.utils.review_format import format_review_result
+from app.workers.event_loop import run_async
+from app.core.services.circuit_breaker import CircuitOpen
+from app.core.services.review_dispatch import (
+    ReviewSuperseded,
+    build_comment_payload,
+    defer_review,
+    review_task,
+    run_review_job,
+)
+from app.core.services.review_scheduler import finish_review
+from app.core.storage.payloads import decode_payload, encode_payload
+from app.core.utils.constants import QueueConstants, TaskConstants
 
 logger = logging.getLogger(__name__)
 
 
-@app.task(bind=True, name="defexai.review_code_worker")
+@app.task(bind=True, name=TaskConstants.REVIEW_CODE_TASK)
 def review_code_worker(self, payload: dict):
     """
     Celery task to review code and dispatch comment task.
@@ -19,13 +27,18 @@ def review_code_worker(self, payload: dict):
             - pr_number: Pull request number
             - base: Base branch name
             - head: Head branch name
+            - head_sha: (optional) PR head commit to review
             - github_token: GitHub token for authentication
             - diff: (optional) Pre-fetched diff text
             - max_bytes: (optional) Maximum bytes to fetch for diff
     Returns:
-        Dictionary with status and review result
+        Dictionary with status; the review itself is stored in the review result store
     """
+    # run_review_job frees the review's scheduler slot (or keeps it for a deferred retry);
+    # a failure before it runs, e.g. an undecodable payload, must free the slot here
+    job_started = False
     try:
+        payload = decode_payload(payload)
         # Log payload without exposing full token
         payload_log = {k: v for k, v in payload.items() if k != "github_token"}
         payload_log["github_token"] = f"{payload.get('github_token', '')[:7]}...***" if payload.get("github_token") else "MISSING"
@@ -34,39 +47,44 @@ def review_code_worker(self, payload: dict):
         if not payload.get("github_token"):
             logger.warning("WARNING: github_token is missing from review payload!")
         
-        # Run async review_code function in sync context
-        review_result = asyncio.run(review_code(payload))
+        # Run async review_code function on the long-lived worker event loop,
+        # stopping early if a newer push to the PR supersedes this review
+        try:
+            job_started = True
+            review_result = run_async(run_review_job(self.request.id, review_task(payload, self.request.id), payload))
+        except ReviewSuperseded:
+            logger.info(f"Review of {payload.get('repo')} PR #{payload.get('pr_number')} superseded by a newer push")
+            return {"status": "superseded", "comment_queued": False}
+        except CircuitOpen as e:
+            # Park the review in the retry queue instead of holding this worker until the upstream recovers
+            return run_async(defer_review(payload, self.request.id, e))
         logger.info(f"Review completed for {payload.get('repo')} PR #{payload.get('pr_number')}")
         
-        # Format review result as a readable comment string
-        review_comment = format_review_result(review_result)
-        
         github_token = payload.get("github_token")
         if not github_token:
             logger.error("ERROR: Cannot publish to comment queue - github_token is missing!")
             raise ValueError("github_token is required to publish comment")
         
-        # Directly dispatch Celery task instead of publishing to RabbitMQ
-        # This avoids async/sync mixing issues and is more efficient
-        from app.workers.comment_worker import post_comment_worker
-        
-        comment_payload = {
-            "repo": payload.get("repo"),
-            "pr_number": payload.get("pr_number"),
-            "review_result": review_comment,
-            "github_token": github_token
-        }
+        # Formatted summary comment, plus inline review comments in inline output mode;
+        # the formatted review is also stored as this task's result
+        comment_payload = build_comment_payload(payload, review_result, task_id=self.request.id)
         
-        post_comment_worker.apply_async(
-            args=[comment_payload], 
+        # Dispatched by name over this worker's broker connection, without importing the comment worker
+        app.send_task(
+            TaskConstants.POST_COMMENT_TASK,
+            args=[encode_payload(comment_payload)],
             queue=QueueConstants.GITHUB_COMMENT_QUEUE)
         logger.info("Review result dispatched to comment worker task")
         
         return {
             "status": "success",
-            "review_result": review_result,
+            "chunks": review_result.get("chunks"),
+            "failed_chunks": review_result.get("failed_chunks"),
             "comment_queued": True
         }
     except Exception as e:
         logger.error(f"Error in review_code_task: {e}", exc_info=True)
         raise
+    finally:
+        if not job_started:
+            run_async(finish_review(self.request.id))
@@ -0,0 +1,181 @@
+"""
+Cold start benchmark for the API and worker entry points.
+
+Imports each entry point in a fresh interpreter with `python -X importtime`
+and reports its import time (median of --repeat runs), peak resident
+memory and the slowest top-level packages. Importing `app.main` builds the
+FastAPI app, so its import time is the API's startup cost before serving.
+
+The benchmark also guards the lazy imports: it fails if an entry point
+imports modules it must not load at startup (e.g. the API importing
+Celery, the OpenAI SDK or the review pipeline), or, with --max-api-ms, if
+the API takes longer than the budget to import.
+
+Run with:
+    python -m benchmarks.import_time --repeat 5 --max-api-ms 1500 --output imports.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+ENTRY_POINTS = {
+    "api": "app.main",
+    "celery_app": "app.celery_app",
+    "async_worker": "app.workers.async_worker",
+}
+
+# Modules (and their submodules) an entry point must not import at startup
+FORBIDDEN_IMPORTS = {
+    "api": (
+        "celery",
+        "kombu",
+        "openai",
+        "app.celery_app",
+        "app.workers",
+        "app.core.services.git_mirror",
+        "app.core.services.github_client",
+        "app.core.services.open_ai_agent",
+        "app.core.services.review_service",
+    ),
+    # Task modules are loaded by `celery worker` through `include`, not by clients of the Celery app
+    "celery_app": ("openai", "app.workers", "app.core.services"),
+    # The LLM SDK is loaded by the first review; the web framework is only for the API
+    "async_worker": ("celery", "fastapi", "openai"),
+}
+
+# Prints peak RSS (KiB on Linux, bytes on macOS) after the import
+IMPORT_SCRIPT = "import {module}, resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entry-points", default=",".join(ENTRY_POINTS),
+                        help=f"comma-separated entry points to measure ({', '.join(ENTRY_POINTS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreter runs per entry point")
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level packages reported per entry point")
+    parser.add_argument("--max-api-ms", type=float, help="fail if the API's median import time exceeds this")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        (module, self microseconds, cumulative microseconds, nesting depth) per imported module
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "| imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def measure_once(module: str, env: Dict[str, str]) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT.format(module=module)],
+        capture_output=True, text=True, env=env, check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    imports = parse_importtime(completed.stderr)
+    max_rss = int(completed.stdout.strip().splitlines()[-1])
+    return {
+        "import_ms": next(cumulative for name, _, cumulative, depth in imports if name == module and depth == 0) / 1000,
+        "max_rss_mb": max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+        "imports": imports,
+    }
+
+
+def measure(name: str, module: str, repeat: int, top: int, env: Dict[str, str]) -> Dict[str, Any]:
+    # The first run compiles bytecode; it is not counted
+    measure_once(module, env)
+    runs = [measure_once(module, env) for _ in range(max(repeat, 1))]
+    modules = [imported for imported, _, _, _ in runs[-1]["imports"]]
+
+    packages: Dict[str, int] = defaultdict(int)
+    for imported, self_us, _, _ in runs[-1]["imports"]:
+        packages[imported.split(".")[0]] += self_us
+    forbidden = [
+        prefix for prefix in FORBIDDEN_IMPORTS.get(name, ())
+        if any(imported == prefix or imported.startswith(prefix + ".") for imported in modules)
+    ]
+    return {
+        "entry_point": name,
+        "module": module,
+        "import_ms": round(statistics.median(run["import_ms"] for run in runs), 1),
+        "import_ms_min": round(min(run["import_ms"] for run in runs), 1),
+        "max_rss_mb": round(statistics.median(run["max_rss_mb"] for run in runs), 1),
+        "modules": len(modules),
+        "slowest_packages": [
+            {"package": package, "ms": round(us / 1000, 1)}
+            for package, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+        "forbidden_imports": forbidden,
+    }
+
+
+def print_summary(results: Dict[str, Any]):
+    print(f"{'entry point':<14} {'import ms':>10} {'min ms':>8} {'rss MB':>8} {'modules':>8}  slowest packages (ms)")
+    for entry in results["entry_points"]:
+        slowest = ", ".join(f"{item['package']} {item['ms']:.0f}" for item in entry["slowest_packages"])
+        print(
+            f"{entry['entry_point']:<14} {entry['import_ms']:>10.1f} {entry['import_ms_min']:>8.1f}"
+            f" {entry['max_rss_mb']:>8.1f} {entry['modules']:>8}  {slowest}"
+        )
+    for failure in results["failures"]:
+        print(f"FAIL: {failure}")
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    names = [name.strip() for name in args.entry_points.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ENTRY_POINTS]
+    if unknown:
+        print(f"Unknown entry point(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    # Importing must not touch real local state
+    env = {**os.environ, "DEFEXAI_DATA_DIR": tempfile.mkdtemp(prefix="defexai-bench-")}
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    entries = [measure(name, ENTRY_POINTS[name], args.repeat, args.top, env) for name in names]
+
+    failures = [
+        f"{entry['entry_point']} imports {', '.join(entry['forbidden_imports'])}"
+        for entry in entries if entry["forbidden_imports"]
+    ]
+    api = next((entry for entry in entries if entry["entry_point"] == "api"), None)
+    if args.max_api_ms is not None and api and api["import_ms"] > args.max_api_ms:
+        failures.append(f"api imports in {api['import_ms']:.0f} ms, over the {args.max_api_ms:.0f} ms budget")
+
+    results = {
+        "benchmark": "import_time",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "entry_points": entries,
+        "failures": failures,
+    }
+    print_summary(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,302 @@
+"""
+End-to-end throughput and latency benchmark for the review pipeline.
+
+Drives POST /code/review on `app.main:app` with synthetic pull requests and
+runs them through the real dispatch, review and comment code, with local
+stand-ins for the external services:
+
+- GitHub: an httpx MockTransport serving PR metadata, compare diffs and comments
+- OpenAI: the stub LLM backend (LLM_BACKEND=stub)
+- RabbitMQ: in-memory queues consumed by the asyncio worker's task handlers
+
+Reports p50/p95/p99 latency per stage (enqueue, diff fetch, LLM, comment
+post, end to end) and reviews/minute for each --concurrency setting, and
+writes the results as JSON.
+
+Run with:
+    python -m benchmarks.review_pipeline --concurrency 1,8,32 --prs 64 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+STAGES = ("enqueue", "diff_fetch", "llm", "comment_post", "end_to_end")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", default="1,8,32",
+                        help="comma-separated concurrency levels (API clients and workers per queue)")
+    parser.add_argument("--prs", type=int, default=64, help="pull requests reviewed per concurrency level")
+    parser.add_argument("--files", type=int, default=10, help="changed files per pull request")
+    parser.add_argument("--lines", type=int, default=50, help="added lines per changed file")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="mean stub LLM latency per call, seconds")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0, help="stub LLM output speed (0 = instant)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of stub LLM calls that fail")
+    parser.add_argument("--tenants", type=int, default=4, help="repository owners the pull requests are spread across")
+    parser.add_argument("--tenant-concurrency", type=int, default=8,
+                        help="reviews one tenant may have queued or running (REVIEW_TENANT_CONCURRENCY)")
+    parser.add_argument("--github-latency", type=float, default=0.05, help="simulated GitHub latency per request, seconds")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace):
+    """Point the app at local stand-ins; must run before any app module is imported."""
+    os.environ.update({
+        "DEFEXAI_DATA_DIR": tempfile.mkdtemp(prefix="defexai-bench-"),
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_LATENCY_SECONDS": str(args.llm_latency),
+        "LLM_STUB_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "LLM_STUB_ERROR_RATE": str(args.llm_error_rate),
+        "REVIEW_DEBOUNCE_SECONDS": "0",
+        "REVIEW_TENANT_CONCURRENCY": str(args.tenant_concurrency),
+        "GITHUB_MAX_RETRIES": "0",
+    })
+
+
+def synthetic_diff(pr_number: int, files: int, lines: int) -> str:
+    """Build a unified diff adding `lines` unique lines to each of `files` files."""
+    parts = []
+    for index in range(files):
+        path = f"src/module_{index}.py"
+        parts.append(f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n")
+        parts.append(f"@@ -1,2 +1,{lines + 2} @@\n import os\n")
+        parts.extend(f"+value_{pr_number}_{index}_{line} = compute({line})\n" for line in range(lines))
+        parts.append(" import sys\n")
+    return "".join(parts)
+
+
+def percentiles(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        # Nearest-rank percentile
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": round(rank(50), 4),
+        "p95": round(rank(95), 4),
+        "p99": round(rank(99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+class Pipeline:
+    """Wires the app to in-memory queues and a fake GitHub, and records stage timings."""
+
+    def __init__(self, args: argparse.Namespace):
+        import httpx
+
+        self.args = args
+        self.httpx = httpx
+        self.queues: Dict[str, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.submitted_at: Dict[int, float] = {}
+        self.done: Dict[int, asyncio.Future] = {}
+        self.failed = 0
+        self.next_comment_id = 1
+
+    # --- GitHub stand-in ---
+
+    async def github(self, request):
+        await asyncio.sleep(self.args.github_latency)
+        path = request.url.path
+        if "/compare/" in path:
+            if request.headers.get("accept", "").endswith("diff"):
+                # Head SHAs encode the PR number (see the /pulls/ response below)
+                pr_number = int(path.rsplit("...", 1)[-1], 16)
+                return self.httpx.Response(200, text=synthetic_diff(pr_number, self.args.files, self.args.lines))
+            return self.httpx.Response(200, json={"status": "ahead"})
+        if "/pulls/" in path:
+            pr_number = int(path.rsplit("/", 1)[-1])
+            return self.httpx.Response(200, json={
+                "base": {"ref": "main", "sha": "b" * 40},
+                "head": {"ref": f"feature-{pr_number}", "sha": f"{pr_number:040x}"},
+            })
+        if path.endswith("/comments") and request.method == "GET":
+            return self.httpx.Response(200, json=[])
+        if path.endswith("/comments"):
+            self.next_comment_id += 1
+            return self.httpx.Response(201, json={"id": self.next_comment_id})
+        return self.httpx.Response(200, json={"id": 1})
+
+    # --- Broker stand-in ---
+
+    async def publish_task(self, queue_name, task_name, args=None, kwargs=None, task_id=None, countdown=None, priority=None):
+        import uuid
+        task_id = task_id or str(uuid.uuid4())
+        await self.queues[queue_name].put((task_name, task_id, list(args or []), dict(kwargs or {})))
+        return task_id
+
+    async def publish_confirmed(self, queue_name, messages):
+        from app.core.rabbit_mq.task_message import parse_task_message
+
+        messages = list(messages)
+        for message in messages:
+            await self.queues[queue_name].put(parse_task_message(message))
+        return [None] * len(messages)
+
+    async def consume(self, queue_name: str):
+        from app.workers.async_worker import TASK_HANDLERS
+
+        queue = self.queues[queue_name]
+        while True:
+            task_name, task_id, args, kwargs = await queue.get()
+            payload = args[0] if args else kwargs.get("payload", {})
+            try:
+                await TASK_HANDLERS[task_name](payload, task_id)
+            except Exception:
+                self.failed += 1
+                future = self.done.get(payload.get("pr_number"))
+                if future and not future.done():
+                    future.set_result(False)
+            finally:
+                queue.task_done()
+
+    # --- Instrumentation ---
+
+    def timed(self, stage: str, func):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.timings[stage].append(time.perf_counter() - start)
+        return wrapper
+
+    def install(self):
+        from app.core.services import github_client, review_scheduler, review_service
+        from app.workers import async_worker
+
+        review_scheduler.publish_confirmed = self.publish_confirmed
+        async_worker.publish_task = self.publish_task
+        review_service.get_diff_from_github = self.timed("diff_fetch", review_service.get_diff_from_github)
+        review_service.review_chunks = self.timed("llm", review_service.review_chunks)
+
+        post_comment = self.timed("comment_post", github_client.post_comment_to_github)
+
+        async def post_and_record(payload, *args, **kwargs):
+            result = await post_comment(payload, *args, **kwargs)
+            pr_number = payload.get("pr_number")
+            self.timings["end_to_end"].append(time.perf_counter() - self.submitted_at[pr_number])
+            self.done[pr_number].set_result(True)
+            return result
+
+        async_worker.post_comment_to_github = post_and_record
+        loop = asyncio.get_running_loop()
+        github_client._clients[loop] = github_client.GitHubClient(transport=self.httpx.MockTransport(self.github))
+
+    async def run_level(self, concurrency: int, first_pr: int) -> Dict[str, Any]:
+        from app.main import app
+        from app.core.utils.constants import QueueConstants
+
+        self.timings.clear()
+        self.failed = 0
+        workers = [
+            asyncio.create_task(self.consume(queue_name))
+            for queue_name in (QueueConstants.CODE_REVIEW_QUEUE, QueueConstants.GITHUB_COMMENT_QUEUE)
+            for _ in range(concurrency)
+        ]
+        pr_numbers = list(range(first_pr, first_pr + self.args.prs))
+        loop = asyncio.get_running_loop()
+        self.done.update({pr: loop.create_future() for pr in pr_numbers})
+        semaphore = asyncio.Semaphore(concurrency)
+
+        transport = self.httpx.ASGITransport(app=app)
+        async with self.httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def submit(pr_number: int):
+                async with semaphore:
+                    self.submitted_at[pr_number] = time.perf_counter()
+                    response = await client.post("/code/review", json={
+                        "repo": f"tenant{pr_number % self.args.tenants}/repo",
+                        "pr_number": pr_number,
+                        "base": "main",
+                        "head": f"head{pr_number}",
+                        "github_token": "ghp_benchmark",
+                    })
+                    self.timings["enqueue"].append(time.perf_counter() - self.submitted_at[pr_number])
+                    if response.status_code != 200:
+                        self.failed += 1
+                        self.done[pr_number].set_result(False)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(submit(pr) for pr in pr_numbers))
+            results = await asyncio.gather(*(self.done[pr] for pr in pr_numbers))
+            duration = time.perf_counter() - start
+
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        completed = sum(1 for ok in results if ok)
+        return {
+            "concurrency": concurrency,
+            "reviews": completed,
+            "failed": len(results) - completed,
+            "duration_seconds": round(duration, 3),
+            "reviews_per_minute": round(completed / duration * 60, 2) if duration else 0.0,
+            "stages": {stage: percentiles(self.timings[stage]) for stage in STAGES},
+        }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import app.main  # noqa: F401  (configures logging on import)
+
+    # Per-request INFO logs would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    pipeline = Pipeline(args)
+    pipeline.install()
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    runs = []
+    for index, concurrency in enumerate(levels):
+        # Fresh PR numbers per level so nothing is coalesced or served incrementally
+        runs.append(await pipeline.run_level(concurrency, first_pr=1 + index * args.prs))
+    return {
+        "benchmark": "review_pipeline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "runs": runs,
+    }
+
+
+def print_summary(results: Dict[str, Any]):
+    print(f"{'conc':>5} {'reviews/min':>12} {'failed':>7}  " + "  ".join(f"{s + ' p50/p95/p99':>30}" for s in STAGES))
+    for run_result in results["runs"]:
+        cells = []
+        for stage in STAGES:
+            stats = run_result["stages"][stage]
+            cells.append(
+                f"{stats['p50']:>9.3f} {stats['p95']:>9.3f} {stats['p99']:>9.3f}  " if stats["count"] else f"{'-':>30}  "
+            )
+        print(f"{run_result['concurrency']:>5} {run_result['reviews_per_minute']:>12} {run_result['failed']:>7}  " + "".join(cells))
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    results = asyncio.run(run(args))
+    print_summary(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
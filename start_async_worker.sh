@@ -0,0 +1,3 @@
+ASYNC_WORKER_REVIEW_CONCURRENCY=${ASYNC_WORKER_REVIEW_CONCURRENCY:-100} \
+ASYNC_WORKER_COMMENT_CONCURRENCY=${ASYNC_WORKER_COMMENT_CONCURRENCY:-200} \
+    python -m app.workers.async_worker
@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from app.core.services import rate_limiter
+from app.core.storage.rate_limits import RateLimits
+from app.core.utils.constants import RateLimitConstants
+
+
+@pytest.fixture
+def limits(tmp_path, monkeypatch):
+    store = RateLimits(str(tmp_path / "rate_limits.sqlite3"))
+    monkeypatch.setattr(rate_limiter, "get_rate_limits", lambda: store)
+    # The defaults: no RPM or TPM limit configured
+    monkeypatch.setattr(RateLimitConstants, "OPENAI_RPM", 0)
+    monkeypatch.setattr(RateLimitConstants, "OPENAI_TPM", 0)
+    return store
+
+
+def test_llm_calls_are_not_limited_by_default(limits):
+    for _ in range(5):
+        asyncio.run(rate_limiter.acquire_llm("openai", 100_000))
+
+
+def test_backoff_llm_pauses_calls_by_default(limits, monkeypatch):
+    monkeypatch.setattr(RateLimitConstants, "LLM_BACKOFF_SECONDS", 60)
+    monkeypatch.setattr(RateLimitConstants, "LLM_MAX_WAIT_SECONDS", 1)
+    asyncio.run(rate_limiter.backoff_llm("openai"))
+
+    with pytest.raises(rate_limiter.RateLimitTimeout):
+        asyncio.run(rate_limiter.acquire_llm("openai", 100))
+    # Only the backend that answered 429 is paused
+    asyncio.run(rate_limiter.acquire_llm("anthropic", 100))